@@ -0,0 +1,156 @@
+import html
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Максимальная длина сообщения Telegram
+MAX_MESSAGE_LENGTH = 4096
+# Длинные предложения в сводке обрезаются, полный текст есть в /viewsuggestions
+MAX_SUGGESTION_LENGTH = 2000
+
+
+def escape_truncated(text: str, limit: int) -> str:
+    """HTML-экранирует текст и обрезает результат до limit символов.
+
+    Обрезается уже экранированная строка (текст из "<>&" при экранировании
+    растет в 4-5 раз), не разрывая сущность вроде &amp; посередине.
+    """
+    escaped = html.escape(text)
+    if len(escaped) <= limit:
+        return escaped
+    cut = escaped[:limit]
+    amp = cut.rfind('&')
+    if amp != -1 and ';' not in cut[amp:]:
+        cut = cut[:amp]
+    return cut
+
+
+class AdminDigest:
+    """Сводка новых предложений для администратора.
+
+    Предложения копятся в памяти, фоновая задача отправляет их одним сообщением
+    раз в interval секунд или как только набралось max_items штук. Предложение
+    со срочным ключевым словом отправляется сразу (вместе с накопленными).
+    В очереди не больше max_pending предложений - при переполнении
+    отбрасываются самые старые.
+    """
+
+    def __init__(self, chat_id: int, interval: float = 300, max_items: int = 10,
+                 urgent_keywords: Optional[List[str]] = None, max_pending: int = 500):
+        self.chat_id = chat_id
+        self.interval = interval
+        self.max_items = max_items
+        self.urgent_keywords = [word.lower() for word in (urgent_keywords or [])]
+        self.max_pending = max_pending
+        self.bot = None
+        self._items = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, bot):
+        """Запускает фоновую отправку сводок"""
+        self.bot = bot
+        self._task = asyncio.create_task(self._run())
+        print(f"✅ Сводка для администратора: раз в {self.interval} с или каждые {self.max_items} предложений")
+
+    async def stop(self):
+        """Останавливает фоновую задачу и отправляет то, что осталось"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def add(self, user, suggestion_text: str):
+        """Добавляет предложение в сводку (без обращения к Telegram)"""
+        self._items.append({
+            'user_name': user.first_name,
+            'user_id': user.id,
+            'username': user.username,
+            'text': suggestion_text,
+            'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        })
+        if len(self._items) > self.max_pending:
+            dropped = len(self._items) - self.max_pending
+            del self._items[:dropped]
+            logger.warning(f"Очередь сводки переполнена, отброшено старых предложений: {dropped}")
+        if len(self._items) >= self.max_items or self.is_urgent(suggestion_text):
+            self._wakeup.set()
+
+    def is_urgent(self, text: str) -> bool:
+        text = text.lower()
+        return any(word in text for word in self.urgent_keywords)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Отправляет накопленные предложения одной сводкой.
+
+        Сводка из нескольких сообщений учитывается по частям: при ошибке
+        в очередь возвращаются только предложения из неотправленных частей.
+        """
+        items, self._items = self._items, []
+        if not items or not self.bot:
+            self._items = items + self._items
+            return
+
+        sent = 0
+        try:
+            for part, count in self._format_parts(items):
+                await self.bot.send_message(chat_id=self.chat_id, text=part, parse_mode='HTML')
+                sent += count
+        except asyncio.CancelledError:
+            # Остановка во время отправки - остаток уйдет при финальном flush
+            self._items = items[sent:] + self._items
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка при отправке сводки администратору: {e}")
+            # Вернем неотправленные предложения в очередь до следующей попытки, не превышая лимит
+            self._items = (items[sent:] + self._items)[-self.max_pending:]
+
+    def format_digest(self, items) -> List[str]:
+        """Формирует текст сводки, разбитый на части по лимиту Telegram"""
+        return [part for part, _ in self._format_parts(items)]
+
+    def _format_parts(self, items) -> List[Tuple[str, int]]:
+        """Части сводки и число предложений в каждой (по порядку items)"""
+        header = f"🔔 <b>НОВЫЕ ПРЕДЛОЖЕНИЯ ОТ ПОЛЬЗОВАТЕЛЕЙ: {len(items)}</b>\n\n"
+        footer = "<i>Для просмотра всех пожеланий используйте команду /viewsuggestions в боте</i>"
+
+        blocks = []
+        for i, item in enumerate(items, 1):
+            username = f"@{item['username']}" if item['username'] else 'не указан'
+            block = (
+                f"<b>{i}. {html.escape(item['user_name'] or '')}</b> (ID: {item['user_id']}, {html.escape(username)})\n"
+                f"<i>{item['time']}</i>\n"
+                f"{escape_truncated(item['text'], MAX_SUGGESTION_LENGTH)}\n\n"
+            )
+            if self.is_urgent(item['text']):
+                block = "❗ " + block
+            blocks.append(block)
+
+        parts = []
+        current = header
+        count = 0
+        for block in blocks:
+            if len(current) + len(block) + len(footer) > MAX_MESSAGE_LENGTH:
+                parts.append((current, count))
+                current = ""
+                count = 0
+            current += block
+            count += 1
+        parts.append((current + footer, count))
+        return parts
@@ -0,0 +1,57 @@
+import asyncio
+import logging
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from task_queue import retry_delay
+
+logger = logging.getLogger(__name__)
+
+
+class RetryAfterLimiter(BaseRateLimiter):
+    """Повтор вызовов Bot API, отклоненных Telegram с 429 (RetryAfter).
+
+    Подключается к Application целиком: ответы обработчиков (reply_text,
+    edit_message_text в send_or_edit) и фоновые задачи ждут указанную
+    Telegram паузу и повторяют вызов. Если пауза длиннее max_wait секунд
+    или повторов больше max_retries, RetryAfter передается вызывающему коду.
+    """
+
+    def __init__(self, max_retries: int = 3, max_wait: float = 10.0):
+        self.max_retries = max_retries
+        self.max_wait = max_wait
+        self.stats = {'retried': 0, 'gave_up': 0}
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], List[Dict[str, Any]]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[Any],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        attempt = 0
+        while True:
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                delay = retry_delay(e)
+                if attempt >= self.max_retries or delay > self.max_wait:
+                    self.stats['gave_up'] += 1
+                    raise
+                attempt += 1
+                self.stats['retried'] += 1
+                logger.warning(f"Telegram просит подождать {delay:.0f} с перед {endpoint}, повтор {attempt}/{self.max_retries}")
+                await asyncio.sleep(delay)
+
+    def metrics(self) -> dict:
+        return dict(self.stats)
@@ -0,0 +1,159 @@
+# benchmark_search.py - микробенчмарки поискового конвейера с контролем регрессий
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import contextlib
+from statistics import median
+from typing import Callable, Dict, List
+
+from database import Database
+
+# Запросы, типичные для операторов ПВЗ
+QUERIES = [
+    'прием перевозки',
+    'возврат товара селлеру',
+    'оформление недовоза',
+    'ттн',
+    'выдача заказа клиенту',
+    'пустые ящики',
+    'повреждение упаковки',
+]
+
+DEFAULT_SIZES = 'shipped,1000,10000,100000'
+
+
+def measure(func: Callable[[], object], min_time: float = 0.2, max_repeats: int = 10000) -> dict:
+    """Выполняет func повторно не меньше min_time секунд и возвращает медиану в мкс"""
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < max_repeats:
+        t0 = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - t0)
+        if time.perf_counter() - started >= min_time and len(timings) >= 3:
+            break
+    return {
+        'median_us': round(median(timings) * 1e6, 2),
+        'min_us': round(min(timings) * 1e6, 2),
+        'repeats': len(timings),
+    }
+
+
+def make_synthetic_catalog(processes: List[dict], size: int, seed: int = 1) -> List[dict]:
+    """Каталог нужного размера из слов настоящего каталога"""
+    rng = random.Random(seed)
+    names = [word for process in processes for word in process['process_name'].split()]
+    descriptions = [word for process in processes for word in (process.get('description') or '').split()]
+    keywords = [word for process in processes for word in (process.get('keywords') or '').split()]
+    catalog = []
+    for i in range(size):
+        catalog.append({
+            'process_id': f"B{i % 6 + 1}.{i // 6 + 1}",
+            'process_name': ' '.join(rng.choices(names, k=rng.randint(2, 6))).capitalize(),
+            'description': ' '.join(rng.choices(descriptions, k=rng.randint(10, 40))),
+            'keywords': ' '.join(rng.choices(keywords, k=rng.randint(10, 30))),
+        })
+    return catalog
+
+
+def open_catalog(processes: List[dict], workdir: str, name: str) -> Database:
+    catalog_file = os.path.join(workdir, f"{name}.json")
+    with open(catalog_file, 'w', encoding='utf-8') as f:
+        json.dump(processes, f, ensure_ascii=False)
+    with contextlib.redirect_stdout(io.StringIO()):
+        db = Database(db_file=os.path.join(workdir, f"{name}.db"), catalog_file=catalog_file)
+        db.build_index()
+    return db
+
+
+def run_benchmarks(sizes: List[str], min_time: float) -> Dict[str, dict]:
+    with open(os.path.join('data', 'processes.json'), 'r', encoding='utf-8') as f:
+        shipped = json.load(f)
+
+    results = {}
+    # Копии каталога и индекса удаляются вместе с временным каталогом
+    with tempfile.TemporaryDirectory(prefix='benchmark_search_') as workdir:
+        for size in sizes:
+            processes = shipped if size == 'shipped' else make_synthetic_catalog(shipped, int(size))
+            label = 'shipped' if size == 'shipped' else f"{int(size) // 1000}k"
+            print(f"⏱ Каталог {label}: {len(processes)} процессов")
+
+            started = time.perf_counter()
+            db = open_catalog(processes, workdir, label)
+            results[f"{label}/load_catalog"] = {'median_us': round((time.perf_counter() - started) * 1e6, 2), 'repeats': 1}
+
+            sample = processes[len(processes) // 2]
+            sample_data = (sample['process_id'], sample['process_name'], sample['description'], sample['keywords'])
+            stems = sorted({stem for word in QUERIES[0].split() for stem in db._get_word_stems(word)})
+
+            cases = {
+                '_normalize_text': lambda: db._normalize_text(sample['description']),
+                '_get_word_stems': lambda: [db._get_word_stems(word) for word in 'повреждения упаковки товара'.split()],
+                '_calculate_relevance': lambda: db._calculate_relevance(sample_data, stems, QUERIES[0]),
+            }
+            for query in QUERIES:
+                cases[f"search_processes[{query}]"] = (lambda q=query: db.search_processes(q))
+
+            for name, func in cases.items():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = measure(func, min_time=min_time)
+                results[f"{label}/{name}"] = result
+                print(f"   {name}: {result['median_us']} мкс (повторов: {result['repeats']})")
+            db.conn.close()
+    return results
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """Список регрессий: медиана выросла больше чем на threshold относительно эталона"""
+    regressions = []
+    for name, current in results.items():
+        reference = baseline.get(name)
+        if not reference or name.endswith('/load_catalog'):
+            continue
+        ratio = current['median_us'] / reference['median_us'] if reference['median_us'] else 1.0
+        if ratio > 1 + threshold:
+            regressions.append(f"{name}: {reference['median_us']} → {current['median_us']} мкс (x{ratio:.2f})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарки поиска процессов")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="каталоги: shipped и/или число процессов")
+    parser.add_argument('--min-time', type=float, default=0.2, help="минимальное время замера одного случая, с")
+    parser.add_argument('--output', default='data/benchmark_search.json', help="куда сохранить результаты")
+    parser.add_argument('--baseline', help="JSON предыдущего прогона для сравнения")
+    parser.add_argument('--threshold', type=float, default=0.25, help="допустимое замедление (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    results = run_benchmarks([size.strip() for size in args.sizes.split(',') if size.strip()], args.min_time)
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'results': results,
+    }
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ Результаты сохранены в {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"❌ Регрессии производительности (порог {args.threshold:.0%}):")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print(f"✅ Регрессий относительно {args.baseline} нет")
+
+
+if __name__ == '__main__':
+    main()
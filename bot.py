@@ -1,41 +1,62 @@
 import time
+import html
 import telegram
 import logging
 import asyncio
 import sqlite3
 from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
-from config import BOT_TOKEN
-from database import db
+from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler, TypeHandler, ApplicationHandlerStop
+from config import get_bot_token, EDIT_IN_PLACE, ADMIN_DIGEST_INTERVAL, ADMIN_DIGEST_MAX_ITEMS, ADMIN_URGENT_KEYWORDS, INSTANCE_LEASE_TTL, TELEGRAM_API_BASE_URL
+from config import QUERY_LOG_PATH, QUERY_LOG_MAX_BYTES, QUERY_LOG_BACKUPS, QUERY_LOG_SALT, QUERY_LOG_SALT_PATH, CACHE_WARMUP_TOP_N, CACHE_WARMUP_BUDGET
+from config import ANALYTICS_DB_PATH, ANALYTICS_TOP_K, ANALYTICS_CHECKPOINT_INTERVAL
+from config import CATALOGS, CHAT_CATALOGS, CATALOG_MEMORY_BUDGET_MB, CATALOG_WATCH_INTERVAL
+from config import THROTTLE_USER_RATE, THROTTLE_USER_BURST, THROTTLE_GLOBAL_RATE, THROTTLE_GLOBAL_BURST, THROTTLE_MAX_USERS
+from config import TASK_QUEUE_DB_PATH, TASK_QUEUE_WORKERS, TASK_QUEUE_MAX_ATTEMPTS
+from config import BOT_API_MAX_RETRIES, BOT_API_RETRY_MAX_WAIT
+from database import db, get_db, is_worker_mode
+from persistence import SQLitePersistence
+from result_cache import SearchResultCache
+from admin_digest import AdminDigest
+from query_log import QueryLog, top_queries
+from search_analytics import SearchAnalytics, format_report
+from catalogs import CatalogRegistry, DEFAULT_CATALOG, parse_mapping
+from catalog_watcher import CatalogWatcher
+from rate_limiter import RateLimiter, USER
+from single_flight import SingleFlight
+from card_cache import ProcessCardCache
+from task_queue import TaskQueue, PermanentTaskError
+from api_retry import RetryAfterLimiter
+from process_tree import category_title
+from code_resolver import EXACT, PREFIX, AMBIGUOUS
+from highlight import highlight_process, highlight, MAX_FIELD_LENGTH
+from instance_lock import InstanceLease
+from startup import startup
 import os
+import json
 from http.server import BaseHTTPRequestHandler, HTTPServer
 import threading
-import subprocess
 import sys
-
-def kill_previous_python_processes():
-    """Завершает предыдущие процессы Python на Windows"""
-    try:
-        # Команда для PowerShell
-        command = [
-            "powershell", 
-            "-Command", 
-            "Get-Process python | Where-Object { $_.MainWindowTitle -like '*bot*' -or $_.ProcessName -eq 'python' } | Stop-Process -Force"
-        ]
-        
-        result = subprocess.run(command, capture_output=True, text=True, timeout=10)
-        
-        if result.returncode == 0:
-            print("✅ Предыдущие процессы Python завершены")
-        else:
-            print("ℹ️ Не найдено процессов для завершения")
-            
-    except Exception as e:
-        print(f"⚠️ Не удалось завершить процессы: {e}")
+import hashlib
+from collections import OrderedDict
 
 class HealthHandler(BaseHTTPRequestHandler):
     def do_GET(self):
+        if self.path.startswith('/health'):
+            # Готовность: 503, пока не загружены каталог, индекс и сессия Telegram
+            report = startup.report()
+            report['catalog'] = catalog_watcher.metrics()
+            report['throttle'] = rate_limiter.metrics()
+            report['search_flights'] = search_flights.metrics()
+            report['search_results_cache'] = search_results_cache.metrics()
+            report['process_cards'] = process_cards.metrics()
+            report['tasks'] = task_queue.metrics()
+            report['bot_api_retries'] = api_retries.metrics()
+            self.send_response(200 if report['status'] == 'ready' else 503)
+            self.send_header('Content-type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps(report, ensure_ascii=False).encode('utf-8'))
+            return
         self.send_response(200)
         self.send_header('Content-type', 'text/plain')
         self.end_headers()
@@ -44,11 +65,16 @@ class HealthHandler(BaseHTTPRequestHandler):
     def log_message(self, format, *args):
         return
 
+health_server_lock = threading.Lock()
+health_server_thread = None
+
 def start_health_server():
     """Запуск HTTP сервера для проверки здоровья"""
     try:
         port = int(os.environ.get('PORT', 8080))
+        startup.begin('health_server')
         server = HTTPServer(('0.0.0.0', port), HealthHandler)
+        startup.done('health_server')
         print(f"✅ Сервер здоровья запущен на порту {port}")
         server.serve_forever()
     except Exception as e:
@@ -57,6 +83,14 @@ def start_health_server():
         time.sleep(5)
         start_health_server()
 
+def ensure_health_server():
+    """Запускает health server в отдельном потоке (один раз на процесс)"""
+    global health_server_thread
+    with health_server_lock:
+        if health_server_thread is None:
+            health_server_thread = threading.Thread(target=start_health_server, daemon=True)
+            health_server_thread.start()
+
 # Настройка логирования
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -67,6 +101,184 @@ logger = logging.getLogger(__name__)
 # ID администратора для уведомлений (замените на ваш Telegram ID)
 ADMIN_CHAT_ID = 324493714  # Ваш Telegram ID
 
+# Предложения отправляются администратору сводкой в фоне, а не по одному
+admin_digest = AdminDigest(
+    ADMIN_CHAT_ID,
+    interval=ADMIN_DIGEST_INTERVAL,
+    max_items=ADMIN_DIGEST_MAX_ITEMS,
+    urgent_keywords=ADMIN_URGENT_KEYWORDS
+)
+
+# Постраничный вывод результатов поиска
+RESULTS_PAGE_SIZE = 5
+# Не больше кнопок в ответе на код раздела (лимит Telegram - 100 кнопок)
+MAX_SUBPROCESS_BUTTONS = 50
+search_results_cache = SearchResultCache()
+
+# Журнал поисковых запросов для настройки поиска и аналитики
+query_log = QueryLog(QUERY_LOG_PATH, max_bytes=QUERY_LOG_MAX_BYTES, backup_count=QUERY_LOG_BACKUPS, salt=QUERY_LOG_SALT,
+                     salt_path=QUERY_LOG_SALT_PATH)
+
+# Каталоги процессов по регионам/партнерам (загружаются при первом обращении)
+catalogs = CatalogRegistry(parse_mapping(CATALOGS), memory_budget=int(CATALOG_MEMORY_BUDGET_MB * 1024 * 1024))
+chat_catalogs = parse_mapping(CHAT_CATALOGS)
+
+def catalog_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> str:
+    """Каталог пользователя: личный выбор (/catalog), затем каталог чата, затем общий"""
+    name = context.user_data.get('catalog') if context.user_data is not None else None
+    if not name and update.effective_chat:
+        name = chat_catalogs.get(str(update.effective_chat.id))
+    return name if name and catalogs.exists(name) else DEFAULT_CATALOG
+
+async def get_catalog(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """База каталога пользователя; загрузка каталога с диска идет в отдельном потоке"""
+    name = catalog_name(update, context)
+    catalog_db = catalogs.peek(name)
+    if catalog_db is not None:
+        return catalog_db
+    return await asyncio.to_thread(catalogs.get, name)
+
+# Перезагрузка data/processes.json без перезапуска бота
+catalog_watcher = CatalogWatcher(get_db, interval=CATALOG_WATCH_INTERVAL)
+
+def ranked_key(catalog: str, version: int, query: str) -> str:
+    """Ключ кэша ранжирования: каталог, версия каталога и нормализованный запрос.
+
+    Версия берется до ранжирования: поиск, начатый до перезагрузки каталога,
+    кладет старые результаты под старую версию, и новые запросы их не увидят.
+    """
+    return f"{catalog}\t{version}\t{db._normalize_text(query)}"
+
+# Одинаковые одновременные поиски (начало смены) считаются один раз
+search_flights = SingleFlight()
+
+async def rank_and_cache(catalog_db, key: str, query: str):
+    """Ранжирует запрос в отдельном потоке (цикл событий не блокируется) и кладет результат в кэш"""
+    ranked = await asyncio.to_thread(catalog_db.rank_processes, query)
+    search_results_cache.put_ranked(key, ranked)
+    return ranked
+
+# Потоковая аналитика поиска для команды /stats
+search_analytics = SearchAnalytics(ANALYTICS_DB_PATH, top_k=ANALYTICS_TOP_K, checkpoint_interval=ANALYTICS_CHECKPOINT_INTERVAL)
+
+# Ограничение частоты обновлений: один пользователь не должен отнимать поиск у остальных
+rate_limiter = RateLimiter(
+    user_rate=THROTTLE_USER_RATE,
+    user_burst=THROTTLE_USER_BURST,
+    global_rate=THROTTLE_GLOBAL_RATE,
+    global_burst=THROTTLE_GLOBAL_BURST,
+    max_users=THROTTLE_MAX_USERS
+)
+
+# Ответы на 429 RetryAfter: все вызовы Bot API ждут паузу, указанную Telegram, и повторяются
+api_retries = RetryAfterLimiter(max_retries=BOT_API_MAX_RETRIES, max_wait=BOT_API_RETRY_MAX_WAIT)
+
+# Побочные действия обработчиков (запись пожеланий, отправка файлов) выполняются в фоне
+task_queue = TaskQueue(TASK_QUEUE_DB_PATH, workers=TASK_QUEUE_WORKERS, max_attempts=TASK_QUEUE_MAX_ATTEMPTS)
+
+# Пожелания пишутся через одно соединение SQLite - по одному за раз
+suggestion_write_lock = asyncio.Lock()
+
+async def save_suggestion_task(bot, payload: dict):
+    """Фоновая задача: запись пожелания в базу данных"""
+    async with suggestion_write_lock:
+        saved = await asyncio.to_thread(
+            db.save_suggestion, payload['user_id'], payload['user_name'], payload['username'], payload['text']
+        )
+    if not saved:
+        raise RuntimeError("пожелание не сохранено")
+
+async def send_document_task(bot, payload: dict):
+    """Фоновая задача: отправка файла в чат (загрузка не держит обработчик)"""
+    reply_markup = payload.get('reply_markup')
+    try:
+        with open(payload['path'], 'rb') as document:
+            await bot.send_document(
+                chat_id=payload['chat_id'],
+                document=document,
+                filename=payload['filename'],
+                caption=payload['caption'],
+                parse_mode='HTML',
+                reply_markup=InlineKeyboardMarkup.de_json(reply_markup, bot) if reply_markup else None
+            )
+    except telegram.error.TimedOut as e:
+        # Загрузка могла завершиться на стороне Telegram - повтор прислал бы файл дважды
+        raise PermanentTaskError(f"таймаут отправки файла: {e}") from e
+    except (telegram.error.BadRequest, telegram.error.Forbidden) as e:
+        # Запрос отклонен (бот заблокирован, неверный чат) - повтор ничего не изменит
+        raise PermanentTaskError(str(e)) from e
+
+async def send_document_failed(bot, payload: dict, error: Exception):
+    """Отправить файл не удалось - сообщаем пользователю"""
+    if isinstance(error.__cause__, telegram.error.Forbidden):
+        return
+    if isinstance(error.__cause__, telegram.error.TimedOut):
+        text = "⚠️ Файл отправляется слишком долго. Если он не пришел, запросите его еще раз."
+    else:
+        text = "❌ Произошла ошибка при отправке файла"
+    await bot.send_message(chat_id=payload['chat_id'], text=text)
+
+task_queue.register('save_suggestion', save_suggestion_task)
+task_queue.register('send_document', send_document_task, on_failure=send_document_failed)
+
+def enqueue_document(chat_id: int, path: str, filename: str, caption: str, reply_markup=None):
+    """Ставит отправку файла в очередь; FileNotFoundError - файла нет (ответ сразу)"""
+    if not os.path.isfile(path):
+        raise FileNotFoundError(path)
+    task_queue.enqueue('send_document', {
+        'chat_id': chat_id,
+        'path': path,
+        'filename': filename,
+        'caption': caption,
+        'reply_markup': reply_markup.to_dict() if reply_markup else None,
+    })
+
+# Хэши последнего отрисованного содержимого сообщений - для пропуска пустых редактирований
+MAX_RENDERED_MESSAGES = 10000
+rendered_messages = OrderedDict()
+
+def _payload_hash(text: str, reply_markup) -> str:
+    """Хэш текста и клавиатуры сообщения"""
+    markup = reply_markup.to_json() if reply_markup else ''
+    return hashlib.sha1(f"{text}\x00{markup}".encode('utf-8')).hexdigest()
+
+def _remember_rendered(key, payload_hash: str):
+    rendered_messages[key] = payload_hash
+    rendered_messages.move_to_end(key)
+    while len(rendered_messages) > MAX_RENDERED_MESSAGES:
+        rendered_messages.popitem(last=False)
+
+async def send_or_edit(update: Update, text: str, reply_markup=None, **kwargs):
+    """Отвечает на нажатие кнопки, редактируя сообщение с кнопкой.
+    
+    Новое сообщение отправляется только если редактирование невозможно
+    (режим выключен, сообщение с документом, слишком старое сообщение).
+    429 RetryAfter повторяет api_retries (RetryAfterLimiter) внутри вызова;
+    до обработчика доходит только слишком долгая пауза.
+    """
+    query = update.callback_query
+    message = query.message
+    
+    if EDIT_IN_PLACE and message is not None and message.text is not None:
+        key = (message.chat_id, message.message_id)
+        payload_hash = _payload_hash(text, reply_markup)
+        
+        # Содержимое не изменилось - запрос к Telegram не нужен
+        if rendered_messages.get(key) == payload_hash:
+            return
+        
+        try:
+            await query.edit_message_text(text, reply_markup=reply_markup, **kwargs)
+            _remember_rendered(key, payload_hash)
+            return
+        except telegram.error.BadRequest as e:
+            if 'not modified' in str(e).lower():
+                _remember_rendered(key, payload_hash)
+                return
+            logger.info(f"Не удалось отредактировать сообщение, отправляем новое: {e}")
+    
+    await message.reply_text(text, reply_markup=reply_markup, **kwargs)
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /start"""
     user = update.effective_user
@@ -183,11 +395,16 @@ async def handle_suggestion(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("❌ Пожалуйста, введите текст предложения.")
             return
         
-        # Сохраняем пожелание в базу данных
-        db.save_suggestion(user.id, user.first_name, user.username, suggestion_text)
+        # Сохраняем пожелание в базу данных в фоне - ответ не ждет записи
+        task_queue.enqueue('save_suggestion', {
+            'user_id': user.id,
+            'user_name': user.first_name,
+            'username': user.username,
+            'text': suggestion_text,
+        })
         
-        # Отправляем уведомление администратору
-        await notify_admin(context, user, suggestion_text)
+        # Добавляем в сводку для администратора (отправится в фоне)
+        admin_digest.add(user, suggestion_text)
         
         # Подтверждаем пользователю
         keyboard = [
@@ -211,28 +428,6 @@ async def handle_suggestion(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Ошибка при сохранении предложения: {e}")
         await update.message.reply_text("❌ Произошла ошибка при сохранении предложения.")
 
-async def notify_admin(context: ContextTypes.DEFAULT_TYPE, user, suggestion_text):
-    """Отправляет уведомление администратору о новом пожелании"""
-    try:
-        admin_message = (
-            "🔔 <b>НОВОЕ ПРЕДЛОЖЕНИЕ ОТ ПОЛЬЗОВАТЕЛЯ</b>\n\n"
-            f"<b>Пользователь:</b> {user.first_name}\n"
-            f"<b>ID:</b> {user.id}\n"
-            f"<b>Username:</b> @{user.username if user.username else 'не указан'}\n"
-            f"<b>Время:</b> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-            f"<b>Текст пожелания:</b>\n{suggestion_text}\n\n"
-            "<i>Для просмотра всех пожеланий используйте команду /viewsuggestions в боте</i>"
-        )
-        
-        await context.bot.send_message(
-            chat_id=ADMIN_CHAT_ID,
-            text=admin_message,
-            parse_mode='HTML'
-        )
-        
-    except Exception as e:
-        logger.error(f"Ошибка при отправке уведомления администратору: {e}")
-
 async def view_suggestions_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Команда для просмотра пожеланий (только для администратора)"""
     try:
@@ -276,6 +471,87 @@ async def view_suggestions_command(update: Update, context: ContextTypes.DEFAULT
         logger.error(f"Ошибка в view_suggestions_command: {e}")
         await update.message.reply_text("❌ Ошибка при получении списка пожеланий")
 
+async def catalog_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Выбор каталога процессов: /catalog <имя>, без аргумента - список каталогов"""
+    try:
+        names = catalogs.names()
+        if context.args:
+            name = context.args[0].strip()
+            if not catalogs.exists(name):
+                await update.message.reply_text(
+                    f"❌ Каталог '{name}' не найден. Доступные: {', '.join(names)}"
+                )
+                return
+            context.user_data['catalog'] = name
+            await update.message.reply_text(f"✅ Выбран каталог процессов: <b>{name}</b>", parse_mode='HTML')
+            return
+        
+        current = catalog_name(update, context)
+        text = "📚 <b>Каталоги процессов:</b>\n\n"
+        for name in names:
+            marker = "✅" if name == current else "•"
+            text += f"{marker} <code>{name}</code>\n"
+        text += "\n💡 Выбрать каталог: <code>/catalog имя</code>"
+        await update.message.reply_text(text, parse_mode='HTML')
+        
+    except Exception as e:
+        logger.error(f"Ошибка в catalog_command: {e}")
+        await update.message.reply_text("❌ Ошибка при выборе каталога")
+
+async def throttle_updates(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Промежуточный обработчик (группа -1): отсекает слишком частые обновления до поиска и ответов"""
+    user_id = update.effective_user.id if update.effective_user else None
+    reason = rate_limiter.allow(user_id)
+    if reason is None:
+        return
+    # Дешевый ответ без поиска: на кнопку - всплывающая подсказка, на сообщение - одно предупреждение за серию
+    try:
+        if update.callback_query:
+            await update.callback_query.answer("⏳ Слишком часто. Подождите пару секунд.")
+        elif update.message and rate_limiter.warn_once(user_id):
+            await update.message.reply_text(
+                "⏳ Слишком много запросов подряд. Подождите пару секунд и повторите."
+                if reason == USER else
+                "⏳ Бот сейчас перегружен. Пожалуйста, повторите запрос через несколько секунд."
+            )
+    except Exception as e:
+        logger.error(f"Ошибка ответа при ограничении частоты: {e}")
+    raise ApplicationHandlerStop
+
+async def persist_shared_state(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Последняя группа при общем файле состояния: записывает user_data сразу после обработки.
+
+    Следующее сообщение пользователя может прийти в другой воркер - он должен
+    увидеть, например, waiting_for_suggestion, а не ждать записи по интервалу.
+    """
+    context.application.mark_data_for_update_persistence(
+        chat_ids=update.effective_chat.id if update.effective_chat else None,
+        user_ids=update.effective_user.id if update.effective_user else None
+    )
+    await context.application.update_persistence()
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Статистика поиска (только для администратора)"""
+    try:
+        if update.effective_user.id != ADMIN_CHAT_ID:
+            await update.message.reply_text("❌ У вас нет доступа к этой команде.")
+            return
+        
+        text = format_report(search_analytics.report())
+        throttle = rate_limiter.metrics()
+        text += (f"\n⏳ <b>Ограничение частоты:</b> отклонено {throttle['throttled_user']} (пользователи), "
+                 f"{throttle['throttled_global']} (общий лимит), пропущено {throttle['allowed']}\n")
+        cache = search_results_cache.metrics()
+        text += (f"🗂 <b>Кэш результатов:</b> страниц {cache['hits']} из кэша, {cache['misses']} не найдено, "
+                 f"вытеснено {cache['evicted_memory'] + cache['evicted_user_limit']}; "
+                 f"ранжирование {cache['query_hits']} из кэша, {cache['query_misses']} вычислено; "
+                 f"записей {cache['entries']}, запросов {cache['queries']}\n")
+        await update.message.reply_text(text, parse_mode='HTML')
+        
+    except Exception as e:
+        logger.error(f"Ошибка в stats_command: {e}")
+        await update.message.reply_text("❌ Ошибка при получении статистики")
+
 async def send_processes_pdf(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Отправка PDF-файла с бизнес-процессами"""
     try:
@@ -285,20 +561,19 @@ async def send_processes_pdf(update: Update, context: ContextTypes.DEFAULT_TYPE)
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        # Отправляем PDF-файл
-        with open("Бизнес-процессы Ozon ООО Технологии упаковки.pdf", "rb") as pdf_file:
-            await update.message.reply_document(
-                document=pdf_file,
-                filename="Бизнес-процессы Ozon ООО Технологии упаковки.pdf",
-                caption="📋 <b>Полный перечень бизнес-процессов Ozon</b>\n\n"
-                       "Этот файл содержит все бизнес-процессы, касающиеся работы в ПВЗ Ozon.\n"
-                       "Используйте поиск в боте для быстрого нахождения нужного процесса.\n"
-                       "После скачивания откройте файл, включите отображение содержания или нажимая на кнопки процесов выберите нужный процесс для изучения или распечатки.\n\n"
-                       "📦 <b>Дополнительная информация:</b>\n"
-                       "Если вам нужна дополнительная официальная информация от Ozon, воспользуйтесь кнопкой ниже ↓",
-                parse_mode='HTML',
-                reply_markup=reply_markup
-            )
+        # Отправляем PDF-файл (загрузка идет в фоне)
+        enqueue_document(
+            update.effective_chat.id,
+            "Бизнес-процессы Ozon ООО Технологии упаковки.pdf",
+            filename="Бизнес-процессы Ozon ООО Технологии упаковки.pdf",
+            caption="📋 <b>Полный перечень бизнес-процессов Ozon</b>\n\n"
+                   "Этот файл содержит все бизнес-процессы, касающиеся работы в ПВЗ Ozon.\n"
+                   "Используйте поиск в боте для быстрого нахождения нужного процесса.\n"
+                   "После скачивания откройте файл, включите отображение содержания или нажимая на кнопки процесов выберите нужный процесс для изучения или распечатки.\n\n"
+                   "📦 <b>Дополнительная информация:</b>\n"
+                   "Если вам нужна дополнительная официальная информация от Ozon, воспользуйтесь кнопкой ниже ↓",
+            reply_markup=reply_markup
+        )
     except FileNotFoundError:
         await update.message.reply_text(
             "❌ Файл с бизнес-процессами временно недоступен.\n"
@@ -311,23 +586,22 @@ async def send_processes_pdf(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def send_guide(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Отправка руководства по чтению бизнес-процессов"""
     try:
-        # Отправляем файл руководства
-        with open("РД-1.0 Руководство по чтению БП ООО Технологии упаковки.docx", "rb") as guide_file:
-            await update.message.reply_document(
-                document=guide_file,
-                filename="РД-1.0 Руководство по чтению бизнес-процессов.docx",
-                caption="📚 <b>Руководство по чтению бизнес-процессов в нотации BPMN</b>\n\n"
-                       "Это руководство поможет Вам:\n"
-                       "• 📖 Научиться читать схемы BPMN\n"
-                       "• 🔍 Понимать символы и обозначения\n"
-                       "• 💡 Эффективно работать с бизнес-процессами\n"
-                       "• 🎯 Быстрее находить нужную информацию в процессах\n\n"
-                       "🎥 <b>Дополнительный материал:</b>\n"
-                       "Посмотрите обучающий ролик по BPMN: /video\n\n"
-                       "🧪 <b>После изучения руководства и просмотра ролика проверьте свои знания:</b>\n"
-                       "Используйте команду /test для прохождения теста",
-                parse_mode='HTML'
-            )
+        # Отправляем файл руководства (загрузка идет в фоне)
+        enqueue_document(
+            update.effective_chat.id,
+            "РД-1.0 Руководство по чтению БП ООО Технологии упаковки.docx",
+            filename="РД-1.0 Руководство по чтению бизнес-процессов.docx",
+            caption="📚 <b>Руководство по чтению бизнес-процессов в нотации BPMN</b>\n\n"
+                   "Это руководство поможет Вам:\n"
+                   "• 📖 Научиться читать схемы BPMN\n"
+                   "• 🔍 Понимать символы и обозначения\n"
+                   "• 💡 Эффективно работать с бизнес-процессами\n"
+                   "• 🎯 Быстрее находить нужную информацию в процессах\n\n"
+                   "🎥 <b>Дополнительный материал:</b>\n"
+                   "Посмотрите обучающий ролик по BPMN: /video\n\n"
+                   "🧪 <b>После изучения руководства и просмотра ролика проверьте свои знания:</b>\n"
+                   "Используйте команду /test для прохождения теста"
+        )
     except FileNotFoundError:
         await update.message.reply_text(
             "❌ Файл руководства временно недоступен.\n"
@@ -404,8 +678,6 @@ async def send_pdf_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Отправка PDF в callback"""
     try:
         query = update.callback_query
-        await query.answer()
-        
         chat_id = query.message.chat_id
         
         # Создаем клавиатуру с кнопками
@@ -414,62 +686,63 @@ async def send_pdf_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        # Отправляем PDF-файл
-        with open("Бизнес-процессы Ozon ООО Технологии упаковки.pdf", "rb") as pdf_file:
-            await context.bot.send_document(
-                chat_id=chat_id,
-                document=pdf_file,
-                filename="Бизнес-процессы Ozon ООО Технологии упаковки.pdf",
-                caption="📋 <b>Полное собрание бизнес-процессов Ozon в одном файле</b>\n\n"
-                       "Этот файл содержит все бизнес-процессы, касающиеся работы в ПВЗ Ozon.\n"
-                       "Используйте поиск в боте для быстрого нахождения нужного процесса.\n"
-                       "После скачивания откройте файл, включите отображение содержания или нажимая на кнопки процесов выберите нужный процесс для изучения или распечатки.\n\n"
-                       "📦 <b>Дополнительная информация:</b>\n"
-                       "Если вам нужна дополнительная официальная информация от Ozon, воспользуйтесь кнопкой ниже ↓",
-                parse_mode='HTML',
-                reply_markup=reply_markup
-            )
+        # Отправляем PDF-файл (загрузка идет в фоне)
+        enqueue_document(
+            chat_id,
+            "Бизнес-процессы Ozon ООО Технологии упаковки.pdf",
+            filename="Бизнес-процессы Ozon ООО Технологии упаковки.pdf",
+            caption="📋 <b>Полное собрание бизнес-процессов Ozon в одном файле</b>\n\n"
+                   "Этот файл содержит все бизнес-процессы, касающиеся работы в ПВЗ Ozon.\n"
+                   "Используйте поиск в боте для быстрого нахождения нужного процесса.\n"
+                   "После скачивания откройте файл, включите отображение содержания или нажимая на кнопки процесов выберите нужный процесс для изучения или распечатки.\n\n"
+                   "📦 <b>Дополнительная информация:</b>\n"
+                   "Если вам нужна дополнительная официальная информация от Ozon, воспользуйтесь кнопкой ниже ↓",
+            reply_markup=reply_markup
+        )
+        # Единственный ответ на callback - подсказка видна, пока файл загружается в фоне
+        await query.answer("📤 Файл отправляется…")
     except FileNotFoundError:
+        await query.answer()
         await query.message.reply_text(
             "❌ Файл с бизнес-процессами временно недоступен.\n"
             "Пожалуйста, обратитесь к руководителю по качеству и операционным процессам."
         )
     except Exception as e:
         logger.error(f"Ошибка при отправке PDF в callback: {e}")
+        await query.answer()
         await query.message.reply_text("❌ Произошла ошибка при отправке файла")
 
 async def send_guide_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Отправка руководства в callback"""
     try:
         query = update.callback_query
-        await query.answer()
-        
         chat_id = query.message.chat_id
-        # Отправляем файл руководства
-        with open("РД-1.0 Руководство по чтению БП ООО Технологии упаковки.docx", "rb") as guide_file:
-            await context.bot.send_document(
-                chat_id=chat_id,
-                document=guide_file,
-                filename="РД-1.0 Руководство по чтению бизнес-процессов.docx",
-                caption="📚 <b>Руководство по чтению бизнес-процессов в нотации BPMN</b>\n\n"
-                       "Это руководство поможет Вам:\n"
-                       "• 📖 Научиться читать схемы BPMN\n"
-                       "• 🔍 Понимать символы и обозначения\n"
-                       "• 💡 Эффективно работать с бизнес-процессами\n"
-                       "• 🎯 Быстрее находить нужную информацию в процессах\n\n"
-                       "🎥 <b>Дополнительный материал:</b>\n"
-                       "Посмотрите обучающий ролик по BPMN: /video\n\n"
-                       "🧪 <b>После изучения руководства проверьте свои знания:</b>\n"
-                       "Используйте команду /test для прохождения теста",
-                parse_mode='HTML'
-            )
+        # Отправляем файл руководства (загрузка идет в фоне)
+        enqueue_document(
+            chat_id,
+            "РД-1.0 Руководство по чтению БП ООО Технологии упаковки.docx",
+            filename="РД-1.0 Руководство по чтению бизнес-процессов.docx",
+            caption="📚 <b>Руководство по чтению бизнес-процессов в нотации BPMN</b>\n\n"
+                   "Это руководство поможет Вам:\n"
+                   "• 📖 Научиться читать схемы BPMN\n"
+                   "• 🔍 Понимать символы и обозначения\n"
+                   "• 💡 Эффективно работать с бизнес-процессами\n"
+                   "• 🎯 Быстрее находить нужную информацию в процессах\n\n"
+                   "🎥 <b>Дополнительный материал:</b>\n"
+                   "Посмотрите обучающий ролик по BPMN: /video\n\n"
+                   "🧪 <b>После изучения руководства проверьте свои знания:</b>\n"
+                   "Используйте команду /test для прохождения теста"
+        )
+        await query.answer("📤 Файл отправляется…")
     except FileNotFoundError:
+        await query.answer()
         await query.message.reply_text(
             "❌ Файл руководства временно недоступен.\n"
             "Пожалуйста, обратитесь к руководителю по качеству и операционным процессам."
         )
     except Exception as e:
         logger.error(f"Ошибка при отправке руководства в callback: {e}")
+        await query.answer()
         await query.message.reply_text("❌ Произошла ошибка при отправке руководства")
 
 async def send_video_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -488,7 +761,8 @@ async def send_video_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    await query.message.reply_text(
+    await send_or_edit(
+        update,
         "🎥 <b>Обучающий ролик по нотации BPMN</b>\n\n"
         "Это видео поможет вам разобраться в основах BPMN - нотации для моделирования бизнес-процессов.\n\n"
         "📝 <b>Что вы узнаете:</b>\n"
@@ -523,7 +797,8 @@ async def send_test_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    await query.message.reply_text(
+    await send_or_edit(
+        update,
         "🧪 <b>Тест по чтению бизнес-процессов в нотации BPMN</b>\n\n"
         "Проверьте свои знания по чтению и пониманию BPMN-схем!\n\n"
         "📝 <b>Что Вас ждет в тесте:</b>\n"
@@ -545,7 +820,8 @@ async def send_test_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def list_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /list"""
     try:
-        processes = db.get_all_processes()
+        catalog_db = await get_catalog(update, context)
+        processes = catalog_db.get_all_processes()
         
         if not processes:
             await update.message.reply_text("❌ База процессов пуста.")
@@ -553,43 +829,17 @@ async def list_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         text = "📋 <b>Полный список бизнес-процессов:</b>\n\n"
         
-        # Группируем процессы по категориям
-        categories = {
-            '🚚 ПРИЕМ И ОБРАБОТКА ПЕРЕВОЗОК (B1)': [],
-            '📦 ХРАНЕНИЕ ТОВАРОВ (B2)': [],
-            '👤 ВЫДАЧА ЗАКАЗОВ (B3)': [],
-            '🔄 ВОЗВРАТЫ (B4)': [],
-            '📤 ОТПРАВКИ НА СКЛАД (B5)': [],
-            '🤝 РАБОТА С СЕЛЛЕРАМИ (B6)': []
-        }
-        
-        for process in processes:
-            # Формат: ('B1.1', 'Ожидание перевозки')
-            if isinstance(process, (list, tuple)) and len(process) >= 2:
-                process_id = process[0]  # Первый элемент - process_id
-                process_name = process[1]  # Второй элемент - process_name
-                
-                if process_id.startswith('B1'):
-                    categories['🚚 ПРИЕМ И ОБРАБОТКА ПЕРЕВОЗОК (B1)'].append((process_id, process_name))
-                elif process_id.startswith('B2'):
-                    categories['📦 ХРАНЕНИЕ ТОВАРОВ (B2)'].append((process_id, process_name))
-                elif process_id.startswith('B3'):
-                    categories['👤 ВЫДАЧА ЗАКАЗОВ (B3)'].append((process_id, process_name))
-                elif process_id.startswith('B4'):
-                    categories['🔄 ВОЗВРАТЫ (B4)'].append((process_id, process_name))
-                elif process_id.startswith('B5'):
-                    categories['📤 ОТПРАВКИ НА СКЛАД (B5)'].append((process_id, process_name))
-                elif process_id.startswith('B6'):
-                    categories['🤝 РАБОТА С СЕЛЛЕРАМИ (B6)'].append((process_id, process_name))
-        
-        # Формируем сообщение с категориями
-        for category, items in categories.items():
-            if items:
-                text += f"\n<b>{category}:</b>\n"
-                for i, (process_id, process_name) in enumerate(items[:10], 1):  # Ограничиваем показ
-                    text += f"{i}. <code>{process_id}</code> - {process_name}\n"
-                if len(items) > 10:
-                    text += f"   ... и еще {len(items) - 10} процессов\n"
+        # Группируем процессы по разделам дерева кодов, подпроцессы - с отступом
+        names = {process[0]: process[1] for process in processes}
+        tree = catalog_db.process_tree()
+        for category in tree.categories():
+            items = tree.ordered(category)
+            text += f"\n<b>{category_title(category)}:</b>\n"
+            for i, process_id in enumerate(items[:10], 1):  # Ограничиваем показ
+                indent = "   " * tree.depth(process_id)
+                text += f"{indent}{i}. <code>{process_id}</code> - {names.get(process_id, '')}\n"
+            if len(items) > 10:
+                text += f"   ... и еще {len(items) - 10} процессов\n"
         
         text += "\n💡 <b>Для просмотра деталей введите код процесса</b> (например: B1.3)"
         text += "\n\n💡 <b>Нужен полный файл со всеми процессами?</b> Используйте команду /pdf"
@@ -657,25 +907,53 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("❌ Запрос слишком короткий. Введите хотя бы 2 символа.")
             return
         
-        # Если запрос похож на код процесса
-        clean_query = query.upper().replace(' ', '')
-        if any(clean_query.startswith(prefix) for prefix in ['B1', 'B2', 'B3', 'B4', 'B5', 'B6']):
-            # Пробуем найти точное совпадение с кодом процесса
-            process_data = db.get_process_by_id(clean_query)
-            if process_data:
-                await show_process_details(update, process_data)
-                return
+        catalog = catalog_name(update, context)
+        catalog_db = await get_catalog(update, context)
+        
+        # Если запрос похож на код процесса (В1.3, b1,3, B13) - отвечаем по бору кодов,
+        # полнотекстовый поиск для кодов не запускается
+        started = time.perf_counter()
+        match = catalog_db.code_resolver().resolve(query)
+        if match is not None:
+            query_log.log(update.effective_user.id, query, [], [(code, 100) for code in match.codes],
+                          time.perf_counter() - started, kind='code', catalog=catalog)
+            if match.kind == EXACT:
+                await show_process_details(update, match.code, catalog_db)
+            elif match.kind == PREFIX:
+                await show_subprocesses(update, catalog_db, match.code, match.codes)
+            elif match.kind == AMBIGUOUS:
+                await show_code_candidates(update, catalog_db, match.code, match.codes)
             else:
-                # Если точного совпадения нет, делаем обычный поиск
-                pass
+                await update.message.reply_text(
+                    f"❌ Процесс с кодом <code>{match.code}</code> не найден.\n\n"
+                    "💡 Коды процессов выглядят так: <code>B1.3</code>, <code>B6.2.1</code>.\n"
+                    "• /list - перечень всех процессов с кодами",
+                    parse_mode='HTML',
+                    reply_markup=InlineKeyboardMarkup([
+                        [InlineKeyboardButton("📋 Открыть перечень всех процессов", callback_data="list_all")],
+                        [InlineKeyboardButton("🔍 Новый поиск процесса", callback_data="new_search")]
+                    ])
+                )
+            return
         
-        # Обычный поиск
-        results = db.search_processes(query)
+        # Обычный поиск - сохраняем полный ранжированный список для постраничного просмотра
+        started = time.perf_counter()
+        key = ranked_key(catalog, catalog_db.catalog_version, query)
+        ranked = search_results_cache.get_ranked(key)
+        cache_hit = ranked is not None
+        if not cache_hit:
+            ranked = await search_flights.run(key, lambda: rank_and_cache(catalog_db, key, query))
+        latency = time.perf_counter() - started
+        results = [(process[0], process[1]) for process, relevance in ranked]
         logger.info(f"Найдено результатов: {len(results)}")
+        search_analytics.record_search(db._normalize_text(query), len(results))
+        query_log.log(update.effective_user.id, query, sorted(catalog_db.query_stems(query)),
+                      [(process[0], relevance) for process, relevance in ranked], latency, cache_hit,
+                      catalog=catalog)
         
         if not results:
             await update.message.reply_text(
-                f"❌ По запросу '<b>{query}</b>' ничего не найдено.\n\n"
+                f"❌ По запросу '<b>{html.escape(query)}</b>' ничего не найдено.\n\n"
                 "💡 <b>Попробуйте:</b>\n"
                 "• Более простой запрос ('отправка' вместо 'отправка на склад Ozon')\n"
                 "• /list для просмотра всех процессов\n"
@@ -685,66 +963,139 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
         
+        token = search_results_cache.put(update.effective_user.id, query, results)
+        
         # Показываем пронумерованный список результатов
-        await show_simple_results(update, query, results)
+        await show_simple_results(update, query, results, token, catalog_db)
             
     except Exception as e:
         logger.error(f"Ошибка в handle_message: {e}")
         await update.message.reply_text("❌ Произошла ошибка при поиска")
 
-async def show_simple_results(update: Update, query: str, results):
-    """Показывает простой пронумерованный список найденных процессов"""
-    try:
-        text = f"🔍 <b>РЕЗУЛЬТАТЫ ПОИСКА</b>\n"
-        text += f"Запрос: '<code>{query}</code>'\n"
-        text += f"Найдено процессов: <b>{len(results)}</b>\n\n"
-        
-        # Простой пронумерованный список процессов
-        for i, result in enumerate(results, 1):
-            # ПРАВИЛЬНОЕ извлечение данных из результата
-            # Формат результата: (process_id, process_name, description, keywords)
-            if isinstance(result, (list, tuple)) and len(result) >= 2:
-                # Правильные индексы для данных из базы
-                process_id = result[0]  # process_id - первый элемент
-                process_name = result[1]  # process_name - второй элемент
-            else:
-                # Если формат неправильный, используем fallback
-                try:
-                    # Пробуем получить доступ к атрибутам, если это объект Row
-                    process_id = getattr(result, 'process_id', 'Неизвестно')
-                    process_name = getattr(result, 'process_name', 'Неизвестно')
-                except:
-                    process_id = "Неизвестно"
-                    process_name = "Неизвестно"
-            
-            text += f"<b>{i}.</b> <code>{process_id}</code> - {process_name}\n"
-        
-        text += f"\n💡 <b>Для просмотра краткого описания подходящего процесса нажмите на кнопку ниже ↓</b>\n"
-                
-        # Добавляем кнопки для быстрого доступа к первым процессам
-        keyboard = []
-        for i, result in enumerate(results[:5], 1):
-            # ПРАВИЛЬНОЕ извлечение process_id для callback_data
-            if isinstance(result, (list, tuple)) and len(result) >= 1:
-                process_id = result[0]  # process_id - первый элемент
-                # Получаем название процесса
-                process_name = result[1] if len(result) > 1 else 'Процесс'
-                # Укорачиваем текст кнопки если слишком длинный
-                button_text = f"{i}. {process_id}"
-                if len(process_name) > 20:
-                    button_text += f" - {process_name[:20]}..."
-                else:
-                    button_text += f" - {process_name}"
-                
-                keyboard.append([InlineKeyboardButton(button_text, callback_data=f"show_{process_id}")])
-        
-        keyboard.append([InlineKeyboardButton("📄 Скачать PDF со всеми процессами", callback_data="get_pdf")])
-        keyboard.append([InlineKeyboardButton("📋 Открыть перечень всех процессов", callback_data="list_all")])
-        keyboard.append([InlineKeyboardButton("💡 Отправить предложение", callback_data="send_suggestion")])
-        keyboard.append([InlineKeyboardButton("🔍 Новый поиск процесса", callback_data="new_search")])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+def process_button_text(code: str, process_name: str) -> str:
+    """Текст кнопки процесса, укороченный до 40 символов"""
+    button_text = f"{code} - {process_name}"
+    if len(button_text) > 40:
+        button_text = button_text[:37] + "..."
+    return button_text
+
+def tree_navigation(catalog_db, process_id: str):
+    """Кнопки перехода к родительскому процессу и подпроцессам по дереву кодов"""
+    tree = catalog_db.process_tree()
+    keyboard = []
+    parent = tree.parent(process_id)
+    if parent:
+        parent_data = catalog_db.get_process_by_id(parent)
+        keyboard.append([InlineKeyboardButton(
+            process_button_text(f"⬆️ {parent}", parent_data[1] if parent_data else ''),
+            callback_data=f"show_{parent}"
+        )])
+    for child in tree.children(process_id):
+        child_data = catalog_db.get_process_by_id(child)
+        keyboard.append([InlineKeyboardButton(
+            process_button_text(f"↳ {child}", child_data[1] if child_data else ''),
+            callback_data=f"show_{child}"
+        )])
+    return keyboard
+
+def process_buttons(catalog_db, codes):
+    """Кнопки процессов по списку кодов, подпроцессы помечены стрелкой"""
+    tree = catalog_db.process_tree()
+    keyboard = []
+    for process_id in codes[:MAX_SUBPROCESS_BUTTONS]:
+        process_data = catalog_db.get_process_by_id(process_id)
+        prefix = "↳ " if tree.depth(process_id) else ""
+        keyboard.append([InlineKeyboardButton(
+            process_button_text(f"{prefix}{process_id}", process_data[1] if process_data else ''),
+            callback_data=f"show_{process_id}"
+        )])
+    keyboard.append([InlineKeyboardButton("📋 Открыть перечень всех процессов", callback_data="list_all")])
+    keyboard.append([InlineKeyboardButton("🔍 Новый поиск процесса", callback_data="new_search")])
+    return InlineKeyboardMarkup(keyboard)
+
+async def show_subprocesses(update: Update, catalog_db, code: str, subprocesses):
+    """Показывает процессы раздела или группы по префиксу кода (B1, B1.5)"""
+    if code in catalog_db.process_tree().categories():
+        text = f"📂 <b>{category_title(code)}</b>\n\n"
+    else:
+        text = f"📂 <b>Процессы группы {code}</b>\n\n"
+    text += f"Найдено процессов: <b>{len(subprocesses)}</b>\n\n"
+    text += "💡 <b>Для просмотра описания процесса нажмите на кнопку ниже ↓</b>"
+    
+    await update.message.reply_text(text, parse_mode='HTML', reply_markup=process_buttons(catalog_db, subprocesses))
+
+async def show_code_candidates(update: Update, catalog_db, code: str, candidates):
+    """Предлагает выбрать процесс, когда введенный код подходит к нескольким"""
+    text = f"🤔 Код <code>{code}</code> подходит к нескольким процессам.\n\n"
+    text += "💡 <b>Выберите нужный процесс ↓</b>"
+    
+    await update.message.reply_text(text, parse_mode='HTML', reply_markup=process_buttons(catalog_db, candidates))
+
+def build_results_page(query: str, results, token: str, page: int = 0, catalog_db=None):
+    """Формирует текст и клавиатуру для одной страницы результатов поиска.
+
+    Если передана база каталога, совпадения запроса в названиях выделяются
+    и под каждым процессом показывается фрагмент текста вокруг лучшего совпадения.
+    """
+    total_pages = max(1, (len(results) + RESULTS_PAGE_SIZE - 1) // RESULTS_PAGE_SIZE)
+    page = max(0, min(page, total_pages - 1))
+    start = page * RESULTS_PAGE_SIZE
+    page_results = results[start:start + RESULTS_PAGE_SIZE]
+    
+    text = f"🔍 <b>РЕЗУЛЬТАТЫ ПОИСКА</b>\n"
+    text += f"Запрос: '<code>{html.escape(query)}</code>'\n"
+    text += f"Найдено процессов: <b>{len(results)}</b>\n"
+    if total_pages > 1:
+        text += f"Страница: <b>{page + 1} из {total_pages}</b>\n"
+    text += "\n"
+    
+    # Пронумерованный список процессов с подсветкой совпадений
+    stems = catalog_db.query_stems(query) if catalog_db else []
+    for i, (process_id, process_name) in enumerate(page_results, start + 1):
+        process_data = catalog_db.get_process_by_id(process_id) if catalog_db else None
+        if process_data:
+            marked = highlight_process(process_data, catalog_db.process_tokens(process_id), stems)
+            text += f"<b>{i}.</b> <code>{process_id}</code> - {marked.name}\n"
+            if marked.snippet:
+                text += f"      <i>{marked.snippet}</i>\n"
+        else:
+            text += f"<b>{i}.</b> <code>{process_id}</code> - {html.escape(process_name)}\n"
+    
+    text += f"\n💡 <b>Для просмотра краткого описания подходящего процесса нажмите на кнопку ниже ↓</b>\n"
+    
+    # Кнопки для быстрого доступа к процессам текущей страницы
+    keyboard = []
+    for i, (process_id, process_name) in enumerate(page_results, start + 1):
+        # Укорачиваем текст кнопки если слишком длинный
+        button_text = f"{i}. {process_id}"
+        if len(process_name) > 20:
+            button_text += f" - {process_name[:20]}..."
+        else:
+            button_text += f" - {process_name}"
         
+        # Токен и страница в callback_data - чтобы из карточки вернуться к этой странице
+        keyboard.append([InlineKeyboardButton(button_text, callback_data=f"show_{process_id}:{token}:{page}")])
+    
+    # Навигация по страницам
+    if total_pages > 1:
+        navigation = []
+        if page > 0:
+            navigation.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"page_{token}_{page - 1}"))
+        if page < total_pages - 1:
+            navigation.append(InlineKeyboardButton("Вперед ➡️", callback_data=f"page_{token}_{page + 1}"))
+        keyboard.append(navigation)
+    
+    keyboard.append([InlineKeyboardButton("📄 Скачать PDF со всеми процессами", callback_data="get_pdf")])
+    keyboard.append([InlineKeyboardButton("📋 Открыть перечень всех процессов", callback_data="list_all")])
+    keyboard.append([InlineKeyboardButton("💡 Отправить предложение", callback_data="send_suggestion")])
+    keyboard.append([InlineKeyboardButton("🔍 Новый поиск процесса", callback_data="new_search")])
+    
+    return text, InlineKeyboardMarkup(keyboard)
+
+async def show_simple_results(update: Update, query: str, results, token: str, catalog_db=None):
+    """Показывает первую страницу пронумерованного списка найденных процессов"""
+    try:
+        text, reply_markup = build_results_page(query, results, token, catalog_db=catalog_db)
         await update.message.reply_text(text, parse_mode='HTML', reply_markup=reply_markup)
         
     except Exception as e:
@@ -753,136 +1104,137 @@ async def show_simple_results(update: Update, query: str, results):
         simple_text = f"🔍 Найдено процессов: {len(results)}\n\n"
         for i, result in enumerate(results[:10], 1):
             try:
-                if isinstance(result, (list, tuple)) and len(result) >= 2:
-                    simple_text += f"{i}. {result[0]} - {result[1]}\n"
-                else:
-                    simple_text += f"{i}. {str(result)[:100]}\n"
+                simple_text += f"{i}. {result[0]} - {result[1]}\n"
             except:
                 simple_text += f"{i}. Ошибка отображения\n"
         
         await update.message.reply_text(simple_text, parse_mode='HTML')
 
-async def show_process_details(update: Update, process_data):
-    """Показывает детальную информацию о процессе"""
+async def results_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Переключает страницу результатов поиска, редактируя то же сообщение"""
     try:
-        # Добавим диагностику
-        logger.info(f"Данные процесса: {process_data}")
-        
-        # ПРАВИЛЬНЫЙ формат данных из SQLite: (process_id, process_name, description, keywords)
-        if isinstance(process_data, (list, tuple)) and len(process_data) >= 4:
-            # Правильный формат: (process_id, process_name, description, keywords)
-            process_id = process_data[0]  # process_id - первый элемент
-            process_name = process_data[1]  # process_name - второй элемент
-            description = process_data[2]  # description - третий элемент
-            keywords = process_data[3] if len(process_data) > 3 else "Ключевые слова недоступны"
-            
-            # Проверяем описание
-            if not description:
-                description = "Описание временно недоступно. Пожалуйста, обратитесь к региональному менеджеру."
-                logger.warning(f"Пустое описание для процесса {process_id}")
-        else:
-            await update.message.reply_text("❌ Неизвестный формат данных процесса")
-            return
-            
-        # Исправленный формат вывода
-        text = f"<b>🔄 {process_id} - {process_name}</b>\n\n"
-        text += f"<b>📝 Описание:</b>\n{description}"
+        query = update.callback_query
+        await query.answer()
         
-        if keywords and keywords != "Ключевые слова недоступны":
-            text += f"\n\n<b>🔑 Ключевые слова:</b> {keywords}"
+        # Формат callback_data: page_<токен>_<номер страницы>
+        token, page = query.data[5:].rsplit('_', 1)
+        cached = search_results_cache.get(token, update.effective_user.id)
         
-        # Обрезаем если слишком длинное
-        if len(text) > 4000:
-            text = text[:4000] + "...\n\n<i>Описание сокращено</i>"
+        if not cached:
+            await query.message.reply_text(
+                "⌛ Результаты этого поиска устарели. Пожалуйста, повторите запрос."
+            )
+            return
         
-        # Клавиатура для навигации
-        keyboard = [
-            [InlineKeyboardButton("🔍 Новый поиск процесса", callback_data="new_search")],
-            [InlineKeyboardButton("📄 Скачать PDF со всеми процессами", callback_data="get_pdf")],
-            [InlineKeyboardButton("📋 Открыть перечень всех процессов", callback_data="list_all")],
-            [InlineKeyboardButton("💡 Отправить предложение", callback_data="send_suggestion")],
-            [InlineKeyboardButton("❓ Помощь", callback_data="help")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        search_query, results = cached
+        catalog_db = await get_catalog(update, context)
+        text, reply_markup = build_results_page(search_query, results, token, int(page), catalog_db)
+        await send_or_edit(update, text, parse_mode='HTML', reply_markup=reply_markup)
         
+    except Exception as e:
+        logger.error(f"Ошибка в results_page_callback: {e}")
+
+# Ключевые слова в карточке обрезаются, чтобы карточка уместилась в одно сообщение
+MAX_CARD_KEYWORDS_LENGTH = 400
+
+def render_process_card(catalog_db, process_data):
+    """Текст и клавиатура карточки процесса (строятся один раз на версию каталога)"""
+    process_id, process_name, description, keywords = process_data[:4]
+    if not description:
+        description = "Описание временно недоступно. Пожалуйста, обратитесь к региональному менеджеру."
+        logger.warning(f"Пустое описание для процесса {process_id}")
+    
+    # Поля экранируются для HTML и обрезаются по словам, а не посреди тега
+    text = f"<b>🔄 {process_id} - {html.escape(process_name)}</b>\n\n"
+    text += f"<b>📝 Описание:</b>\n{highlight(description, (), (), MAX_FIELD_LENGTH)}"
+    if keywords:
+        text += f"\n\n<b>🔑 Ключевые слова:</b> {highlight(keywords, (), (), MAX_CARD_KEYWORDS_LENGTH)}"
+    
+    # Клавиатура для навигации: родитель и подпроцессы по дереву кодов, затем общие кнопки
+    keyboard = tree_navigation(catalog_db, process_id) + [
+        [InlineKeyboardButton("🔍 Новый поиск процесса", callback_data="new_search")],
+        [InlineKeyboardButton("📄 Скачать PDF со всеми процессами", callback_data="get_pdf")],
+        [InlineKeyboardButton("📋 Открыть перечень всех процессов", callback_data="list_all")],
+        [InlineKeyboardButton("💡 Отправить предложение", callback_data="send_suggestion")],
+        [InlineKeyboardButton("❓ Помощь", callback_data="help")]
+    ]
+    return text, InlineKeyboardMarkup(keyboard)
+
+# Готовые карточки процессов: общие для ответа на код и для кнопки в результатах поиска
+process_cards = ProcessCardCache(render_process_card)
+
+def prepare_process_cards():
+    """Строит карточки каталога по умолчанию заранее (после загрузки индекса)"""
+    if startup.wait('index', timeout=60):
+        process_cards.prepare(get_db())
+
+async def show_process_details(update: Update, process_id: str, catalog_db=None):
+    """Показывает детальную информацию о процессе"""
+    try:
+        card = process_cards.get(catalog_db or get_db(), process_id)
+        if card is None:
+            await update.message.reply_text(f"❌ Процесс {process_id} не найден.")
+            return
+        
+        text, reply_markup = card
         await update.message.reply_text(text, reply_markup=reply_markup, parse_mode='HTML')
         
     except Exception as e:
         logger.error(f"Ошибка в show_process_details: {e}")
         await update.message.reply_text("❌ Ошибка при отображении процесса")
 
+def with_back_to_results(card_markup: InlineKeyboardMarkup, token: str, page: str) -> InlineKeyboardMarkup:
+    """Клавиатура карточки с кнопкой возврата к странице результатов поиска"""
+    back = [InlineKeyboardButton("⬅️ К результатам", callback_data=f"page_{token}_{page}")]
+    return InlineKeyboardMarkup([back, *card_markup.inline_keyboard])
+
 async def show_process_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает процесс в callback"""
     try:
         query = update.callback_query
         await query.answer()
         
-        process_id = query.data[5:]  # Извлекаем process_id из callback_data
-        process_data = db.get_process_by_id(process_id)
-        
-        if not process_data:
+        # Формат callback_data: show_<process_id> или show_<process_id>:<токен>:<страница> из результатов поиска
+        process_id, _, origin = query.data[5:].partition(':')
+        token, _, page = origin.partition(':')
+        if token:
+            # Выбор из результатов поиска - учитываем под запросом этой страницы
+            cached = search_results_cache.get(token, update.effective_user.id)
+            if cached:
+                search_analytics.record_click(db._normalize_text(cached[0]), process_id)
+        catalog_db = await get_catalog(update, context)
+        card = process_cards.get(catalog_db, process_id)
+        
+        if card is None:
             await query.message.reply_text(f"❌ Процесс {process_id} не найден.")
             return
-            
-        # Добавим диагностику
-        logger.info(f"Данные процесса (callback): {process_data}")
-        
-        # ПРАВИЛЬНЫЙ формат данных из SQLite: (process_id, process_name, description, keywords)
-        if isinstance(process_data, (list, tuple)) and len(process_data) >= 4:
-            # Правильный формат: (process_id, process_name, description, keywords)
-            process_id = process_data[0]  # process_id - первый элемент
-            process_name = process_data[1]  # process_name - второй элемент
-            description = process_data[2]  # description - третий элемент
-            keywords = process_data[3] if len(process_data) > 3 else "Ключевые слова недоступны"
-            
-            # Проверяем описание
-            if not description:
-                description = "Описание временно недоступно. Пожалуйста, обратитесь к руководителю по качеству и операционным процессам."
-                logger.warning(f"Пустое описание для процесса {process_id} (callback)")
-        else:
-            await query.message.reply_text("❌ Неизвестный формат данных процесса")
-            return
-            
-        # Исправленный формат вывода
-        text = f"<b>🔄 {process_id} - {process_name}</b>\n\n"
-        text += f"<b>📝 Описание:</b>\n{description}"
-        
-        if keywords and keywords != "Ключевые слова недоступны":
-            text += f"\n\n<b>🔑 Ключевые слова:</b> {keywords}"
         
-        # Сокращаем для callback если слишком длинное
-        if len(text) > 4000:
-            text = text[:4000] + "..."
-        
-        keyboard = [
-            [InlineKeyboardButton("🔍 Новый поиск процесса", callback_data="new_search")],
-            [InlineKeyboardButton("📄 Скачать PDF со всеми процессами", callback_data="get_pdf")],
-            [InlineKeyboardButton("📋 Открыть перечень всех процессов", callback_data="list_all")],
-            [InlineKeyboardButton("💡 Отправить предложение", callback_data="send_suggestion")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        # Отправляем новое сообщение вместо редактирования
-        await query.message.reply_text(text, reply_markup=reply_markup, parse_mode='HTML')
+        text, reply_markup = card
+        if token:
+            reply_markup = with_back_to_results(reply_markup, token, page)
+        await send_or_edit(update, text, reply_markup=reply_markup, parse_mode='HTML')
             
     except Exception as e:
         logger.error(f"Ошибка в show_process_callback: {e}")
         await query.message.reply_text("❌ Ошибка при отображении процесса")
 
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработчик нажатий на кнопки"""
+    """Обработчик нажатий на кнопки.
+
+    На callback отвечают один раз: обработчики кнопок отвечают сами (в том
+    числе с подсказкой, как при отправке файла), здесь - только остальные ветки.
+    """
     try:
         query = update.callback_query
-        await query.answer()
-        
         data = query.data
         
         if data == "list_all":
             await list_command_callback(update, context)
         
         elif data == "new_search":
-            # Вместо редактирования сообщения отправляем новое
-            await query.message.reply_text(
+            await query.answer()
+            await send_or_edit(
+                update,
                 "🔍 <b>Введите запрос для поиска:</b>\n\n"
                 "<b>Примеры:</b>\n"
                 "• <code>селлер</code> - прием выдача и другие процессы, связанные с селлером\n"
@@ -916,9 +1268,12 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         elif data.startswith("show_"):
             await show_process_callback(update, context)
         
-        elif data == "ignore":
-            # Игнорируем нажатия на заголовки категорий
-            pass
+        elif data.startswith("page_"):
+            await results_page_callback(update, context)
+        
+        else:
+            # Заголовки категорий (ignore) и устаревшие кнопки - только убираем "часики"
+            await query.answer()
                 
     except Exception as e:
         logger.error(f"Ошибка в button_handler: {e}")
@@ -935,7 +1290,8 @@ async def suggestion_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    await query.message.reply_text(
+    await send_or_edit(
+        update,
         "💡 <b>Отправьте Ваше пожелание или предложение по улучшению</b>\n\n"
         "Опишите Вашу идею, замечание или предложение по улучшению:\n"
         "• Работы бота\n"
@@ -962,7 +1318,8 @@ async def cancel_suggestion_callback(update: Update, context: ContextTypes.DEFAU
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await query.message.reply_text(
+        await send_or_edit(
+            update,
             "❌ <b>Отправка пожелания отменена</b>\n\n"
             "Вы всегда можете отправить предложение позже, используя команду /suggestion или кнопку в меню.",
             parse_mode='HTML',
@@ -975,63 +1332,32 @@ async def list_command_callback(update: Update, context: ContextTypes.DEFAULT_TY
         query = update.callback_query
         await query.answer()
         
-        processes = db.get_all_processes()
+        catalog_db = await get_catalog(update, context)
+        processes = catalog_db.get_all_processes()
         
         if not processes:
             await query.message.reply_text("❌ База процессов пуста.")
             return
         
-        # Группируем процессы по категориям
-        categories = {
-            '🚚 ПРИЕМ И ОБРАБОТКА ПЕРЕВОЗОК (B1)': [],
-            '📦 ХРАНЕНИЕ ТОВАРОВ (B2)': [],
-            '👤 ВЫДАЧА ЗАКАЗОВ (B3)': [],
-            '🔄 ВОЗВРАТЫ (B4)': [],
-            '📤 ОТПРАВКИ НА СКЛАД (B5)': [],
-            '🤝 РАБОТА С СЕЛЛЕРАМИ (B6)': []
-        }
-        
-        for process in processes:
-            if isinstance(process, (list, tuple)) and len(process) >= 2:
-                process_id = process[0]
-                process_name = process[1]
-                
-                if process_id.startswith('B1'):
-                    categories['🚚 ПРИЕМ И ОБРАБОТКА ПЕРЕВОЗОК (B1)'].append((process_id, process_name))
-                elif process_id.startswith('B2'):
-                    categories['📦 ХРАНЕНИЕ ТОВАРОВ (B2)'].append((process_id, process_name))
-                elif process_id.startswith('B3'):
-                    categories['👤 ВЫДАЧА ЗАКАЗОВ (B3)'].append((process_id, process_name))
-                elif process_id.startswith('B4'):
-                    categories['🔄 ВОЗВРАТЫ (B4)'].append((process_id, process_name))
-                elif process_id.startswith('B5'):
-                    categories['📤 ОТПРАВКИ НА СКЛАД (B5)'].append((process_id, process_name))
-                elif process_id.startswith('B6'):
-                    categories['🤝 РАБОТА С СЕЛЛЕРАМИ (B6)'].append((process_id, process_name))
-        
-        # Создаем клавиатуру с кнопками процессов
+        # Группируем процессы по разделам дерева кодов
+        names = {process[0]: process[1] for process in processes}
+        tree = catalog_db.process_tree()
         keyboard = []
         
-        for category_name, items in categories.items():
-            if items:
-                # Добавляем заголовок категории
+        for category in tree.categories():
+            # Добавляем заголовок категории
+            keyboard.append([InlineKeyboardButton(
+                f"────────── {category_title(category)} ──────────", 
+                callback_data="ignore"
+            )])
+            
+            # Добавляем кнопки процессов раздела в порядке дерева
+            for process_id in tree.ordered(category):
+                prefix = "↳ " if tree.depth(process_id) else ""
                 keyboard.append([InlineKeyboardButton(
-                    f"────────── {category_name} ──────────", 
-                    callback_data="ignore"
+                    process_button_text(f"{prefix}{process_id}", names.get(process_id, '')),
+                    callback_data=f"show_{process_id}"
                 )])
-                
-                # Добавляем кнопки процессов в этой категории
-                for process_id, process_name in items:
-                    # Создаем кнопку с callback_data для выбора процесса
-                    button_text = f"{process_id} - {process_name}"
-                    # Укорачиваем текст если слишком длинный
-                    if len(button_text) > 40:
-                        button_text = button_text[:37] + "..."
-                    
-                    keyboard.append([InlineKeyboardButton(
-                        button_text, 
-                        callback_data=f"show_{process_id}"
-                    )])
         
         # Добавляем навигационные кнопки
         keyboard.append([
@@ -1053,8 +1379,8 @@ async def list_command_callback(update: Update, context: ContextTypes.DEFAULT_TY
             "Процессы сгруппированы по категориям для удобства навигации."
         )
         
-        # Отправляем новое сообщение с интерактивным списком
-        await query.message.reply_text(text, parse_mode='HTML', reply_markup=reply_markup)
+        # Показываем интерактивный список в том же сообщении
+        await send_or_edit(update, text, parse_mode='HTML', reply_markup=reply_markup)
         
     except Exception as e:
         logger.error(f"Ошибка в list_command_callback: {e}")
@@ -1133,8 +1459,7 @@ async def help_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "• Используйте команду /suggestion для отправки пожеланий\n\n"
         "💡 Просто введите запрос для начала!"
     )
-    # Отправляем новое сообщение вместо редактирования
-    await query.message.reply_text(help_text, parse_mode='HTML', reply_markup=reply_markup)
+    await send_or_edit(update, help_text, parse_mode='HTML', reply_markup=reply_markup)
 
 async def check_process(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Проверяет конкретный процесс"""
@@ -1160,49 +1485,155 @@ async def check_process(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         await update.message.reply_text(f"❌ Ошибка проверки: {e}")
 
+def warm_search_cache(top_n: int = CACHE_WARMUP_TOP_N, budget: float = CACHE_WARMUP_BUDGET) -> int:
+    """Заранее ранжирует самые частые запросы из журнала, чтобы первые пользователи
+    после перезапуска не ждали холодный поиск. Возвращает число прогретых запросов."""
+    deadline = time.monotonic() + budget
+    # Прогрев имеет смысл только на готовом каталоге и индексе
+    if not startup.wait('index', timeout=budget):
+        return 0
+    database = get_db()
+    warmed = 0
+    for query, count in top_queries(query_log.path, top_n, database._normalize_text, deadline, DEFAULT_CATALOG):
+        if time.monotonic() > deadline:
+            break
+        key = ranked_key(DEFAULT_CATALOG, database.catalog_version, query)
+        ranked = database.rank_processes(query)
+        search_results_cache.put_ranked(key, ranked, warmed=True)
+        warmed += 1
+    print(f"🔥 Кэш поиска прогрет: {warmed} запросов из журнала")
+    return warmed
+
+def on_catalog_reload():
+    """После обновления каталога старые результаты ранжирования недействительны (и уже не
+    совпадут по версии в ключе) - освобождаем память сразу"""
+    search_results_cache.clear_ranked()
+    process_cards.prepare(get_db())
+    if CACHE_WARMUP_TOP_N > 0:
+        warm_search_cache()
+
+catalog_watcher.on_reload.append(on_catalog_reload)
+
+# Аренда единственного экземпляра бота (создается в main)
+instance_lease = None
+lease_task = None
+
+async def post_init(application: Application):
+    """Запуск фоновых задач после инициализации бота"""
+    global lease_task
+    # initialize() уже выполнил getMe - сессия Telegram готова
+    startup.done('telegram')
+    admin_digest.start(application.bot)
+    task_queue.start(application.bot)
+    query_log.start()
+    search_analytics.start()
+    # В режиме воркеров каталог приходит из готового индекса главного процесса
+    if CATALOG_WATCH_INTERVAL > 0 and not is_worker_mode():
+        catalog_watcher.start()
+    # Карточки процессов и прогрев кэша строятся в фоне и не влияют на готовность (/health)
+    startup.run_in_background(('cards', prepare_process_cards))
+    if CACHE_WARMUP_TOP_N > 0:
+        startup.run_in_background(('warmup', warm_search_cache))
+    if instance_lease:
+        # При запросе перехвата новым экземпляром корректно останавливаем polling
+        lease_task = asyncio.create_task(instance_lease.keep_alive(application.stop_running))
+
+async def post_stop(application: Application):
+    """Остановка фоновых задач при завершении бота"""
+    global lease_task
+    await admin_digest.stop()
+    await task_queue.stop()
+    query_log.stop()
+    await search_analytics.stop()
+    catalog_watcher.stop()
+    if lease_task:
+        lease_task.cancel()
+        lease_task = None
+    if instance_lease:
+        # Polling уже остановлен - новый экземпляр может начинать работу
+        instance_lease.release()
+
+# Группа записи состояния - после всех обработчиков обновления
+PERSIST_STATE_GROUP = 100
+
+def build_application(persistence, request=None) -> Application:
+    """Создает Application со всеми обработчиками.
+    
+    request - свой транспорт к Bot API (например, заглушка для нагрузочного теста).
+    """
+    builder = (
+        Application.builder()
+        .token(get_bot_token())
+        .concurrent_updates(True)
+        .persistence(persistence)
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .rate_limiter(api_retries)
+    )
+    if TELEGRAM_API_BASE_URL:
+        # Локальная заглушка Bot API для бенчмарков без сети
+        builder = builder.base_url(TELEGRAM_API_BASE_URL).base_file_url(TELEGRAM_API_BASE_URL.rsplit('/bot', 1)[0] + '/file/bot')
+    if request is not None:
+        builder = builder.request(request).get_updates_request(request)
+    application = builder.build()
+    print("✅ Application создано")
+    
+    # Добавляем обработчики
+    # Группа -1 выполняется раньше остальных и может остановить обработку обновления
+    application.add_handler(TypeHandler(Update, throttle_updates), group=-1)
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("list", list_command))
+    application.add_handler(CommandHandler("pdf", send_processes_pdf))
+    application.add_handler(CommandHandler("guide", send_guide))
+    application.add_handler(CommandHandler("video", send_bpmn_video))
+    application.add_handler(CommandHandler("test", send_test))
+    application.add_handler(CommandHandler("suggestion", suggestion_command))
+    application.add_handler(CommandHandler("viewsuggestions", view_suggestions_command))
+    application.add_handler(CommandHandler("stats", stats_command))
+    application.add_handler(CommandHandler("catalog", catalog_command))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    application.add_handler(CallbackQueryHandler(button_handler))
+    if getattr(persistence, 'shared', False):
+        application.add_handler(TypeHandler(Update, persist_shared_state), group=PERSIST_STATE_GROUP)
+    
+    print("✅ Обработчики добавлены")
+    return application
+
 def main():
     """Запуск бота с улучшенной обработкой конфликтов"""
-    # Завершаем предыдущие процессы перед запуском
-    kill_previous_python_processes()
+    global instance_lease
+    
+    # Без токена запускаться бессмысленно - проверяем сразу
+    get_bot_token()
+    
+    # Этапы запуска идут параллельно: health server, каталог с индексом и сессия Telegram
+    ensure_health_server()
+    startup.run_in_background(
+        ('catalog', get_db),
+        ('index', lambda: get_db().build_index())
+    )
+    
+    instance_lease = InstanceLease(ttl=INSTANCE_LEASE_TTL)
     
     max_retries = 3
     retry_count = 0
+    # Конфликт ждем дольше аренды: старый экземпляр освобождает getUpdates не раньше,
+    # чем истечет его аренда (ttl), плюс время последнего длинного опроса
+    conflict_budget = 2 * instance_lease.ttl
+    conflict_waited = 0.0
+    conflict_count = 0
     
     while retry_count < max_retries:
         try:
-            print(f"🔄 Попытка запуска {retry_count + 1}/{max_retries}")
-            
-            # Запускаем health server в отдельном потоке
-            health_thread = threading.Thread(target=start_health_server, daemon=True)
-            health_thread.start()
-            print("✅ Health server запущен")
-            
-            # Даем время health server запуститься
-            time.sleep(3)
+            print(f"🔄 Попытка запуска {retry_count + conflict_count + 1}")
             
-            # Создаем Application
-            application = (
-                Application.builder()
-                .token(BOT_TOKEN)
-                .concurrent_updates(True)
-                .build()
-            )
-            print("✅ Application создано")
+            # Ждем, пока предыдущий экземпляр освободит аренду (или она истечет)
+            instance_lease.acquire()
+            startup.begin('telegram')
             
-            # Добавляем обработчики
-            application.add_handler(CommandHandler("start", start))
-            application.add_handler(CommandHandler("help", help_command))
-            application.add_handler(CommandHandler("list", list_command))
-            application.add_handler(CommandHandler("pdf", send_processes_pdf))
-            application.add_handler(CommandHandler("guide", send_guide))
-            application.add_handler(CommandHandler("video", send_bpmn_video))
-            application.add_handler(CommandHandler("test", send_test))
-            application.add_handler(CommandHandler("suggestion", suggestion_command))
-            application.add_handler(CommandHandler("viewsuggestions", view_suggestions_command))
-            application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
-            application.add_handler(CallbackQueryHandler(button_handler))
+            application = build_application(SQLitePersistence())
             
-            print("✅ Обработчики добавлены")
             print("🤖 Бот запускается...")
             
             # Запускаем бота с улучшенными параметрами
@@ -1216,16 +1647,21 @@ def main():
                 write_timeout=10
             )
             
+            # Штатная остановка (сигнал или передача управления новому экземпляру)
+            print("👋 Бот остановлен")
+            return
+            
         except telegram.error.Conflict as e:
+            # Другой экземпляр (например, на другом хосте) еще держит getUpdates
             print(f"❌ Конфликт: {e}")
-            print("🔄 Принудительное завершение предыдущей сессии...")
-            
-            # Снова пытаемся завершить процессы
-            kill_previous_python_processes()
             
-            retry_count += 1
-            wait_time = 10 * retry_count
-            print(f"🔄 Перезапуск через {wait_time} секунд...")
+            if conflict_waited >= conflict_budget:
+                print(f"❌ Конфликт не разрешился за {conflict_waited:.0f} с (аренда {instance_lease.ttl:.0f} с)")
+                break
+            conflict_count += 1
+            wait_time = min(2 * conflict_count, instance_lease.ttl / 2, conflict_budget - conflict_waited)
+            conflict_waited += wait_time
+            print(f"🔄 Перезапуск через {wait_time:.0f} секунд...")
             time.sleep(wait_time)
             
         except Exception as e:
@@ -1235,6 +1671,7 @@ def main():
             print(f"🔄 Перезапуск через {wait_time} секунд...")
             time.sleep(wait_time)
     
+    instance_lease.release()
     print("❌ Превышено максимальное количество попыток запуска")
     print("💡 Проверьте, нет ли других запущенных экземпляров бота")
 
@@ -0,0 +1,74 @@
+import threading
+import weakref
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Готовая карточка: (HTML-текст, InlineKeyboardMarkup)
+Card = Tuple[str, Any]
+
+
+class ProcessCardCache:
+    """Отрисованные карточки процессов для каждой версии каталога.
+
+    Карточки всех процессов каталога строятся одним проходом функцией
+    render(database, process_data) и хранятся до смены catalog_version.
+    Открытие процесса - один поиск в словаре. Пока карточки новой версии
+    не построены (другой каталог, перезагрузка), запрошенная карточка
+    рисуется отдельно, а полный проход идет в фоновом потоке - цикл событий
+    не ждет ни его, ни его замка. Базы каталогов - слабые ключи: карточки
+    выгруженного каталога освобождаются вместе с ним.
+    """
+
+    def __init__(self, render: Callable[[Any, Tuple], Card]):
+        self.render = render
+        self._cards: "weakref.WeakKeyDictionary[Any, Tuple[int, Dict[str, Card]]]" = weakref.WeakKeyDictionary()
+        # Версии каталогов, для которых уже запущена фоновая сборка
+        self._scheduled: "weakref.WeakKeyDictionary[Any, int]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._scheduled_lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'rendered': 0, 'builds': 0}
+
+    def prepare(self, database) -> Dict[str, Card]:
+        """Строит карточки текущей версии каталога (если они еще не построены); блокирующий вызов"""
+        version = database.catalog_version
+        entry = self._cards.get(database)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        with self._lock:
+            entry = self._cards.get(database)
+            if entry is not None and entry[0] == version:
+                return entry[1]
+            cards = {}
+            for process_id, _ in database.get_all_processes():
+                process_data = database.get_process_by_id(process_id)
+                if process_data:
+                    cards[process_id] = self.render(database, process_data)
+            self._cards[database] = (version, cards)
+            self.stats['builds'] += 1
+            return cards
+
+    def prepare_in_background(self, database):
+        """Запускает сборку карточек текущей версии в фоновом потоке (один раз на версию)"""
+        version = database.catalog_version
+        with self._scheduled_lock:
+            if self._scheduled.get(database) == version:
+                return
+            self._scheduled[database] = version
+        threading.Thread(target=self.prepare, args=(database,), name='process-cards', daemon=True).start()
+
+    def get(self, database, process_id: str) -> Optional[Card]:
+        """Карточка процесса или None; не блокируется на сборке всего каталога"""
+        entry = self._cards.get(database)
+        if entry is not None and entry[0] == database.catalog_version:
+            card = entry[1].get(process_id)
+            self.stats['hits' if card is not None else 'misses'] += 1
+            return card
+        self.prepare_in_background(database)
+        process_data = database.get_process_by_id(process_id)
+        if not process_data:
+            self.stats['misses'] += 1
+            return None
+        self.stats['rendered'] += 1
+        return self.render(database, process_data)
+
+    def metrics(self) -> dict:
+        return dict(self.stats, catalogs=len(self._cards))
@@ -0,0 +1,110 @@
+import os
+import time
+import logging
+import threading
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogWatcher:
+    """Следит за JSON-файлом каталога и перезагружает его без перезапуска бота.
+
+    Фоновый поток раз в interval секунд проверяет время изменения и размер
+    файла. Перезагрузка начинается, когда файл перестал меняться (одна проверка
+    без изменений), чтобы не читать его посреди записи. После успешной
+    подмены индекса вызываются обработчики on_reload (сброс и прогрев кэшей).
+    """
+
+    def __init__(self, get_database: Callable, interval: float = 2.0):
+        self.get_database = get_database
+        self.interval = interval
+        self.on_reload: List[Callable[[], None]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.stats = {
+            'version': 0,
+            'reloads': 0,
+            'failures': 0,
+            'processes': 0,
+            'last_reload_ms': None,
+            'last_reload_at': None,
+            'last_error': None,
+        }
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="catalog-watcher", daemon=True)
+        self._thread.start()
+        print(f"✅ Отслеживание изменений каталога: проверка раз в {self.interval} с")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _signature(self, path: str):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _run(self):
+        database = self.get_database()
+        path = database.catalog_file
+        with self._lock:
+            self.stats['version'] = database.catalog_version
+        loaded = self._signature(path)
+        pending = None
+        while not self._stop.wait(self.interval):
+            current = self._signature(path)
+            if current is None or current == loaded:
+                pending = None
+                continue
+            if current != pending:
+                # Файл только что изменился - ждем, пока запись закончится
+                pending = current
+                continue
+            self.reload(database)
+            loaded = current
+            pending = None
+
+    def reload(self, database=None) -> bool:
+        """Перезагружает каталог; True - новая версия подменила старую"""
+        database = database or self.get_database()
+        started = time.perf_counter()
+        try:
+            count = database.reload_catalog()
+        except Exception as e:
+            with self._lock:
+                self.stats['failures'] += 1
+                self.stats['last_error'] = str(e)
+            logger.error(f"Ошибка перезагрузки каталога {database.catalog_file}: {e}")
+            print(f"❌ Каталог не обновлен, работает прежняя версия: {e}")
+            return False
+        duration = round((time.perf_counter() - started) * 1000, 1)
+        with self._lock:
+            self.stats.update(
+                version=database.catalog_version,
+                processes=count,
+                last_reload_ms=duration,
+                last_reload_at=time.strftime('%Y-%m-%d %H:%M:%S'),
+                last_error=None,
+            )
+            self.stats['reloads'] += 1
+        print(f"🔄 Каталог обновлен до версии {database.catalog_version}: {count} процессов за {duration} мс")
+        for callback in self.on_reload:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Ошибка обработчика перезагрузки каталога: {e}")
+        return True
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return dict(self.stats)
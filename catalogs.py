@@ -0,0 +1,122 @@
+import os
+import threading
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from database import Database, get_db
+
+logger = logging.getLogger(__name__)
+
+# Каталог по умолчанию - общая база data/processes.db (get_db)
+DEFAULT_CATALOG = 'default'
+
+
+def parse_mapping(value: str) -> Dict[str, str]:
+    """Разбирает строку вида "ключ=значение,ключ2=значение2" из переменной окружения"""
+    mapping = {}
+    for part in value.split(','):
+        key, _, item = part.partition('=')
+        if key.strip() and item.strip():
+            mapping[key.strip()] = item.strip()
+    return mapping
+
+
+class CatalogRegistry:
+    """Несколько именованных каталогов процессов (по регионам или партнерам).
+
+    Каталог загружается при первом обращении: JSON -> собственная SQLite-база
+    data/catalogs/<имя>.db -> индекс поиска в памяти. Если индексы загруженных
+    каталогов превышают memory_budget байт, давно не использовавшиеся каталоги
+    выгружаются (кроме каталога по умолчанию) и при следующем обращении
+    загружаются заново.
+    """
+
+    def __init__(self, catalogs: Dict[str, str], memory_budget: int = 200 * 1024 * 1024,
+                 db_dir: str = 'data/catalogs'):
+        self.catalogs = dict(catalogs)
+        self.memory_budget = memory_budget
+        self.db_dir = db_dir
+        self._loaded: "OrderedDict[str, Database]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # Замки загрузки по именам: один каталог не грузится дважды одновременно
+        self._loading: Dict[str, threading.Lock] = {}
+        self.stats = {'loads': 0, 'evictions': 0}
+
+    def names(self) -> List[str]:
+        return [DEFAULT_CATALOG] + sorted(name for name in self.catalogs if name != DEFAULT_CATALOG)
+
+    def exists(self, name: str) -> bool:
+        return name == DEFAULT_CATALOG or name in self.catalogs
+
+    def peek(self, name: Optional[str]) -> Optional[Database]:
+        """База уже загруженного каталога или None (без загрузки с диска)"""
+        if not name or name == DEFAULT_CATALOG or name not in self.catalogs:
+            return get_db()
+        with self._lock:
+            database = self._loaded.get(name)
+            if database is not None:
+                self._loaded.move_to_end(name)
+            return database
+
+    def get(self, name: Optional[str] = None) -> Database:
+        """База каталога name (неизвестное имя - каталог по умолчанию).
+
+        Загрузка с диска идет под замком этого каталога, а не общим: поиск
+        по остальным каталогам в это время не ждет. Из обработчиков вызывается
+        через asyncio.to_thread.
+        """
+        database = self.peek(name)
+        if database is not None:
+            return database
+        with self._lock:
+            loading = self._loading.setdefault(name, threading.Lock())
+        with loading:
+            # Пока ждали замок, каталог мог загрузить соседний поток
+            database = self.peek(name)
+            if database is not None:
+                return database
+            database = self._load(name)
+            size = database.index_size()
+            with self._lock:
+                self._loaded[name] = database
+                self._sizes[name] = size
+                self.stats['loads'] += 1
+                self._loading.pop(name, None)
+                evicted = self._evict(keep=name)
+        print(f"✅ Каталог '{name}' загружен: {len(database._get_search_index())} процессов, ~{size // 1024} КБ")
+        for victim in evicted:
+            # Поиск идет по индексу в памяти - обработчику, который еще держит базу, соединение не нужно
+            victim.close()
+        return database
+
+    def _load(self, name: str) -> Database:
+        database = Database(
+            db_file=os.path.join(self.db_dir, f"{name}.db"),
+            catalog_file=self.catalogs[name]
+        )
+        database.build_index()
+        return database
+
+    def _evict(self, keep: str) -> List[Database]:
+        """Выгружает самые давние каталоги, пока не уложимся в бюджет памяти (вызывается под _lock)"""
+        evicted = []
+        while sum(self._sizes.get(name, 0) for name in self._loaded) > self.memory_budget:
+            victim = next((name for name in self._loaded if name != keep), None)
+            if victim is None:
+                logger.warning(f"Каталог '{keep}' один превышает бюджет памяти {self.memory_budget} байт")
+                break
+            evicted.append(self._loaded.pop(victim))
+            self._sizes.pop(victim, None)
+            self.stats['evictions'] += 1
+            print(f"♻️ Каталог '{victim}' выгружен из памяти")
+        return evicted
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return dict(
+                self.stats,
+                loaded=list(self._loaded),
+                memory_bytes=sum(self._sizes.get(name, 0) for name in self._loaded),
+            )
@@ -0,0 +1,75 @@
+import os
+import re
+import sys
+import subprocess
+
+# Бюджет времени импорта модулей (мс, суммарно с зависимостями)
+IMPORT_BUDGETS_MS = {
+    'config': 150,
+    'database': 50,
+    'result_cache': 30,
+    'admin_digest': 150,
+    'instance_lock': 150,
+    'startup': 30,
+    'persistence': 1000,
+    'bot': 1500,
+}
+
+def measure_import(module: str) -> list:
+    """Импортирует модуль в отдельном процессе с -X importtime.
+
+    Возвращает список (модуль, суммарное время в мкс) для самого модуля и его
+    зависимостей; последний элемент - сам модуль.
+    """
+    env = dict(os.environ)
+    # Импорт не должен требовать токен - убираем его, чтобы это проверить
+    env.pop('BOT_TOKEN', None)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    timings = []
+    for line in result.stderr.splitlines():
+        # Формат: "import time:   self [us] | cumulative | imported package"
+        match = re.match(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\| (\s*)(.*)$', line)
+        if not match:
+            continue
+        name, depth = match.group(4), len(match.group(3))
+        # Модули верхнего уровня до нашего (site и т.п.) грузятся интерпретатором
+        if depth == 0 and name != module:
+            timings = []
+            continue
+        timings.append((name, int(match.group(2))))
+        if depth == 0:
+            break
+    return timings
+
+def check_import_time() -> bool:
+    """Проверяет, что импорт модулей укладывается в бюджет"""
+    print("⏱ Проверка времени импорта модулей...")
+    ok = True
+    for module, budget_ms in IMPORT_BUDGETS_MS.items():
+        try:
+            timings = measure_import(module)
+        except Exception as e:
+            print(f"❌ {module}: ошибка импорта - {e}")
+            ok = False
+            continue
+
+        cumulative_ms = timings[-1][1] / 1000 if timings else 0
+        status = "✅" if cumulative_ms <= budget_ms else "❌"
+        if cumulative_ms > budget_ms:
+            ok = False
+        print(f"{status} {module}: {cumulative_ms:.1f} мс (бюджет {budget_ms} мс)")
+
+        # Самые тяжелые зависимости модуля
+        heaviest = sorted(timings[:-1], key=lambda item: item[1], reverse=True)[:3]
+        for name, us in heaviest:
+            print(f"     {name}: {us / 1000:.1f} мс")
+    return ok
+
+if __name__ == '__main__':
+    sys.exit(0 if check_import_time() else 1)
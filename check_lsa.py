@@ -0,0 +1,55 @@
+import os
+import sys
+import shutil
+import tempfile
+
+from database import Database
+from lsa_index import build_lsa_model
+
+# Синонимы каталога: запрос -> процессы, в тексте которых нет слов запроса, но которые
+# модель LSA должна добавить в выдачу ("недостача" описана в процессах как "недовоз")
+SYNONYM_CASES = {
+    'недостача': {'B1.5', 'B1.7'},
+}
+# Доля процессов, которые по собственному названию должны оставаться первыми в выдаче
+MIN_NAME_PRECISION = 0.9
+
+def check_lsa() -> bool:
+    """Строит модель LSA по каталогу data/processes.json и проверяет, что она находит синонимы"""
+    print("🧠 Проверка модели LSA...")
+    workdir = tempfile.mkdtemp(prefix='check_lsa_')
+    try:
+        db_file = os.path.join(workdir, 'processes.db')
+        lexical = Database(db_file=db_file)
+        lexical.build_index()
+        build_lsa_model(lexical, os.path.join(workdir, 'lsa'))
+        semantic = Database(db_file=db_file, lsa_model=os.path.join(workdir, 'lsa'))
+        semantic.build_index()
+
+        ok = True
+        for query, expected in SYNONYM_CASES.items():
+            found_by_words = {process[0] for process, _ in lexical.rank_processes(query)}
+            added = {process[0] for process, _ in semantic.rank_processes(query)} - found_by_words
+            missing = expected - added
+            status = "✅" if not missing else "❌"
+            if missing:
+                ok = False
+            print(f"{status} '{query}': LSA добавила {sorted(added) or 'ничего'}"
+                  + (f", не найдены {sorted(missing)}" if missing else ""))
+
+        processes = semantic.get_all_processes()
+        first = sum(
+            1 for process_id, process_name in processes
+            if (semantic.rank_processes(process_name.lower()) or [((None,), 0)])[0][0][0] == process_id
+        )
+        precision = first / len(processes) if processes else 0.0
+        status = "✅" if precision >= MIN_NAME_PRECISION else "❌"
+        if precision < MIN_NAME_PRECISION:
+            ok = False
+        print(f"{status} Поиск по названию: процесс первый в {first} из {len(processes)} ({precision:.0%})")
+        return ok
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    sys.exit(0 if check_lsa() else 1)
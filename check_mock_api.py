@@ -0,0 +1,129 @@
+# check_mock_api.py - сквозная проверка бота против заглушки Bot API (mock_bot_api.py)
+#
+# Бот из bot.build_application получает обновления через getUpdates заглушки,
+# которая отвечает с задержкой и часть вызовов отклоняет с 429 RetryAfter.
+# Проверка проходит, если каждый оператор получил ответ, а обработчики не
+# записали ни одной ошибки. Код возврата 1 - регрессия.
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+
+from mock_bot_api import MockBotAPI, start_mock_server
+
+
+class ErrorCounter(logging.Handler):
+    """Считает записи журнала уровня ERROR и выше (ошибки обработчиков и PTB)"""
+
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+async def run_scenario(args, api: MockBotAPI, base_url: str) -> dict:
+    os.environ.setdefault('BOT_TOKEN', '123456:MOCK-API-TOKEN')
+    # Адрес Bot API читается config.py при импорте бота
+    os.environ['TELEGRAM_API_BASE_URL'] = base_url
+    import bot
+    from persistence import SQLitePersistence
+    from load_test import UpdateGenerator, parse_mix, use_temporary_state
+
+    with open(os.path.join('data', 'processes.json'), 'r', encoding='utf-8') as f:
+        processes = json.load(f)
+
+    bot.rate_limiter.enabled = False
+    state_dir = use_temporary_state(bot, prefix='check_mock_api_')
+    application = bot.build_application(SQLitePersistence(os.path.join(state_dir, 'persistence.db')))
+    await application.initialize()
+    await bot.post_init(application)
+    bot.get_db().build_index()
+    await application.start()
+    await application.updater.start_polling(poll_interval=0, timeout=1)
+
+    generator = UpdateGenerator(parse_mix(args.mix), processes, seed=args.seed)
+    users = [10_000 + i for i in range(args.users)]
+    updates = []
+    for i in range(args.updates):
+        updates.extend(generator.next_batch(users[i % len(users)])[1])
+    api.add_updates(updates)
+
+    # Ждем, пока бот заберет все обновления и затихнет (ответы с повторами после 429 идут дольше)
+    deadline = time.monotonic() + args.timeout
+    last_calls = None
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.5)
+        stats = api.stats()
+        calls = sum(count for method, count in stats['calls'].items() if method != 'getUpdates')
+        if stats['pending_updates'] == 0 and calls == last_calls:
+            break
+        last_calls = calls
+
+    await application.updater.stop()
+    await application.stop()
+    await bot.post_stop(application)
+    await application.shutdown()
+    shutil.rmtree(state_dir, ignore_errors=True)
+
+    answered = {message['chat']['id'] for _, message in api.sent_messages}
+    return {
+        'updates': len(updates),
+        'users_without_reply': sorted(set(users) - answered),
+        'api': api.stats(),
+        'bot_api_retries': bot.api_retries.metrics(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сквозная проверка бота против заглушки Bot API")
+    parser.add_argument('--users', type=int, default=10, help="число операторов")
+    parser.add_argument('--updates', type=int, default=60, help="сколько действий выполнить")
+    parser.add_argument('--mix', default='search=50,code=10,show=20,list=10,help=10', help="смесь действий")
+    parser.add_argument('--latency', type=float, default=0.02, help="задержка ответа заглушки, с")
+    parser.add_argument('--retry-after-rate', type=float, default=0.1, help="доля ответов 429 RetryAfter")
+    parser.add_argument('--retry-after', type=int, default=1, help="значение retry_after, с")
+    parser.add_argument('--timeout', type=float, default=60, help="сколько ждать обработки, с")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    errors = ErrorCounter()
+    logging.getLogger().addHandler(errors)
+    logging.disable(logging.WARNING)
+
+    api = MockBotAPI(latency=args.latency, retry_after_rate=args.retry_after_rate,
+                     retry_after=args.retry_after, seed=args.seed)
+    server = start_mock_server(api, port=0)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/bot"
+    try:
+        report = asyncio.run(run_scenario(args, api, base_url))
+    finally:
+        server.shutdown()
+
+    print("📊 ПРОВЕРКА ПРОТИВ ЗАГЛУШКИ BOT API")
+    print(f"Обновлений: {report['updates']}, ответов 429: {report['api']['retry_after_sent']}, "
+          f"повторов после 429: {report['bot_api_retries']['retried']}")
+    print(f"Вызовы Bot API: {report['api']['calls']}")
+    ok = True
+    if report['api']['pending_updates']:
+        print(f"❌ Бот не забрал обновлений: {report['api']['pending_updates']}")
+        ok = False
+    if report['users_without_reply']:
+        print(f"❌ Операторы без ответа: {report['users_without_reply']}")
+        ok = False
+    if errors.records:
+        print(f"❌ Ошибок в журнале: {len(errors.records)}")
+        for record in errors.records[:5]:
+            print(f"   {record.name}: {record.getMessage()}")
+        ok = False
+    print("✅ Все операторы получили ответы, ошибок нет" if ok else "❌ Проверка не пройдена")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from process_tree import code_key
+
+# Похожие буквы, разделители и русская раскладка -> канонический вид кода (B1.3).
+# Таблица компилируется один раз при импорте, str.translate работает на уровне C.
+CODE_TRANSLATION = str.maketrans({
+    'В': 'B', 'в': 'B', 'b': 'B',
+    ',': '.', '/': '.', '\\': '.', '-': '.', '_': '.', ':': '.', ';': '.',
+    'ю': '.', 'Ю': '.', 'б': '.', 'Б': '.',  # клавиши "." и "," в русской раскладке
+    ' ': None, '\t': None,
+})
+CODE_PATTERN = re.compile(r'B\d[\d.]*')
+# Буква кода отделена от цифр пробелом: "в 12" - скорее предлог и число, чем B1.2
+SPACED_LETTER_PATTERN = re.compile(r'[ВвBb]\s+\d')
+DOTS_PATTERN = re.compile(r'\.{2,}')
+
+EXACT = 'exact'          # один процесс с таким кодом
+PREFIX = 'prefix'        # раздел или группа: B1, B1.5
+AMBIGUOUS = 'ambiguous'  # несколько подходящих кодов: B110 -> B1.10 или B11.0
+NOT_FOUND = 'not_found'  # похоже на код, но такого процесса нет
+
+# Ключ узла бора, под которым хранится код процесса (символы кода - непустые строки)
+TERMINAL = ''
+
+
+class CodeMatch(NamedTuple):
+    kind: str
+    code: str         # найденный код, код группы или нормализованный ввод
+    codes: List[str]  # процессы для ответа в порядке дерева
+
+
+def normalize_code(text: str) -> Optional[str]:
+    """Приводит ввод к виду B1.3; None - ввод не похож на код процесса.
+
+    Если буква отделена от цифр пробелом, нужен явный разделитель
+    сегментов: "в 1.2" - код B1.2, а "в 12" - обычный поисковый запрос.
+    """
+    text = text.strip()
+    code = DOTS_PATTERN.sub('.', text.translate(CODE_TRANSLATION).upper()).strip('.')
+    if not CODE_PATTERN.fullmatch(code):
+        return None
+    if SPACED_LETTER_PATTERN.match(text) and '.' not in code:
+        return None
+    return code
+
+
+class CodeResolver:
+    """Бор (trie) по кодам процессов каталога.
+
+    Строится один раз при загрузке каталога. Нормализованный ввод проходит
+    по бору посимвольно; точку между сегментами можно пропустить (B13 -> B1.3),
+    поэтому ввод может привести в несколько узлов - тогда ответ неоднозначный.
+    """
+
+    def __init__(self, codes: Iterable[str]):
+        self._root: Dict[str, dict] = {}
+        for code in codes:
+            node = self._root
+            for char in code.upper():
+                node = node.setdefault(char, {})
+            node[TERMINAL] = code
+
+    def _walk(self, node: dict, text: str, i: int, path: str, found: List[Tuple[dict, str]]):
+        if i == len(text):
+            found.append((node, path))
+            return
+        char = text[i]
+        child = node.get(char)
+        if child is not None:
+            self._walk(child, text, i + 1, path + char, found)
+        if char != '.':
+            # Пропущенный разделитель сегментов
+            dot = node.get('.')
+            if dot is not None and char in dot:
+                self._walk(dot[char], text, i + 1, path + '.' + char, found)
+
+    def _collect(self, node: dict, result: List[str]):
+        for char, child in node.items():
+            if char == TERMINAL:
+                result.append(child)
+            else:
+                self._collect(child, result)
+
+    def resolve(self, text: str) -> Optional[CodeMatch]:
+        """Разбирает ввод пользователя; None - это не код, нужен обычный поиск"""
+        code = normalize_code(text)
+        if code is None:
+            return None
+        found: List[Tuple[dict, str]] = []
+        self._walk(self._root, code, 0, '', found)
+
+        exact = sorted({node[TERMINAL] for node, _ in found if TERMINAL in node}, key=code_key)
+        if len(exact) == 1:
+            return CodeMatch(EXACT, exact[0], exact)
+        if exact:
+            return CodeMatch(AMBIGUOUS, code, exact)
+
+        # Группа: все процессы за точкой после введенного префикса
+        groups = [(node['.'], path) for node, path in found if '.' in node]
+        if len(groups) == 1:
+            group, path = groups[0]
+            codes: List[str] = []
+            self._collect(group, codes)
+            return CodeMatch(PREFIX, path, sorted(codes, key=code_key))
+
+        # Несколько групп или незаконченный сегмент (B1.1 при B1.10, B1.11)
+        candidates: List[str] = []
+        for node, _ in found:
+            self._collect(node, candidates)
+        if candidates:
+            return CodeMatch(AMBIGUOUS, code, sorted(set(candidates), key=code_key))
+        return CodeMatch(NOT_FOUND, code, [])
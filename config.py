@@ -3,12 +3,97 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-BOT_TOKEN = os.getenv('BOT_TOKEN')
+# Навигация по кнопкам редактированием текущего сообщения вместо отправки нового
+EDIT_IN_PLACE = os.getenv('EDIT_IN_PLACE', '1') != '0'
 
-if not BOT_TOKEN:
-    raise ValueError("❌ BOT_TOKEN не найден в переменных окружения. Проверьте файл .env")
+# Сводка предложений для администратора
+ADMIN_DIGEST_INTERVAL = float(os.getenv('ADMIN_DIGEST_INTERVAL', '300'))
+ADMIN_DIGEST_MAX_ITEMS = int(os.getenv('ADMIN_DIGEST_MAX_ITEMS', '10'))
+ADMIN_URGENT_KEYWORDS = [
+    word.strip() for word in os.getenv('ADMIN_URGENT_KEYWORDS', 'срочно,ошибка,не работает').split(',')
+    if word.strip()
+]
 
-if not os.path.exists('data'):
-    os.makedirs('data')
+# Через сколько секунд без продления аренда экземпляра бота считается свободной
+INSTANCE_LEASE_TTL = float(os.getenv('INSTANCE_LEASE_TTL', '15'))
 
-print(f"✅ Конфигурация загружена. Токен: {'*' * 10}{BOT_TOKEN[-5:]}")
\ No newline at end of file
+# Несколько воркеров на вебхуках (python workers.py)
+WORKERS = int(os.getenv('WORKERS', '2'))
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+SEARCH_INDEX_PATH = os.getenv('SEARCH_INDEX_PATH', 'data/search_index.bin')
+SUGGESTION_SPOOL_PATH = os.getenv('SUGGESTION_SPOOL_PATH', 'data/suggestions_spool')
+
+# Журнал поисковых запросов (JSONL, ротация по размеру со сжатием gzip)
+QUERY_LOG_PATH = os.getenv('QUERY_LOG_PATH', 'data/query_log.jsonl')
+QUERY_LOG_MAX_BYTES = int(os.getenv('QUERY_LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+QUERY_LOG_BACKUPS = int(os.getenv('QUERY_LOG_BACKUPS', '5'))
+# Соль хэшей id пользователей; если не задана - случайная из файла QUERY_LOG_SALT_PATH (создается при первом запуске)
+QUERY_LOG_SALT = os.getenv('QUERY_LOG_SALT', '')
+QUERY_LOG_SALT_PATH = os.getenv('QUERY_LOG_SALT_PATH', 'data/query_log.salt')
+
+# Прогрев кэша поиска при старте: самые частые запросы из журнала
+CACHE_WARMUP_TOP_N = int(os.getenv('CACHE_WARMUP_TOP_N', '200'))
+CACHE_WARMUP_BUDGET = float(os.getenv('CACHE_WARMUP_BUDGET', '10'))
+
+# Аналитика поиска (популярные запросы, запросы без результатов, выбор процессов)
+ANALYTICS_DB_PATH = os.getenv('ANALYTICS_DB_PATH', 'data/analytics.db')
+ANALYTICS_TOP_K = int(os.getenv('ANALYTICS_TOP_K', '1000'))
+ANALYTICS_CHECKPOINT_INTERVAL = float(os.getenv('ANALYTICS_CHECKPOINT_INTERVAL', '60'))
+
+# Как часто проверять изменения data/processes.json для перезагрузки без перезапуска, с (0 - не следить)
+CATALOG_WATCH_INTERVAL = float(os.getenv('CATALOG_WATCH_INTERVAL', '2'))
+
+# Дополнительные каталоги процессов: "имя=путь.json,имя2=путь2.json"
+CATALOGS = os.getenv('CATALOGS', '')
+# Каталог для чатов: "chat_id=имя,chat_id2=имя2" (пользователь может выбрать свой через /catalog)
+CHAT_CATALOGS = os.getenv('CHAT_CATALOGS', '')
+CATALOG_MEMORY_BUDGET_MB = float(os.getenv('CATALOG_MEMORY_BUDGET_MB', '200'))
+
+# Модель LSA для поиска по синонимам - каталог .npy (строится заранее: python lsa_index.py;
+# при перезагрузке каталога пересобирается ботом; пустое значение - отключить)
+LSA_MODEL_PATH = os.getenv('LSA_MODEL_PATH', 'data/lsa_model')
+
+# Ограничение частоты обновлений (корзина токенов): на пользователя и на весь бот, в секунду (0 - без ограничения)
+THROTTLE_USER_RATE = float(os.getenv('THROTTLE_USER_RATE', '1'))
+THROTTLE_USER_BURST = float(os.getenv('THROTTLE_USER_BURST', '5'))
+THROTTLE_GLOBAL_RATE = float(os.getenv('THROTTLE_GLOBAL_RATE', '50'))
+THROTTLE_GLOBAL_BURST = float(os.getenv('THROTTLE_GLOBAL_BURST', '100'))
+THROTTLE_MAX_USERS = int(os.getenv('THROTTLE_MAX_USERS', '10000'))
+
+# Очередь фоновых задач (сохранение пожеланий, отправка файлов): база, исполнители, попытки
+TASK_QUEUE_DB_PATH = os.getenv('TASK_QUEUE_DB_PATH', 'data/tasks.db')
+TASK_QUEUE_WORKERS = int(os.getenv('TASK_QUEUE_WORKERS', '4'))
+TASK_QUEUE_MAX_ATTEMPTS = int(os.getenv('TASK_QUEUE_MAX_ATTEMPTS', '5'))
+
+# Повтор вызовов Bot API после 429 RetryAfter: число повторов и самая долгая пауза, которую стоит ждать, с
+BOT_API_MAX_RETRIES = int(os.getenv('BOT_API_MAX_RETRIES', '3'))
+BOT_API_RETRY_MAX_WAIT = float(os.getenv('BOT_API_RETRY_MAX_WAIT', '10'))
+
+# Адрес Bot API (например, локальная заглушка mock_bot_api.py: http://127.0.0.1:8081/bot)
+TELEGRAM_API_BASE_URL = os.getenv('TELEGRAM_API_BASE_URL', '')
+
+_bot_token = None
+
+def get_bot_token() -> str:
+    """Возвращает токен бота; проверка выполняется при первом обращении, а не при импорте"""
+    global _bot_token
+    if _bot_token is None:
+        token = os.getenv('BOT_TOKEN')
+        
+        if not token:
+            raise ValueError("❌ BOT_TOKEN не найден в переменных окружения. Проверьте файл .env")
+        
+        if not os.path.exists('data'):
+            os.makedirs('data')
+        
+        _bot_token = token
+        print(f"✅ Конфигурация загружена. Токен: {'*' * 10}{token[-5:]}")
+    return _bot_token
+
+def __getattr__(name):
+    # Совместимость со старым config.BOT_TOKEN: токен читается только при обращении
+    if name == 'BOT_TOKEN':
+        return get_bot_token()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -1,16 +1,116 @@
 import os
+import sys
 import sqlite3
 import re
 import json
-from typing import List, Tuple, Any, Optional
+import logging
+import threading
+from typing import List, Tuple, Any, Optional, Dict, Set, NamedTuple
 from datetime import datetime
 
+import russian_stemmer
+from process_tree import ProcessTree
+from code_resolver import CodeResolver
+from highlight import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Основы короче этой длины дают слишком много ложных совпадений подстрокой
+MIN_STEM_LENGTH = 4
+
+# Доменные варианты слов, которые не получить морфологией
+SPECIAL_CASES = {
+    'расхождение': ['расхожд'],
+    'расхождения': ['расхожд'],
+    'повреждение': ['поврежд'],
+    'повреждения': ['поврежд'],
+    'зафиксировать': ['зафиксир', 'фиксир'],
+    'значительный': ['значительн', 'значим'],
+    'значительные': ['значительн', 'значим'],
+    'недовоз': ['недов'],
+    'прием': ['прием', 'принима'],
+    'пустой': ['пусто'],
+    'пустая': ['пусто'],
+    'пустые': ['пусто'],
+    'упаковка': ['упаков'],
+    'упаковки': ['упаков'],
+    'упаковку': ['упаков'],
+    'селлер': ['селер'],
+    'перевозка': ['перевоз'],
+    'перевозки': ['перевоз'],
+    'размещение': ['размещ'],
+    'проверка': ['провер'],
+    'целостности': ['целост'],
+}
+
+class CatalogIndex(NamedTuple):
+    """Снимок каталога для поиска. Строится целиком заранее и подменяется одним
+    присваиванием - поиск никогда не видит наполовину построенный индекс."""
+    entries: List[Tuple[Tuple, Tuple[str, str, str]]]  # (процесс, нормализованные поля)
+    by_id: Dict[str, Tuple]
+    word_forms: Dict[str, Tuple[str, ...]]
+    corpus_stems: Set[str]
+    version: int
+    tree: ProcessTree
+    codes: CodeResolver
+    tokens: Dict[str, Tuple]  # process_id -> смещения слов названия, описания и ключевых слов
+
+
+def load_catalog_file(json_path: str) -> List[Tuple[str, str, str, str]]:
+    """Читает и проверяет JSON каталога; возвращает строки (process_id, process_name, description, keywords)"""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        processes = json.load(f)
+    if not isinstance(processes, list) or not processes:
+        raise ValueError("каталог должен быть непустым списком процессов")
+    rows = []
+    seen = set()
+    for i, process in enumerate(processes, 1):
+        if not isinstance(process, dict):
+            raise ValueError(f"запись {i}: ожидается объект")
+        process_id = process.get('process_id')
+        process_name = process.get('process_name')
+        if not isinstance(process_id, str) or not process_id.strip():
+            raise ValueError(f"запись {i}: нет process_id")
+        if not isinstance(process_name, str) or not process_name.strip():
+            raise ValueError(f"запись {i} ({process_id}): нет process_name")
+        if process_id in seen:
+            raise ValueError(f"повторяется process_id {process_id}")
+        seen.add(process_id)
+        rows.append((
+            process_id,
+            process_name,
+            process.get('description') or 'Описание отсутствует',
+            process.get('keywords') or '',
+        ))
+    return rows
+
 class Database:
-    def __init__(self, db_file: str = 'data/processes.db'):
+    def __init__(self, db_file: str = 'data/processes.db', index_file: Optional[str] = None,
+                 suggestion_spool: Optional[str] = None, catalog_file: str = 'data/processes.json',
+                 lsa_model: Optional[str] = None):
         self.db_file = db_file
+        self.catalog_file = catalog_file
+        # Семантический ранжировщик (LSA) загружается вместе с индексом, если модель построена
+        self.lsa_model_file = lsa_model
+        self.lsa = None
         os.makedirs(os.path.dirname(db_file), exist_ok=True)
         self.conn = sqlite3.connect(db_file, check_same_thread=False)
         self.conn.row_factory = sqlite3.Row  # Для доступа к полям по имени
+        # Индекс поиска в памяти (CatalogIndex) и номер версии каталога
+        self._index: Optional[CatalogIndex] = None
+        self.catalog_version = 0
+        self._reload_lock = threading.Lock()
+        # Режим воркера: каталог читается из готового индекса (mmap), пожелания пишет отдельный процесс
+        self.mmap_index = None
+        self._mmap_tree: Optional[ProcessTree] = None
+        self._mmap_codes: Optional[CodeResolver] = None
+        self._mmap_tokens: Dict[str, Tuple] = {}
+        self.suggestion_spool = suggestion_spool
+        if index_file:
+            from search_index import MmapSearchIndex
+            self.mmap_index = MmapSearchIndex(index_file)
+            print(f"✅ Открыт индекс поиска {index_file}: {len(self.mmap_index)} процессов")
+            return
         self.create_tables()
         self.populate_data()
     
@@ -49,7 +149,7 @@ class Database:
         """Заполняет базу данных данными из JSON файла"""
         try:
             # Проверяем существование файла
-            json_path = 'data/processes.json'
+            json_path = self.catalog_file
             
             if not os.path.exists(json_path):
                 print(f"❌ Файл {json_path} не найден")
@@ -83,6 +183,9 @@ class Database:
             self.conn.commit()
             cursor.close()
             
+            # Каталог изменился - индекс нужно построить заново
+            self._index = None
+            
             print(f"✅ База данных заполнена. Добавлено {len(processes)} процессов")
             
         except Exception as e:
@@ -92,90 +195,185 @@ class Database:
         """Нормализует текст: заменяет ё на е и приводит к нижнему регистру"""
         if not text:
             return ""
-        return text.lower().replace('ё', 'e')
+        return text.lower().replace('ё', 'е')
 
     def _get_word_stems(self, word: str) -> List[str]:
-        """Возвращает возможные основы слова для поиска с учетом нормализации е/ё"""
+        """Возвращает возможные основы слова для поиска с учетом нормализации е/ё.
+
+        Слова каталога берутся из словаря словоформ, построенного при индексации;
+        стеммер вызывается только для слов, которых в каталоге нет.
+        """
         word = self._normalize_text(word.strip())
-        
+        # В режиме воркера словарь и основы каталога лежат в файле индекса
+        index = self._index if self._index is not None else self.mmap_index
+        stems = index.word_forms.get(word) if index is not None else None
+        if stems is None:
+            stems = self._stem_word(word, index.corpus_stems if index is not None else None)
+        return list(stems)
+
+    def _stem_word(self, word: str, corpus_stems: Optional[Set[str]] = None) -> List[str]:
+        """Основы нормализованного слова: само слово, основа Snowball и доменные варианты"""
         if len(word) < 3:
             return [word]
         
         stems = [word]
         
-        # Основные правила для русского языка
-        if len(word) > 4:
-            # Убираем распространенные окончания прилагательных и существительных
-            if (word.endswith('ой') or word.endswith('ый') or word.endswith('ий') or 
-                word.endswith('ая') or word.endswith('яя') or 
-                word.endswith('ое') or word.endswith('ее') or 
-                word.endswith('ые') or word.endswith('ие')):
-                stems.append(word[:-2])
-            
-            # Окончания существительных
-            elif (word.endswith('ах') or word.endswith('ях') or 
-                  word.endswith('ам') or word.endswith('ям') or
-                  word.endswith('ами') or word.endswith('ями') or
-                  word.endswith('ов') or word.endswith('ев') or
-                  word.endswith('ом') or word.endswith('ем') or
-                  word.endswith('ой') or word.endswith('ей')):
-                stems.append(word[:-2])
-                if len(word) > 5:
-                    stems.append(word[:-3])
-                    
-            elif (word.endswith('у') or word.endswith('ю') or
-                  word.endswith('а') or word.endswith('я') or
-                  word.endswith('о') or word.endswith('е') or
-                  word.endswith('ь')):
-                stems.append(word[:-1])
+        # Слишком короткие основы ("прием" -> "при") совпадают с половиной каталога
+        stem = russian_stemmer.stem(word)
+        if len(stem) >= MIN_STEM_LENGTH:
+            stems.append(stem)
+            # Беглая гласная в родительном падеже множественного числа ("перевозок" -> "перевозк"),
+            # вариант берем, только если такая основа есть в каталоге
+            if (corpus_stems and len(stem) > MIN_STEM_LENGTH and stem[-2] in 'ое' and stem[-1] not in russian_stemmer.VOWELS):
+                candidate = stem[:-2] + stem[-1]
+                if candidate in corpus_stems:
+                    stems.append(candidate)
         
         # Специальные случаи для часто используемых слов
-        special_cases = {
-            'расхождение': ['расхожд', 'расхожден'],
-            'расхождения': ['расхожд', 'расхожден'],
-            'повреждение': ['поврежден', 'поврежд'],
-            'повреждения': ['поврежден', 'поврежд'],
-            'зафиксировать': ['зафиксир', 'фиксир'],
-            'значительный': ['значительн', 'значим'],
-            'значительные': ['значительн', 'значим'],
-            'недовоз': ['недовоз', 'недов'],
-            'прием': ['прием', 'приём', 'принима'],
-            'приём': ['прием', 'приём', 'принима'],
-            'пустой': ['пуст', 'пусто'],
-            'пустая': ['пуст', 'пусто'],
-            'пустые': ['пуст', 'пусто'],
-            'упаковка': ['упаковк', 'упаков'],
-            'упаковки': ['упаковк', 'упаков'],
-            'упаковку': ['упаковк', 'упаков'],
-            'селлер': ['селлер', 'селер'],
-            'перевозка': ['перевоз', 'перевозк'],
-            'перевозки': ['перевоз', 'перевозк'],
-            'размещение': ['размещен', 'размещ'],
-            'проверка': ['провер', 'проверк'],
-            'целостности': ['целост', 'целостн'],
-            'товара': ['товар'],
-            'товары': ['товар'],
-        }
-        
-        if word in special_cases:
-            stems.extend(special_cases[word])
-        
-        # Добавляем варианты с ё/е для текущего слова
-        if 'е' in word:
-            stems.append(word.replace('е', 'ё'))
-        if 'ё' in word:
-            stems.append(word.replace('ё', 'е'))
+        stems.extend(SPECIAL_CASES.get(word, ()))
         
         return list(set([stem for stem in stems if len(stem) >= 3]))
 
-    def _calculate_relevance(self, process_data: Tuple, query_stems: List[str], original_query: str) -> int:
+    def _make_index(self, rows: List[Tuple], version: int) -> CatalogIndex:
+        """Строит снимок каталога: нормализованные поля, словарь словоформ и основы"""
+        entries = []
+        for process_data in rows:
+            process_id, process_name, description, keywords = process_data
+            normalized = (
+                self._normalize_text(process_name),
+                self._normalize_text(description or ''),
+                self._normalize_text(keywords or '')
+            )
+            entries.append((tuple(process_data), normalized))
+        
+        # Словарь словоформ каталога: слово -> основы (строится один раз при индексации)
+        words = {word for _, normalized in entries for text in normalized for word in re.findall(r'\w+', text)}
+        corpus_stems = {russian_stemmer.stem(word) for word in words}
+        word_forms = {word: tuple(self._stem_word(word, corpus_stems)) for word in words}
+        
+        return CatalogIndex(
+            entries=entries,
+            by_id={process_data[0]: process_data for process_data, _ in entries},
+            word_forms=word_forms,
+            corpus_stems=corpus_stems,
+            version=version,
+            tree=ProcessTree(process_data[0] for process_data, _ in entries),
+            codes=CodeResolver(process_data[0] for process_data, _ in entries),
+            tokens={process_data[0]: tuple(tokenize(text) for text in normalized) for process_data, normalized in entries},
+        )
+
+    def build_index(self) -> int:
+        """Загружает каталог в память вместе с нормализованными полями для поиска"""
+        if self.mmap_index is not None:
+            self._load_lsa()
+            return len(self.mmap_index)
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT process_id, process_name, description, keywords FROM processes')
+        rows = cursor.fetchall()
+        cursor.close()
+        self._index = self._make_index(rows, self.catalog_version or 1)
+        self.catalog_version = self._index.version
+        self._load_lsa()
+        return len(self._index.entries)
+
+    def _load_lsa(self):
+        """Загружает модель LSA (python lsa_index.py), если она построена для этого каталога"""
+        if self.lsa is not None or not self.lsa_model_file or not os.path.exists(self.lsa_model_file):
+            return
+        try:
+            from lsa_index import LsaRanker
+            lsa = LsaRanker(self.lsa_model_file)
+        except Exception as e:
+            print(f"❌ Модель LSA {self.lsa_model_file} не загружена, поиск только по словам: {e}")
+            return
+        if set(lsa.process_ids) != {process_id for process_id, _ in self.get_all_processes()}:
+            # Устаревшая модель не знает новых процессов и ссылается на удаленные - не используем
+            print("⚠️ Модель LSA построена для другой версии каталога, поиск только по словам - "
+                  "пересоберите ее: python lsa_index.py")
+            return
+        self.lsa = lsa
+        print(f"✅ Модель LSA {self.lsa_model_file}: {len(lsa.process_ids)} процессов, {lsa.dimensions} измерений")
+
+    def _rebuild_lsa(self):
+        """После перезагрузки каталога пересобирает модель LSA (если она используется); при ошибке LSA отключается"""
+        if not self.lsa_model_file or not os.path.exists(self.lsa_model_file):
+            return
+        try:
+            from lsa_index import LsaRanker, build_lsa_model
+            # Размерность выбирается заново: число процессов могло измениться
+            build_lsa_model(self, self.lsa_model_file)
+            self.lsa = LsaRanker(self.lsa_model_file)
+        except Exception as e:
+            self.lsa = None
+            print(f"❌ Модель LSA не пересобрана для нового каталога, поиск только по словам: {e}")
+
+    def reload_catalog(self) -> int:
+        """Перечитывает JSON каталога без перезапуска бота.
+
+        Новый индекс строится рядом со старым (поиск в это время работает по
+        старому), затем каталог сохраняется в SQLite и индекс подменяется
+        одним присваиванием. При ошибке в JSON остается старая версия.
+        """
+        if self.mmap_index is not None:
+            raise RuntimeError("каталог воркера читается из готового индекса и не перезагружается")
+        with self._reload_lock:
+            rows = load_catalog_file(self.catalog_file)
+            index = self._make_index(rows, self.catalog_version + 1)
+            
+            # Отдельное соединение: читатели основного не увидят незавершенную транзакцию
+            conn = sqlite3.connect(self.db_file, timeout=10)
+            try:
+                with conn:
+                    conn.execute('DELETE FROM processes')
+                    conn.executemany('''
+                        INSERT INTO processes (process_id, process_name, description, keywords)
+                        VALUES (?, ?, ?, ?)
+                    ''', rows)
+            finally:
+                conn.close()
+            
+            self._index = index
+            self.catalog_version = index.version
+            self._rebuild_lsa()
+            return len(rows)
+
+    def index_size(self) -> int:
+        """Примерный объем индекса поиска в памяти, байт"""
+        index = self._index
+        if index is None:
+            return 0
+        size = sys.getsizeof(index.entries) + sys.getsizeof(index.by_id)
+        for process_data, normalized in index.entries:
+            size += sum(sys.getsizeof(value) for value in process_data if value is not None)
+            size += sum(sys.getsizeof(value) for value in normalized)
+        size += sys.getsizeof(index.word_forms) + sys.getsizeof(index.corpus_stems)
+        size += sum(sys.getsizeof(word) + sys.getsizeof(stems) for word, stems in index.word_forms.items())
+        size += sum(sys.getsizeof(field) + sum(sys.getsizeof(token) for token in field)
+                    for fields in index.tokens.values() for field in fields)
+        return size
+
+    def _get_index(self) -> CatalogIndex:
+        index = self._index
+        if index is None:
+            self.build_index()
+            index = self._index
+        return index
+
+    def _get_search_index(self) -> List[Tuple[Tuple, Tuple[str, str, str]]]:
+        return self._get_index().entries
+
+    def _calculate_relevance(self, process_data: Tuple, query_stems: List[str], original_query: str,
+                             normalized: Optional[Tuple[str, str, str]] = None) -> int:
         """Вычисляет релевантность процесса для запроса"""
         process_id, process_name, description, keywords = process_data
         
-        # Нормализуем все текстовые поля процесса
-        norm_process_name = self._normalize_text(process_name)
-        norm_description = self._normalize_text(description or '')
-        norm_keywords = self._normalize_text(keywords or '')
+        # Нормализуем все текстовые поля процесса (если не взяты готовыми из индекса)
+        if normalized:
+            norm_process_name, norm_description, norm_keywords = normalized
+        else:
+            norm_process_name = self._normalize_text(process_name)
+            norm_description = self._normalize_text(description or '')
+            norm_keywords = self._normalize_text(keywords or '')
         
         # Объединяем все поля для поиска
         all_text = f"{norm_process_name} {norm_description} {norm_keywords}"
@@ -223,75 +421,135 @@ class Database:
         
         return relevance
 
-    def search_processes(self, query: str) -> List[Tuple]:
-        """Улучшенный поиск процессов с точной релевантностью"""
-        cursor = self.conn.cursor()
-        
+    def query_stems(self, query: str) -> List[str]:
+        """Уникальные стеммы всех слов запроса"""
+        all_stems = []
+        for word in query.split():
+            if word.strip():
+                all_stems.extend(self._get_word_stems(word.strip()))
+        return list(set(all_stems))
+
+    def rank_processes(self, query: str) -> List[Tuple[Tuple, int]]:
+        """Возвращает полный ранжированный список (процесс, релевантность) без ограничения по количеству"""
         # Разбиваем запрос на слова
         words = [word.strip() for word in query.split() if word.strip()]
         
         if not words:
             return []
         
-        # Получаем все процессы для поиска
-        cursor.execute('SELECT process_id, process_name, description, keywords FROM processes')
-        all_processes = cursor.fetchall()
+        logger.debug(f"Поиск: '{query}'")
         
-        print(f"🔍 Поиск: '{query}'")  # Отладочная информация
-        print(f"📊 Всего процессов в базе: {len(all_processes)}")  # Отладочная информация
+        if self.mmap_index is not None:
+            all_stems = self.query_stems(query)
+            ranked = self.mmap_index.rank(all_stems, self._normalize_text(query))
+            return self._blend_semantic([(self.mmap_index.process(i), relevance) for i, relevance in ranked], all_stems)
         
-        # Создаем стеммы для всех слов запроса
-        all_stems = []
-        for word in words:
-            stems = self._get_word_stems(word)
-            all_stems.extend(stems)
-        
-        # Убираем дубликаты стемм
-        all_stems = list(set(all_stems))
+        # Все процессы берем из индекса в памяти (один снимок на весь запрос)
+        all_processes = self._get_index().entries
+        all_stems = self.query_stems(query)
         
         # Ищем процессы и вычисляем релевантность
         results_with_relevance = []
-        for process_data in all_processes:
-            relevance = self._calculate_relevance(process_data, all_stems, query)
-            if relevance > 0:
+        for process_data, normalized in all_processes:
+            relevance = self._calculate_relevance(process_data, all_stems, query, normalized)
+            # Оставляем только действительно релевантные процессы (релевантность > 10)
+            if relevance > 10:
                 results_with_relevance.append((process_data, relevance))
         
         # Сортируем по релевантности (по убыванию)
         results_with_relevance.sort(key=lambda x: x[1], reverse=True)
         
-        # Берем только топ-5 результатов
-        top_results = results_with_relevance[:5]
-        
-        # Фильтруем только действительно релевантные процессы (релевантность > 10)
-        final_results = [process for process, relevance in top_results if relevance > 10]
-        
-        print(f"✅ Найдено релевантных процессов: {len(final_results)}")  # Отладочная информация
-        if final_results:
-            print("📋 Топ результаты:")
-            for i, (process, relevance) in enumerate(top_results[:3], 1):
-                print(f"   {i}. {process[0]} - {process[1]} (релевантность: {relevance})")
+        if logger.isEnabledFor(logging.DEBUG):
+            top = ', '.join(f"{process[0]} ({relevance})" for process, relevance in results_with_relevance[:3])
+            logger.debug(f"Найдено релевантных процессов из {len(all_processes)}: {len(results_with_relevance)}; топ: {top}")
         
-        cursor.close()
-        return final_results
+        return self._blend_semantic(results_with_relevance, all_stems)
+
+    def _blend_semantic(self, ranked: List[Tuple[Tuple, int]], query_stems: List[str]) -> List[Tuple[Tuple, int]]:
+        """Смешивает лексическую релевантность с семантической близостью LSA.
+
+        Найденным по словам процессам добавляется до LSA_WEIGHT баллов; процессы
+        без общих слов с запросом, но близкие по смыслу (недостача - недовоз),
+        добавляются с релевантностью по одной близости - ниже уверенных совпадений.
+        """
+        # Модель может смениться при перезагрузке каталога - берем ссылку один раз
+        lsa = self.lsa
+        if lsa is None or not query_stems:
+            return ranked
+        from lsa_index import LSA_WEIGHT, RECALL_SIMILARITY
+        bonus = {process_id: round(LSA_WEIGHT * similarity)
+                 for process_id, similarity in lsa.similarities(query_stems)}
+        if not bonus:
+            return ranked
+        blended = [(process_data, relevance + bonus.pop(process_data[0], 0)) for process_data, relevance in ranked]
+        for process_id, relevance in bonus.items():
+            process_data = self.get_process_by_id(process_id) if relevance >= LSA_WEIGHT * RECALL_SIMILARITY else None
+            if process_data:
+                blended.append((process_data, relevance))
+        blended.sort(key=lambda x: x[1], reverse=True)
+        return blended
+
+    def search_processes(self, query: str, limit: Optional[int] = 5) -> List[Tuple]:
+        """Улучшенный поиск процессов с точной релевантностью (по умолчанию топ-5)"""
+        ranked = self.rank_processes(query)
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [process for process, relevance in ranked]
     
     def get_all_processes(self) -> List[Tuple]:
         """Возвращает все процессы в формате (process_id, process_name)"""
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT process_id, process_name FROM processes ORDER BY process_id')
-        processes = cursor.fetchall()
-        cursor.close()
-        return processes
+        if self.mmap_index is not None:
+            return self.mmap_index.sorted_ids()
+        return sorted((process_data[0], process_data[1]) for process_data, _ in self._get_index().entries)
+    
+    def process_tree(self) -> ProcessTree:
+        """Дерево кодов процессов текущей версии каталога"""
+        if self.mmap_index is not None:
+            if self._mmap_tree is None:
+                self._mmap_tree = ProcessTree(process_id for process_id, _ in self.mmap_index.sorted_ids())
+            return self._mmap_tree
+        return self._get_index().tree
+    
+    def code_resolver(self) -> CodeResolver:
+        """Бор кодов процессов текущей версии каталога"""
+        if self.mmap_index is not None:
+            if self._mmap_codes is None:
+                self._mmap_codes = CodeResolver(process_id for process_id, _ in self.mmap_index.sorted_ids())
+            return self._mmap_codes
+        return self._get_index().codes
+    
+    def process_tokens(self, process_id: str) -> Optional[Tuple]:
+        """Смещения слов в названии, описании и ключевых словах процесса (для подсветки)"""
+        if self.mmap_index is not None:
+            # В файле индекса смещений нет - разбираем процесс при первом показе и запоминаем
+            tokens = self._mmap_tokens.get(process_id)
+            if tokens is None:
+                process_data = self.get_process_by_id(process_id)
+                if not process_data:
+                    return None
+                tokens = tuple(tokenize(self._normalize_text(text or '')) for text in process_data[1:4])
+                self._mmap_tokens[process_id] = tokens
+            return tokens
+        return self._get_index().tokens.get(process_id)
     
     def get_process_by_id(self, process_id: str) -> Optional[Tuple]:
-        """Находит процесс по ID"""
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT * FROM processes WHERE process_id = ?', (process_id,))
-        process = cursor.fetchone()
-        cursor.close()
-        return process
+        """Находит процесс по ID: (process_id, process_name, description, keywords)"""
+        if self.mmap_index is not None:
+            i = self.mmap_index.find_by_id(process_id)
+            return self.mmap_index.process(i) if i is not None else None
+        return self._get_index().by_id.get(process_id)
     
     def save_suggestion(self, user_id: int, user_name: str, username: str, suggestion_text: str) -> bool:
         """Сохраняет пожелание пользователя в базу данных"""
+        if self.suggestion_spool:
+            # Воркер не пишет в SQLite сам - передает пожелание единственному писателю
+            try:
+                from suggestion_writer import spool_suggestion
+                spool_suggestion(self.suggestion_spool, user_id, user_name, username, suggestion_text)
+                return True
+            except OSError as e:
+                print(f"Ошибка при сохранении пожелания в очередь: {e}")
+                return False
         try:
             cursor = self.conn.cursor()
             cursor.execute('''
@@ -305,6 +563,10 @@ class Database:
             print(f"Ошибка при сохранении пожелания: {e}")
             return False
     
+    def close(self):
+        """Закрывает соединение с SQLite (поиск по построенному индексу продолжает работать)"""
+        self.conn.close()
+
     def get_all_suggestions(self) -> List[Tuple]:
         """Возвращает все пожелания из базы данных"""
         try:
@@ -350,5 +612,39 @@ class Database:
             print(f"Ошибка при получении последних пожеланий: {e}")
             return []
 
-# Создаем глобальный экземпляр базы данных
-db = Database()
\ No newline at end of file
+_db_instance = None
+_db_lock = threading.Lock()
+# Параметры Database для get_db(); режим воркера и нагрузочный тест меняют их через configure_db
+_db_options: Dict[str, Any] = {}
+
+def configure_db(**options):
+    """Задает параметры глобальной базы (аргументы Database); вызывается до первого обращения к ней"""
+    with _db_lock:
+        if _db_instance is not None:
+            raise RuntimeError("Глобальная база уже создана - параметры нужно задать раньше")
+        _db_options.update(options)
+
+def is_worker_mode() -> bool:
+    """Глобальная база читает каталог из готового индекса главного процесса"""
+    return bool(_db_options.get('index_file'))
+
+def get_db() -> Database:
+    """Возвращает глобальный экземпляр базы данных, создавая его при первом обращении"""
+    global _db_instance
+    if _db_instance is None:
+        with _db_lock:
+            if _db_instance is None:
+                from config import LSA_MODEL_PATH
+                options = dict(lsa_model=LSA_MODEL_PATH or None)
+                options.update(_db_options)
+                _db_instance = Database(**options)
+    return _db_instance
+
+class LazyDatabase:
+    """Прокси глобальной базы: Database создается при первом обращении, а не при импорте"""
+
+    def __getattr__(self, name):
+        return getattr(get_db(), name)
+
+# Глобальный экземпляр базы данных (создается лениво)
+db = LazyDatabase()
\ No newline at end of file
@@ -0,0 +1,104 @@
+import re
+import html
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+# Слово поля: (начало, конец, слово в нижнем регистре с е вместо ё).
+# Нормализация не меняет длину текста, поэтому смещения верны и для исходного текста.
+Token = Tuple[int, int, str]
+
+WORD_PATTERN = re.compile(r'\w+')
+# Размер фрагмента вокруг лучшего совпадения, слов
+SNIPPET_WORDS = 12
+# Описание в карточке длиннее этого обрезается (сообщение Telegram - до 4096 символов)
+MAX_FIELD_LENGTH = 3500
+
+
+class Highlight(NamedTuple):
+    """HTML полей процесса с совпадениями запроса в <b>"""
+    name: str
+    description: str
+    keywords: str
+    snippet: Optional[str]  # фрагмент описания или ключевых слов вокруг лучшего совпадения
+
+
+def tokenize(normalized: str) -> Tuple[Token, ...]:
+    """Смещения слов нормализованного текста (вызывается при индексации каталога)"""
+    return tuple((match.start(), match.end(), match.group()) for match in WORD_PATTERN.finditer(normalized))
+
+
+def matched_tokens(tokens: Sequence[Token], stems: Iterable[str]) -> List[Tuple[int, str]]:
+    """(номер слова, основа) для слов, начинающихся с одной из основ запроса"""
+    stems = tuple(sorted(stems, key=len, reverse=True))
+    if not stems:
+        return []
+    result = []
+    for i, (_, _, word) in enumerate(tokens):
+        if word.startswith(stems):
+            result.append((i, next(stem for stem in stems if word.startswith(stem))))
+    return result
+
+
+def _render(text: str, tokens: Sequence[Token], matched: List[Tuple[int, str]], start: int, end: int) -> str:
+    """HTML куска text[start:end]: совпавшие слова в <b>, остальное экранировано"""
+    parts = []
+    position = start
+    for i, _ in matched:
+        word_start, word_end, _ = tokens[i]
+        if word_start < start or word_end > end:
+            continue
+        parts.append(html.escape(text[position:word_start]))
+        parts.append(f"<b>{html.escape(text[word_start:word_end])}</b>")
+        position = word_end
+    parts.append(html.escape(text[position:end]))
+    return ''.join(parts)
+
+
+def highlight(text: str, tokens: Sequence[Token], stems: Iterable[str], max_length: Optional[int] = None) -> str:
+    """Весь текст поля с подсвеченными совпадениями"""
+    if not text:
+        return ''
+    end = len(text) if max_length is None else min(len(text), max_length)
+    result = _render(text, tokens, matched_tokens(tokens, stems), 0, end)
+    return result + '…' if end < len(text) else result
+
+
+def snippet(text: str, tokens: Sequence[Token], stems: Iterable[str], window: int = SNIPPET_WORDS) -> Optional[str]:
+    """Фрагмент из window слов вокруг лучшего совпадения (больше всего разных основ запроса)"""
+    matched = matched_tokens(tokens, stems)
+    if not matched:
+        return None
+    best, best_score = 0, None
+    for position, (i, _) in enumerate(matched):
+        inside = [stem for j, stem in matched[position:] if j < i + window]
+        score = (len(set(inside)), len(inside))
+        if best_score is None or score > best_score:
+            best, best_score = i, score
+    first = max(0, best - window // 4)
+    last = min(len(tokens), first + window)
+    first = max(0, last - window)
+    result = _render(text, tokens, matched, tokens[first][0], tokens[last - 1][1])
+    if first > 0:
+        result = '…' + result
+    if last < len(tokens):
+        result += '…'
+    return result
+
+
+def highlight_process(process_data: Tuple, field_tokens: Optional[Sequence[Sequence[Token]]],
+                      stems: Iterable[str]) -> Highlight:
+    """Подсветка названия, описания и ключевых слов процесса по основам запроса.
+
+    field_tokens - смещения слов трех полей из индекса каталога; текст режется
+    по ним без повторного разбора регулярными выражениями.
+    """
+    _, process_name, description, keywords = process_data[:4]
+    fields = (process_name or '', description or '', keywords or '')
+    if field_tokens is None:
+        field_tokens = ((), (), ())
+    stems = list(stems)
+    return Highlight(
+        name=highlight(fields[0], field_tokens[0], stems),
+        description=highlight(fields[1], field_tokens[1], stems, MAX_FIELD_LENGTH),
+        keywords=highlight(fields[2], field_tokens[2], stems, MAX_FIELD_LENGTH),
+        snippet=snippet(fields[1], field_tokens[1], stems) or snippet(fields[2], field_tokens[2], stems),
+    )
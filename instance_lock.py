@@ -0,0 +1,127 @@
+import os
+import time
+import uuid
+import socket
+import sqlite3
+import asyncio
+import logging
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class InstanceLease:
+    """Аренда "единственного экземпляра" бота в SQLite с периодическим продлением.
+
+    Работающий экземпляр раз в heartbeat_interval секунд обновляет отметку времени.
+    Новый экземпляр при старте записывает запрос на перехват; старый видит его при
+    следующем продлении, корректно останавливается и освобождает аренду. Если старый
+    экземпляр завис или упал, аренда считается свободной через ttl секунд.
+    """
+
+    def __init__(self, db_file: str = 'data/instance.db', name: str = 'bot',
+                 ttl: float = 15, heartbeat_interval: float = 2):
+        self.db_file = db_file
+        self.name = name
+        self.ttl = ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        os.makedirs(os.path.dirname(db_file), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS instance_lease (
+                    name TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    heartbeat_at REAL NOT NULL,
+                    takeover_by TEXT
+                )
+            ''')
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_file, timeout=5, isolation_level=None)
+
+    def _try_acquire(self) -> bool:
+        """Одна попытка захватить аренду; при неудаче оставляет запрос на перехват"""
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                'SELECT owner, heartbeat_at FROM instance_lease WHERE name = ?', (self.name,)
+            ).fetchone()
+            now = time.time()
+            if row is None or row[0] == self.owner or now - row[1] > self.ttl:
+                conn.execute('''
+                    INSERT OR REPLACE INTO instance_lease (name, owner, heartbeat_at, takeover_by)
+                    VALUES (?, ?, ?, NULL)
+                ''', (self.name, self.owner, now))
+                conn.execute('COMMIT')
+                return True
+            conn.execute(
+                'UPDATE instance_lease SET takeover_by = ? WHERE name = ?', (self.owner, self.name)
+            )
+            conn.execute('COMMIT')
+            return False
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def acquire(self, timeout: Optional[float] = None, poll_interval: float = 0.5) -> bool:
+        """Ждет освобождения аренды (не дольше timeout секунд) и захватывает ее"""
+        started = time.monotonic()
+        announced = False
+        while True:
+            if self._try_acquire():
+                if announced:
+                    print(f"✅ Аренда получена через {time.monotonic() - started:.1f} с")
+                else:
+                    print("✅ Аренда единственного экземпляра получена")
+                return True
+            if not announced:
+                print("⏳ Работает другой экземпляр бота, запрошена передача управления...")
+                announced = True
+            if timeout is not None and time.monotonic() - started > timeout:
+                return False
+            time.sleep(poll_interval)
+
+    def heartbeat(self) -> bool:
+        """Продлевает аренду. False - аренда потеряна или ее запросил другой экземпляр"""
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT owner, takeover_by FROM instance_lease WHERE name = ?', (self.name,)
+            ).fetchone()
+            if row is None or row[0] != self.owner:
+                return False
+            if row[1] and row[1] != self.owner:
+                return False
+            conn.execute(
+                'UPDATE instance_lease SET heartbeat_at = ? WHERE name = ? AND owner = ?',
+                (time.time(), self.name, self.owner)
+            )
+            return True
+
+    async def keep_alive(self, on_lost: Callable[[], None]):
+        """Фоновое продление аренды; при запросе перехвата вызывает on_lost"""
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                alive = await asyncio.to_thread(self.heartbeat)
+            except sqlite3.Error as e:
+                logger.error(f"Ошибка продления аренды: {e}")
+                continue
+            if not alive:
+                print("🔄 Новый экземпляр бота запросил управление, завершаем работу...")
+                on_lost()
+                return
+
+    def release(self):
+        """Освобождает аренду, если она принадлежит этому экземпляру"""
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    'DELETE FROM instance_lease WHERE name = ? AND owner = ?', (self.name, self.owner)
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка освобождения аренды: {e}")
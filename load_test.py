@@ -0,0 +1,313 @@
+# load_test.py - нагрузочный тест: синтетические обновления через настоящие обработчики бота
+import os
+import json
+import time
+import random
+import shutil
+import asyncio
+import logging
+import argparse
+import tempfile
+from typing import List, Dict, Tuple, Optional
+
+from telegram import Update
+from telegram.request import BaseRequest, RequestData
+
+# Смесь обновлений по умолчанию: тип=вес
+DEFAULT_MIX = 'search=60,code=10,show=15,list=5,suggestion=5,help=5'
+
+
+class RecordingRequest(BaseRequest):
+    """Заглушка транспорта Bot API: ничего не отправляет в сеть, а записывает вызовы.
+
+    Отвечает правдоподобными объектами (User, Message, True), чтобы обработчики
+    работали как с настоящим Telegram; latency - искусственная задержка ответа.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Dict[str, int] = {}
+        self._message_id = 1000
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         read_timeout=None, write_timeout=None, connect_timeout=None,
+                         pool_timeout=None) -> Tuple[int, bytes]:
+        api_method = url.rsplit('/', 1)[-1]
+        self.calls[api_method] = self.calls.get(api_method, 0) + 1
+        # sleep(0) тоже отдает управление циклу событий, как настоящий сетевой вызов
+        await asyncio.sleep(self.latency)
+        params = request_data.parameters if request_data else {}
+        return 200, json.dumps({'ok': True, 'result': self._result(api_method, params)}).encode('utf-8')
+
+    def _result(self, api_method: str, params: dict):
+        if api_method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'LoadTest', 'username': 'load_test_bot'}
+        if api_method in ('sendMessage', 'sendDocument', 'editMessageText', 'editMessageReplyMarkup'):
+            self._message_id += 1
+            message = {
+                'message_id': params.get('message_id', self._message_id),
+                'date': int(time.time()),
+                'chat': {'id': int(params.get('chat_id', 1)), 'type': 'private'},
+            }
+            if api_method == 'sendDocument':
+                message['document'] = {'file_id': 'doc', 'file_unique_id': 'doc'}
+            else:
+                message['text'] = str(params.get('text', ''))
+            return message
+        return True
+
+
+class UpdateGenerator:
+    """Строит реалистичные обновления Telegram по заданной смеси"""
+
+    def __init__(self, mix: Dict[str, int], processes: List[dict], seed: int = 1):
+        self.mix = list(mix.items())
+        self.random = random.Random(seed)
+        self.process_ids = [process['process_id'] for process in processes]
+        self.words = sorted({
+            word for process in processes
+            for word in (process.get('keywords') or '').split() if len(word) > 3
+        })
+        self._update_id = 0
+        self._message_id = 0
+
+    def _user(self, user_id: int) -> dict:
+        return {'id': user_id, 'is_bot': False, 'first_name': f'Оператор {user_id}', 'username': f'pvz_{user_id}'}
+
+    def _message(self, user_id: int, text: str) -> dict:
+        self._message_id += 1
+        message = {
+            'message_id': self._message_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': self._user(user_id),
+            'text': text,
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return message
+
+    def _update(self, payload: dict) -> dict:
+        self._update_id += 1
+        return dict(payload, update_id=self._update_id)
+
+    def text(self, user_id: int, text: str) -> dict:
+        return self._update({'message': self._message(user_id, text)})
+
+    def callback(self, user_id: int, data: str) -> dict:
+        return self._update({'callback_query': {
+            'id': str(self._update_id),
+            'from': self._user(user_id),
+            'chat_instance': str(user_id),
+            'data': data,
+            'message': self._message(user_id, 'Предыдущее сообщение бота'),
+        }})
+
+    def next_batch(self, user_id: int) -> Tuple[str, List[dict]]:
+        """Следующее действие оператора: (тип, обновления по порядку)"""
+        kind = self.random.choices([k for k, _ in self.mix], weights=[w for _, w in self.mix])[0]
+        return self.next_batch_of(kind, user_id)
+
+    def next_batch_of(self, kind: str, user_id: int) -> Tuple[str, List[dict]]:
+        """Действие оператора заданного типа"""
+        if kind == 'search':
+            query = ' '.join(self.random.sample(self.words, self.random.randint(1, 3)))
+            return kind, [self.text(user_id, query)]
+        if kind == 'code':
+            return kind, [self.text(user_id, self.random.choice(self.process_ids))]
+        if kind == 'show':
+            return kind, [self.callback(user_id, f"show_{self.random.choice(self.process_ids)}")]
+        if kind == 'list':
+            if self.random.random() < 0.5:
+                return kind, [self.text(user_id, '/list')]
+            return kind, [self.callback(user_id, 'list_all')]
+        if kind == 'suggestion':
+            return kind, [
+                self.text(user_id, '/suggestion'),
+                self.text(user_id, 'Предлагаю добавить процесс приемки ' + self.random.choice(self.words)),
+            ]
+        return kind, [self.callback(user_id, 'help')]
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def monitor_loop_lag(samples: List[float], stop: asyncio.Event, interval: float = 0.01):
+    """Замеряет задержку цикла событий: насколько позже просыпается sleep(interval)"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - started - interval))
+
+
+def use_temporary_state(bot, prefix: str = 'load_test_') -> str:
+    """Переводит все, что бот пишет, во временный каталог; возвращает его путь.
+
+    Пожелания, журнал запросов, аналитика и фоновые задачи не попадают в
+    рабочие файлы data/ - оттуда только читаются каталог и модель LSA.
+    Вызывается до post_init и до первого обращения к базе.
+    """
+    from database import configure_db
+
+    state_dir = tempfile.mkdtemp(prefix=prefix)
+    configure_db(db_file=os.path.join(state_dir, 'processes.db'))
+    bot.query_log.path = os.path.join(state_dir, 'query_log.jsonl')
+    bot.query_log.salt_path = os.path.join(state_dir, 'query_log.salt')
+    bot.search_analytics.db_file = os.path.join(state_dir, 'analytics.db')
+    bot.task_queue.db_file = os.path.join(state_dir, 'tasks.db')
+    # Каталог во время теста не меняется - наблюдатель не нужен
+    bot.CATALOG_WATCH_INTERVAL = 0
+    return state_dir
+
+
+async def run_load_test(args) -> dict:
+    os.environ.setdefault('BOT_TOKEN', '123456:LOAD-TEST-TOKEN')
+    import bot
+    from persistence import SQLitePersistence
+
+    with open(os.path.join('data', 'processes.json'), 'r', encoding='utf-8') as f:
+        processes = json.load(f)
+
+    # Операторы теста шлют обновления без пауз - ограничение частоты включается только по флагу
+    bot.rate_limiter.enabled = args.throttle
+    request = RecordingRequest(latency=args.api_latency)
+    state_dir = use_temporary_state(bot)
+    application = bot.build_application(
+        SQLitePersistence(os.path.join(state_dir, 'persistence.db')), request=request
+    )
+    await application.initialize()
+    await bot.post_init(application)
+    bot.get_db().build_index()
+
+    generator = UpdateGenerator(parse_mix(args.mix), processes, seed=args.seed)
+    latencies: Dict[str, List[float]] = {}
+    all_latencies: List[float] = []
+    lag_samples: List[float] = []
+    remaining = [args.updates]
+    errors = [0]
+
+    async def operator(user_id: int):
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            kind, updates = generator.next_batch(user_id)
+            for payload in updates:
+                update = Update.de_json(payload, application.bot)
+                started = time.perf_counter()
+                try:
+                    await application.process_update(update)
+                except Exception:
+                    errors[0] += 1
+                elapsed = time.perf_counter() - started
+                latencies.setdefault(kind, []).append(elapsed)
+                all_latencies.append(elapsed)
+
+    # Прогрев: первые обновления платят за ленивые импорты внутри python-telegram-bot
+    for kind in dict(generator.mix):
+        for payload in generator.next_batch_of(kind, 1)[1]:
+            await application.process_update(Update.de_json(payload, application.bot))
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(monitor_loop_lag(lag_samples, stop))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(operator(10_000 + i) for i in range(args.users)))
+    duration = time.perf_counter() - started
+
+    stop.set()
+    await lag_task
+    await bot.post_stop(application)
+    await application.shutdown()
+    shutil.rmtree(state_dir, ignore_errors=True)
+
+    def summary(values: List[float]) -> dict:
+        return {
+            'count': len(values),
+            'p50_ms': round(percentile(values, 50) * 1000, 2),
+            'p95_ms': round(percentile(values, 95) * 1000, 2),
+            'p99_ms': round(percentile(values, 99) * 1000, 2),
+            'max_ms': round(max(values) * 1000, 2) if values else 0.0,
+        }
+
+    return {
+        'users': args.users,
+        'updates': len(all_latencies),
+        'duration_s': round(duration, 3),
+        'updates_per_sec': round(len(all_latencies) / duration, 1) if duration else 0.0,
+        'errors': errors[0],
+        'latency': summary(all_latencies),
+        'latency_by_kind': {kind: summary(values) for kind, values in sorted(latencies.items())},
+        'loop_lag': summary(lag_samples),
+        'api_calls': dict(sorted(request.calls.items())),
+        'throttle': bot.rate_limiter.metrics(),
+        'search_flights': bot.search_flights.metrics(),
+        'tasks': bot.task_queue.metrics(),
+    }
+
+
+def print_report(report: dict):
+    print("📊 РЕЗУЛЬТАТЫ НАГРУЗОЧНОГО ТЕСТА")
+    print(f"Операторов: {report['users']}, обновлений: {report['updates']}, ошибок: {report['errors']}")
+    print(f"Время: {report['duration_s']} с, пропускная способность: {report['updates_per_sec']} обновлений/с")
+    latency = report['latency']
+    print(f"Задержка: p50 {latency['p50_ms']} мс, p95 {latency['p95_ms']} мс, "
+          f"p99 {latency['p99_ms']} мс, max {latency['max_ms']} мс")
+    for kind, values in report['latency_by_kind'].items():
+        print(f"   {kind}: {values['count']} шт., p50 {values['p50_ms']} мс, p99 {values['p99_ms']} мс")
+    lag = report['loop_lag']
+    print(f"Задержка цикла событий: p50 {lag['p50_ms']} мс, p99 {lag['p99_ms']} мс, max {lag['max_ms']} мс")
+    print(f"Вызовы Bot API: {report['api_calls']}")
+    print(f"Поиски: {report['search_flights']['computed']} вычислено, "
+          f"{report['search_flights']['shared']} получили результат одновременного поиска")
+    print(f"Фоновые задачи: {report['tasks']['done']} выполнено из {report['tasks']['enqueued']}, "
+          f"повторов {report['tasks']['retried']}, отказов {report['tasks']['failed']}")
+    if report['throttle']['throttled_user'] or report['throttle']['throttled_global']:
+        print(f"Ограничение частоты: {report['throttle']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест обработчиков бота")
+    parser.add_argument('--users', type=int, default=50, help="число одновременных операторов ПВЗ")
+    parser.add_argument('--updates', type=int, default=2000, help="сколько действий выполнить всего")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="смесь действий, например search=60,show=20")
+    parser.add_argument('--api-latency', type=float, default=0.0, help="задержка ответа Bot API, с")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help="сохранить отчет в JSON-файл")
+    parser.add_argument('--verbose', action='store_true', help="показывать журнал бота и отладку поиска")
+    parser.add_argument('--throttle', action='store_true', help="включить ограничение частоты обновлений")
+    args = parser.parse_args()
+
+    if args.verbose:
+        logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+        logging.getLogger('database').setLevel(logging.DEBUG)
+    else:
+        logging.disable(logging.INFO)
+
+    report = asyncio.run(run_load_test(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+# lsa_index.py - латентно-семантический индекс каталога (LSA) для поиска по синонимам
+#
+# Модель строится заранее, без сети: python lsa_index.py
+# Бот загружает готовую модель при построении индекса поиска и смешивает
+# семантическую близость с лексической релевантностью (Database.rank_processes).
+# Модель - каталог несжатых .npy: матрицы открываются через mmap, и воркеры
+# на одной машине делят одни страницы файла вместо копии в каждом процессе.
+import os
+import re
+import time
+import shutil
+import argparse
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Вклад семантической близости в релевантность: косинус 1.0 дает +LSA_WEIGHT
+LSA_WEIGHT = 30
+# Процессы с меньшей близостью к запросу не учитываются
+MIN_SIMILARITY = 0.35
+# Процесс без общих слов с запросом добавляется в выдачу только при такой близости
+RECALL_SIMILARITY = 0.45
+# Размерность по умолчанию - четверть числа процессов в этих границах: при k, близком
+# к числу документов, SVD почти ничего не отбрасывает и синонимы не сближаются
+MIN_DIMENSIONS = 8
+MAX_DIMENSIONS = 48
+# Сингулярные числа меньше этой доли максимального считаются шумом
+MIN_SINGULAR_RATIO = 1e-6
+# Массивы модели: файл <имя>.npy в каталоге модели
+MODEL_ARRAYS = ('terms', 'idf', 'term_vectors', 'doc_vectors', 'process_ids')
+
+
+def document_terms(db, process_data: Tuple) -> List[str]:
+    """Основы слов процесса; название учитывается дважды, как и в лексическом ранжировании"""
+    _, process_name, description, keywords = process_data[:4]
+    terms = []
+    for text, weight in ((process_name, 2), (description, 1), (keywords, 1)):
+        for word in re.findall(r'\w+', db._normalize_text(text or '')):
+            terms.extend(db._get_word_stems(word) * weight)
+    return terms
+
+
+def default_dimensions(documents: int) -> int:
+    """Размерность модели для каталога из documents процессов"""
+    return min(MAX_DIMENSIONS, max(MIN_DIMENSIONS, documents // 4))
+
+
+def build_lsa_model(db, path: str, dimensions: Optional[int] = None) -> int:
+    """Строит усеченное SVD матрицы TF-IDF "процесс x основа" и сохраняет модель в каталог path.
+
+    Каталог модели подменяется целиком: уже открытые (mmap) файлы старой
+    модели остаются доступны читателям до закрытия.
+
+    Основы слов берутся тем же стеммером, что и для запросов, поэтому
+    запрос проецируется в пространство модели без повторной обработки текста.
+    dimensions=None - размерность по размеру каталога (default_dimensions).
+    """
+    started = time.perf_counter()
+    processes = [process_data for process_data, _ in db._get_search_index()]
+    documents = [document_terms(db, process_data) for process_data in processes]
+    terms = sorted({term for document in documents for term in document})
+    term_index = {term: i for i, term in enumerate(terms)}
+
+    counts = np.zeros((len(processes), len(terms)))
+    for row, document in enumerate(documents):
+        for term in document:
+            counts[row, term_index[term]] += 1
+
+    document_frequency = np.count_nonzero(counts, axis=0)
+    idf = np.log((1 + len(processes)) / (1 + document_frequency)) + 1
+    matrix = np.log1p(counts) * idf
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+    u, s, vt = np.linalg.svd(matrix, full_matrices=False)
+    rank = int(np.count_nonzero(s > s[0] * MIN_SINGULAR_RATIO)) if len(s) else 0
+    k = max(1, min(dimensions or default_dimensions(len(processes)), rank))
+    term_vectors = vt[:k].T
+    # Документы в том же пространстве, что и запросы: A V_k = U_k S_k
+    doc_vectors = u[:, :k] * s[:k]
+    doc_vectors /= np.maximum(np.linalg.norm(doc_vectors, axis=1, keepdims=True), 1e-12)
+
+    arrays = {
+        'terms': np.array(terms),
+        'idf': idf.astype(np.float32),
+        'term_vectors': np.ascontiguousarray(term_vectors, dtype=np.float32),
+        'doc_vectors': np.ascontiguousarray(doc_vectors, dtype=np.float32),
+        'process_ids': np.array([process_data[0] for process_data in processes]),
+    }
+    tmp_path, old_path = f"{path}.tmp", f"{path}.old"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for name in MODEL_ARRAYS:
+        np.save(os.path.join(tmp_path, f"{name}.npy"), arrays[name])
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    explained = float((s[:k] ** 2).sum() / (s ** 2).sum()) if len(s) else 0.0
+    print(f"✅ Модель LSA записана в {path}: {len(processes)} процессов, {len(terms)} основ, "
+          f"{k} измерений ({explained:.0%} дисперсии) за {time.perf_counter() - started:.2f} с")
+    return k
+
+
+class LsaRanker:
+    """Семантическая близость запроса к процессам по готовой модели LSA.
+
+    Запрос - сумма векторов его основ с весами IDF (основы вне словаря модели
+    пропускаются), близость - косинус с нормированными векторами процессов:
+    одно умножение матрицы процессов на вектор размерности модели.
+    Матрицы только читаются и открыты через mmap (mmap_mode='r').
+    """
+
+    def __init__(self, path: str):
+        data = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in MODEL_ARRAYS}
+        self.term_index: Dict[str, int] = {term: i for i, term in enumerate(data['terms'].tolist())}
+        self.idf = data['idf']
+        self.term_vectors = data['term_vectors']
+        self.doc_vectors = data['doc_vectors']
+        self.process_ids: List[str] = data['process_ids'].tolist()
+        if self.term_vectors.shape[0] != len(self.term_index) or self.doc_vectors.shape[0] != len(self.process_ids):
+            raise ValueError("файлы модели LSA не согласованы между собой")
+        self.dimensions = self.term_vectors.shape[1]
+
+    def similarities(self, stems: List[str]) -> List[Tuple[str, float]]:
+        """(process_id, косинус) процессов с близостью не ниже MIN_SIMILARITY"""
+        indices = [self.term_index[stem] for stem in stems if stem in self.term_index]
+        if not indices:
+            return []
+        query = self.idf[indices] @ self.term_vectors[indices]
+        norm = float(np.linalg.norm(query))
+        if norm == 0:
+            return []
+        scores = self.doc_vectors @ (query / norm)
+        return [(self.process_ids[i], float(scores[i])) for i in np.flatnonzero(scores >= MIN_SIMILARITY)]
+
+
+def main():
+    from config import LSA_MODEL_PATH
+    from database import Database
+
+    parser = argparse.ArgumentParser(description="Построение модели LSA каталога процессов")
+    parser.add_argument('--output', default=LSA_MODEL_PATH, help="каталог модели")
+    parser.add_argument('--dimensions', type=int, default=None,
+                        help=f"размерность пространства (по умолчанию четверть числа процессов, {MIN_DIMENSIONS}-{MAX_DIMENSIONS})")
+    args = parser.parse_args()
+
+    database = Database()
+    database.build_index()
+    build_lsa_model(database, args.output, args.dimensions)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+# mock_bot_api.py - локальная заглушка Telegram Bot API для сквозных бенчмарков без сети
+import json
+import time
+import random
+import argparse
+import threading
+from email.parser import BytesParser
+from email.policy import HTTP
+from urllib.parse import parse_qs, urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockBotAPI:
+    """Состояние заглушки: очередь входящих обновлений, счетчики вызовов, настройки сбоев"""
+
+    def __init__(self, latency: float = 0.0, retry_after_rate: float = 0.0, retry_after: int = 1, seed: int = 1):
+        self.latency = latency
+        self.retry_after_rate = retry_after_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.calls = {}
+        self.retry_after_sent = 0
+        self.sent_messages = []
+        self._updates = []
+        self._next_update_id = 1
+        self._message_id = 1
+        self._condition = threading.Condition()
+
+    def add_updates(self, updates):
+        """Добавляет обновления в очередь getUpdates (update_id назначается заново)"""
+        with self._condition:
+            for update in updates:
+                update = dict(update, update_id=self._next_update_id)
+                self._next_update_id += 1
+                self._updates.append(update)
+            self._condition.notify_all()
+
+    def get_updates(self, offset: int, limit: int, timeout: float):
+        """Долгий опрос: ждет новых обновлений не дольше timeout секунд"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            # Telegram подтверждает обновления с id < offset - удаляем их
+            self._updates = [update for update in self._updates if update['update_id'] >= offset]
+            while not self._updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return self._updates[:limit]
+
+    def handle(self, method: str, params: dict):
+        """Возвращает (HTTP-статус, тело ответа) для вызова метода Bot API"""
+        with self._condition:
+            self.calls[method] = self.calls.get(method, 0) + 1
+
+        if method != 'getUpdates' and self.retry_after_rate and self.random.random() < self.retry_after_rate:
+            self.retry_after_sent += 1
+            return 429, {
+                'ok': False,
+                'error_code': 429,
+                'description': f'Too Many Requests: retry after {self.retry_after}',
+                'parameters': {'retry_after': self.retry_after},
+            }
+
+        if self.latency and method != 'getUpdates':
+            time.sleep(self.latency)
+
+        if method == 'getMe':
+            return 200, {'ok': True, 'result': {
+                'id': 1, 'is_bot': True, 'first_name': 'MockBot', 'username': 'mock_bot',
+                'can_join_groups': False, 'can_read_all_group_messages': False, 'supports_inline_queries': False,
+            }}
+        if method == 'getUpdates':
+            updates = self.get_updates(
+                int(params.get('offset') or 0), int(params.get('limit') or 100), float(params.get('timeout') or 0)
+            )
+            return 200, {'ok': True, 'result': updates}
+        if method in ('sendMessage', 'sendDocument', 'editMessageText', 'editMessageReplyMarkup'):
+            with self._condition:
+                self._message_id += 1
+                message_id = int(params.get('message_id') or self._message_id)
+            message = {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': int(params.get('chat_id') or 1), 'type': 'private'},
+            }
+            if method == 'sendDocument':
+                message['document'] = {'file_id': f'doc{message_id}', 'file_unique_id': f'doc{message_id}'}
+            else:
+                message['text'] = params.get('text', '')
+            self.sent_messages.append((method, message))
+            return 200, {'ok': True, 'result': message}
+        if method in ('answerCallbackQuery', 'deleteWebhook', 'setWebhook', 'setMyCommands', 'close', 'logOut'):
+            return 200, {'ok': True, 'result': True}
+        return 404, {'ok': False, 'error_code': 404, 'description': 'Not Found: method not found'}
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                'calls': dict(sorted(self.calls.items())),
+                'retry_after_sent': self.retry_after_sent,
+                'pending_updates': len(self._updates),
+            }
+
+
+def parse_params(content_type: str, body: bytes) -> dict:
+    """Разбирает параметры запроса: JSON, urlencoded или multipart (документы)"""
+    if not body:
+        return {}
+    if content_type.startswith('application/json'):
+        return json.loads(body)
+    if content_type.startswith('multipart/form-data'):
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode('latin-1') + body
+        )
+        params = {}
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            if name and not part.get_filename():
+                params[name] = part.get_content().strip() if part.get_content_maintype() == 'text' else ''
+        return params
+    return {key: values[-1] for key, values in parse_qs(body.decode('utf-8')).items()}
+
+
+def make_handler(api: MockBotAPI):
+    class MockBotAPIHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send(self, status: int, payload: dict):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # Бот закрыл соединение (остановка во время длинного getUpdates)
+                pass
+
+        def _dispatch(self, body: bytes):
+            path = urlparse(self.path).path
+            if path == '/mock/stats':
+                self._send(200, api.stats())
+                return
+            if path == '/mock/updates':
+                api.add_updates(json.loads(body or b'[]'))
+                self._send(200, {'ok': True})
+                return
+            # Путь вида /bot<token>/<method>
+            method = path.rstrip('/').rsplit('/', 1)[-1]
+            params = parse_params(self.headers.get('Content-Type', ''), body)
+            params.update({key: values[-1] for key, values in parse_qs(urlparse(self.path).query).items()})
+            status, payload = api.handle(method, params)
+            self._send(status, payload)
+
+        def do_GET(self):
+            self._dispatch(b'')
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            self._dispatch(self.rfile.read(length) if length else b'')
+
+        def log_message(self, format, *args):
+            return
+
+    return MockBotAPIHandler
+
+
+def start_mock_server(api: MockBotAPI, host: str = '127.0.0.1', port: int = 8081) -> ThreadingHTTPServer:
+    """Запускает заглушку в фоновом потоке; base_url для бота: http://host:port/bot"""
+    server = ThreadingHTTPServer((host, port), make_handler(api))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-bot-api", daemon=True).start()
+    print(f"✅ Заглушка Bot API запущена: http://{host}:{server.server_address[1]}/bot")
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная заглушка Telegram Bot API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0, help="задержка ответа, с")
+    parser.add_argument('--retry-after-rate', type=float, default=0.0, help="доля ответов 429 RetryAfter")
+    parser.add_argument('--retry-after', type=int, default=1, help="значение retry_after, с")
+    parser.add_argument('--generate', type=int, default=0, help="сгенерировать N синтетических действий")
+    parser.add_argument('--users', type=int, default=20, help="число операторов для генерации")
+    parser.add_argument('--mix', default=None, help="смесь действий (как в load_test.py)")
+    args = parser.parse_args()
+
+    api = MockBotAPI(latency=args.latency, retry_after_rate=args.retry_after_rate, retry_after=args.retry_after)
+
+    if args.generate:
+        from load_test import UpdateGenerator, parse_mix, DEFAULT_MIX
+        with open('data/processes.json', 'r', encoding='utf-8') as f:
+            processes = json.load(f)
+        generator = UpdateGenerator(parse_mix(args.mix or DEFAULT_MIX), processes)
+        updates = []
+        for i in range(args.generate):
+            updates.extend(generator.next_batch(10_000 + i % args.users)[1])
+        api.add_updates(updates)
+        print(f"📨 В очереди getUpdates: {len(updates)} обновлений")
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(api))
+    server.daemon_threads = True
+    print(f"✅ Заглушка Bot API: http://{args.host}:{args.port}/bot")
+    print(f"💡 Запуск бота: TELEGRAM_API_BASE_URL=http://{args.host}:{args.port}/bot python bot.py")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"📊 Статистика: {api.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,318 @@
+import os
+import json
+import hashlib
+import sqlite3
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Any
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+
+class SQLitePersistence(BasePersistence):
+    """Хранение user_data/chat_data в SQLite с отложенной пакетной записью.
+
+    Данные пользователя читаются из базы только при первом обращении к нему
+    (refresh_user_data), а не все сразу при старте. Изменения копятся в памяти
+    и записываются одной транзакцией; неизменившиеся записи не перезаписываются.
+    """
+
+    def __init__(self, db_file: str = 'data/persistence.db', update_interval: float = 30, shared: bool = False,
+                 retry_interval: float = 1.0, max_written: int = 10000):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=True, chat_data=True, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.db_file = db_file
+        # shared=True - файл используют несколько процессов-воркеров: данные
+        # пользователя перечитываются при каждом обновлении, а не один раз,
+        # и записываются сразу (следующее сообщение может попасть в другой воркер)
+        self.shared = shared
+        # Пауза перед повтором записи после ошибки базы (например, файл занят другим воркером)
+        self.retry_interval = retry_interval
+        self._closing = False
+        os.makedirs(os.path.dirname(db_file), exist_ok=True)
+        self.conn = sqlite3.connect(db_file, check_same_thread=False, timeout=10)
+        self._lock = threading.Lock()
+        self.create_tables()
+
+        # Короткие хэши последних записанных значений - чтобы не писать то, что не изменилось.
+        # Не больше max_written записей (давно не менявшиеся вытесняются); пополняется
+        # и из потоков чтения (_load), поэтому под отдельной блокировкой
+        self.max_written = max_written
+        self._written: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._written_lock = threading.Lock()
+        # Отложенные изменения: ключ (таблица, id) -> JSON или None (удаление)
+        self._pending: Dict[tuple, Optional[str]] = {}
+        self._loaded_users = set()
+        self._loaded_chats = set()
+        self._write_task: Optional[asyncio.Task] = None
+        self._write_lock = asyncio.Lock()
+
+    def create_tables(self):
+        """Создает таблицы для хранения состояния"""
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS user_data (
+                    id INTEGER PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS chat_data (
+                    id INTEGER PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS bot_data (
+                    id INTEGER PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS conversations (
+                    name TEXT NOT NULL,
+                    conv_key TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    PRIMARY KEY (name, conv_key)
+                )
+            ''')
+            self.conn.commit()
+            cursor.close()
+
+    def _load(self, table: str, row_id: int) -> Optional[Dict[str, Any]]:
+        """Читает одну запись из таблицы состояния"""
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute(f'SELECT data FROM {table} WHERE id = ?', (row_id,))
+            row = cursor.fetchone()
+            cursor.close()
+        if not row:
+            return None
+        self._remember((table, row_id), row[0])
+        return json.loads(row[0])
+
+    @staticmethod
+    def _digest(payload: str) -> bytes:
+        return hashlib.blake2b(payload.encode('utf-8'), digest_size=8).digest()
+
+    def _remember(self, key: tuple, payload: Optional[str]):
+        """Запоминает хэш записанного значения (None - запись удалена)"""
+        with self._written_lock:
+            if payload is None:
+                self._written.pop(key, None)
+                return
+            self._written[key] = self._digest(payload)
+            self._written.move_to_end(key)
+            while len(self._written) > self.max_written:
+                self._written.popitem(last=False)
+
+    def _is_written(self, key: tuple, payload: str) -> bool:
+        with self._written_lock:
+            return self._written.get(key) == self._digest(payload)
+
+    def _mark(self, table: str, row_id: int, data: Optional[Dict[str, Any]]):
+        """Ставит запись в очередь на запись, если она действительно изменилась"""
+        key = (table, row_id)
+        if data is None:
+            self._pending[key] = None
+        else:
+            try:
+                payload = json.dumps(data, ensure_ascii=False, sort_keys=True)
+            except (TypeError, ValueError) as e:
+                logger.error(f"Не удалось сериализовать {table}[{row_id}]: {e}")
+                return
+            if key not in self._pending and self._is_written(key, payload):
+                return
+            self._pending[key] = payload
+        if not self.shared:
+            self._schedule_write()
+
+    async def _write_through(self):
+        """Общий файл: изменения видны другим воркерам сразу, без ожидания пакета"""
+        if self.shared and self._pending and not await self._write_batch():
+            self._schedule_write()
+
+    def _schedule_write(self):
+        """Планирует одну пакетную запись на все изменения текущего цикла обновления"""
+        if self._write_task and not self._write_task.done():
+            return
+        try:
+            self._write_task = asyncio.get_running_loop().create_task(self._write_later())
+        except RuntimeError:
+            # Нет запущенного цикла событий - пишем сразу
+            self._write_now()
+
+    async def _write_later(self):
+        # Даем остальным update_* из того же прохода попасть в пакет
+        await asyncio.sleep(0)
+        # После ошибки изменения вернулись в очередь - повторяем, не дожидаясь новых _mark
+        while not await self._write_batch() and not self._closing:
+            await asyncio.sleep(self.retry_interval)
+
+    async def _write_batch(self) -> bool:
+        """Забирает накопленные изменения в цикле событий и записывает их в потоке.
+
+        _pending меняется только в цикле событий (_mark), поток получает
+        готовый снимок. Пакеты пишутся по одному, чтобы старый снимок не
+        перезаписал более новый. False - ошибка записи, изменения в очереди.
+        """
+        async with self._write_lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return True
+            written = await asyncio.to_thread(self._write_pending, pending)
+            self._after_write(pending, written)
+            return written
+
+    def _write_now(self):
+        """Синхронная запись накопленного (без цикла событий или при остановке)"""
+        pending, self._pending = self._pending, {}
+        if pending:
+            self._after_write(pending, self._write_pending(pending))
+
+    def _write_pending(self, pending: Dict[tuple, Optional[str]]) -> bool:
+        """Записывает снимок изменений одной транзакцией; False - ошибка базы"""
+        try:
+            with self._lock:
+                with self.conn:
+                    for (table, row_id), payload in pending.items():
+                        if payload is None:
+                            self.conn.execute(f'DELETE FROM {table} WHERE id = ?', (row_id,))
+                        else:
+                            self.conn.execute(f'''
+                                INSERT INTO {table} (id, data, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+                                ON CONFLICT(id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at
+                            ''', (row_id, payload))
+            logger.debug(f"Сохранено записей состояния: {len(pending)}")
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при сохранении состояния: {e}")
+            return False
+
+    def _after_write(self, pending: Dict[tuple, Optional[str]], written: bool):
+        if not written:
+            # Возвращаем изменения в очередь, более новые значения имеют приоритет
+            for key, payload in pending.items():
+                self._pending.setdefault(key, payload)
+            return
+        for key, payload in pending.items():
+            self._remember(key, payload)
+
+    async def get_user_data(self) -> Dict[int, Dict[str, Any]]:
+        # Данные пользователей подгружаются лениво в refresh_user_data
+        return {}
+
+    async def get_chat_data(self) -> Dict[int, Dict[str, Any]]:
+        return {}
+
+    async def get_bot_data(self) -> Dict[str, Any]:
+        return self._load('bot_data', 0) or {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> Dict:
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute('SELECT conv_key, state FROM conversations WHERE name = ?', (name,))
+            rows = cursor.fetchall()
+            cursor.close()
+        return {tuple(json.loads(conv_key)): json.loads(state) for conv_key, state in rows}
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        conv_key = json.dumps(list(key))
+        with self._lock:
+            with self.conn:
+                if new_state is None:
+                    self.conn.execute(
+                        'DELETE FROM conversations WHERE name = ? AND conv_key = ?', (name, conv_key)
+                    )
+                else:
+                    self.conn.execute(
+                        'INSERT OR REPLACE INTO conversations (name, conv_key, state) VALUES (?, ?, ?)',
+                        (name, conv_key, json.dumps(new_state))
+                    )
+
+    async def update_user_data(self, user_id: int, data: Dict[str, Any]) -> None:
+        self._loaded_users.add(user_id)
+        self._mark('user_data', user_id, data)
+        await self._write_through()
+
+    async def update_chat_data(self, chat_id: int, data: Dict[str, Any]) -> None:
+        self._loaded_chats.add(chat_id)
+        self._mark('chat_data', chat_id, data)
+        await self._write_through()
+
+    async def update_bot_data(self, data: Dict[str, Any]) -> None:
+        self._mark('bot_data', 0, data)
+        await self._write_through()
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._loaded_chats.discard(chat_id)
+        self._mark('chat_data', chat_id, None)
+        await self._write_through()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._loaded_users.discard(user_id)
+        self._mark('user_data', user_id, None)
+        await self._write_through()
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[str, Any]) -> None:
+        if self.shared:
+            # Другой воркер мог изменить данные; свои незаписанные изменения новее
+            if ('user_data', user_id) in self._pending:
+                return
+            stored = await asyncio.to_thread(self._load, 'user_data', user_id)
+            user_data.clear()
+            user_data.update(stored or {})
+            return
+        # Первое обращение к пользователю в этой сессии - подгружаем его данные
+        if user_id in self._loaded_users:
+            return
+        self._loaded_users.add(user_id)
+        stored = await asyncio.to_thread(self._load, 'user_data', user_id)
+        if stored:
+            for key, value in stored.items():
+                user_data.setdefault(key, value)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict[str, Any]) -> None:
+        if self.shared:
+            if ('chat_data', chat_id) in self._pending:
+                return
+            stored = await asyncio.to_thread(self._load, 'chat_data', chat_id)
+            chat_data.clear()
+            chat_data.update(stored or {})
+            return
+        if chat_id in self._loaded_chats:
+            return
+        self._loaded_chats.add(chat_id)
+        stored = await asyncio.to_thread(self._load, 'chat_data', chat_id)
+        if stored:
+            for key, value in stored.items():
+                chat_data.setdefault(key, value)
+
+    async def refresh_bot_data(self, bot_data: Dict[str, Any]) -> None:
+        pass
+
+    async def flush(self) -> None:
+        """Дописывает все отложенные изменения при остановке бота"""
+        self._closing = True
+        if self._write_task and not self._write_task.done():
+            await self._write_task
+        self._write_now()
+        with self._lock:
+            self.conn.close()
+        print("✅ Состояние пользователей сохранено")
@@ -0,0 +1,105 @@
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Названия разделов каталога (первый сегмент кода процесса)
+CATEGORY_TITLES = {
+    'B1': '🚚 ПРИЕМ И ОБРАБОТКА ПЕРЕВОЗОК (B1)',
+    'B2': '📦 ХРАНЕНИЕ ТОВАРОВ (B2)',
+    'B3': '👤 ВЫДАЧА ЗАКАЗОВ (B3)',
+    'B4': '🔄 ВОЗВРАТЫ (B4)',
+    'B5': '📤 ОТПРАВКИ НА СКЛАД (B5)',
+    'B6': '🤝 РАБОТА С СЕЛЛЕРАМИ (B6)',
+}
+
+
+def code_key(code: str) -> Tuple:
+    """Ключ естественной сортировки кодов: B1.2 < B1.10"""
+    return tuple((0, int(part), '') if part.isdigit() else (1, 0, part) for part in code.split('.'))
+
+
+def category_title(category: str) -> str:
+    return CATEGORY_TITLES.get(category, f"📁 РАЗДЕЛ {category}")
+
+
+class ProcessTree:
+    """Дерево кодов процессов: B1 -> B1.5 -> B1.5.1.
+
+    Строится один раз при загрузке каталога. Родитель процесса - ближайший
+    существующий код-префикс по сегментам (B1.5 для B1.5.1); процессы без
+    такого родителя висят на разделе (B1). Родитель, дети и соседи
+    отдаются из словарей за O(1), все процессы под кодом - диапазоном
+    в отсортированном списке.
+    """
+
+    def __init__(self, codes: Iterable[str]):
+        self.codes = set(codes)
+        self._parent: Dict[str, str] = {}
+        self._children: Dict[str, List[str]] = {}
+        # Лексикографический порядок: все коды "B1.5.*" идут подряд
+        self._sorted = sorted(self.codes)
+
+        for code in sorted(self.codes, key=code_key):
+            parts = code.split('.')
+            parent = parts[0]
+            for length in range(len(parts) - 1, 0, -1):
+                candidate = '.'.join(parts[:length])
+                if candidate in self.codes:
+                    parent = candidate
+                    break
+            if parent == code:
+                # Код из одного сегмента сам является разделом
+                continue
+            self._parent[code] = parent
+            self._children.setdefault(parent, []).append(code)
+
+        self._categories = sorted({code.split('.')[0] for code in self.codes}, key=code_key)
+        # Естественный порядок кодов совпадает с обходом дерева в глубину
+        self._order = sorted(self.codes, key=code_key)
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.codes
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def categories(self) -> List[str]:
+        return list(self._categories)
+
+    def category(self, code: str) -> str:
+        return code.split('.')[0]
+
+    def parent(self, code: str) -> Optional[str]:
+        """Родительский процесс (None, если процесс верхнего уровня раздела)"""
+        parent = self._parent.get(code)
+        return parent if parent in self.codes else None
+
+    def children(self, code: str) -> List[str]:
+        """Непосредственные подпроцессы кода (для раздела - процессы верхнего уровня)"""
+        return list(self._children.get(code, ()))
+
+    def siblings(self, code: str) -> List[str]:
+        parent = self._parent.get(code)
+        if parent is None:
+            return []
+        return [sibling for sibling in self._children.get(parent, ()) if sibling != code]
+
+    def depth(self, code: str) -> int:
+        """Уровень вложенности: 0 - процесс верхнего уровня раздела"""
+        depth = 0
+        parent = self.parent(code)
+        while parent is not None:
+            depth += 1
+            parent = self.parent(parent)
+        return depth
+
+    def subtree(self, prefix: str) -> List[str]:
+        """Все процессы под кодом prefix (без него самого) в порядке дерева"""
+        start = bisect_left(self._sorted, prefix + '.')
+        end = bisect_left(self._sorted, prefix + '/')  # '/' следует за '.' в ASCII
+        return sorted(self._sorted[start:end], key=code_key)
+
+    def ordered(self, category: Optional[str] = None) -> List[str]:
+        """Процессы в порядке обхода дерева (все или одного раздела)"""
+        if category is None:
+            return list(self._order)
+        return [code for code in self._order if self.category(code) == category]
@@ -0,0 +1,230 @@
+import os
+import gzip
+import json
+import time
+import queue
+import shutil
+import hashlib
+import secrets
+import logging
+import threading
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def hash_user_id(user_id: int, salt: str) -> str:
+    """Обезличенный идентификатор пользователя для журнала запросов"""
+    return hashlib.sha256(f"{salt}:{user_id}".encode('utf-8')).hexdigest()[:16]
+
+
+def load_or_create_salt(path: str) -> str:
+    """Соль для обезличивания: читается из файла, при первом запуске создается случайной.
+
+    Без соли хэш id Telegram подбирается перебором. Файл общий для воркеров
+    и перезапусков - один пользователь получает один хэш; создается
+    атомарно (os.link), поэтому одновременный старт воркеров дает одну соль.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            salt = f.read().strip()
+        if salt:
+            return salt
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(secrets.token_hex(16))
+    try:
+        os.link(tmp_path, path)
+    except FileExistsError:
+        # Соль уже создал другой воркер
+        pass
+    finally:
+        os.remove(tmp_path)
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read().strip()
+
+
+class QueryLog:
+    """Журнал поисковых запросов в формате JSONL с ротацией по размеру.
+
+    Обработчик только кладет запись в очередь в памяти (без обращения к диску),
+    фоновый поток пачками дописывает записи в файл. Когда файл превышает
+    max_bytes, он сжимается в path.1.gz, старые архивы сдвигаются, лишние
+    (больше backup_count) удаляются. При переполнении очереди записи
+    отбрасываются и учитываются в счетчике dropped.
+
+    id пользователя пишется только хэшем с солью: соль задается явно или
+    берется из файла salt_path (создается при первом запуске). Без соли
+    поле user в записи пустое.
+    """
+
+    def __init__(self, path: str = 'data/query_log.jsonl', max_bytes: int = 10 * 1024 * 1024,
+                 backup_count: int = 5, salt: str = '', max_queue: int = 10000, batch_size: int = 500,
+                 salt_path: Optional[str] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.salt = salt
+        self.salt_path = salt_path
+        self.batch_size = batch_size
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._file = None
+        self.stats = {'queued': 0, 'written': 0, 'dropped': 0, 'rotations': 0, 'errors': 0}
+
+    def start(self):
+        """Запускает фоновый поток записи"""
+        if self._thread and self._thread.is_alive():
+            return
+        if not self.salt and self.salt_path:
+            self.salt = load_or_create_salt(self.salt_path)
+        self._thread = threading.Thread(target=self._run, name="query-log", daemon=True)
+        self._thread.start()
+        print(f"✅ Журнал запросов: {self.path}")
+
+    def stop(self, timeout: float = 5.0):
+        """Дописывает очередь и останавливает поток"""
+        if not self._thread:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def log(self, user_id: int, query: str, stems: List[str], results: List[Tuple[str, int]],
+            latency: float, cache_hit: bool = False, kind: str = 'search', catalog: str = 'default'):
+        """Ставит запись о запросе в очередь; никогда не блокирует обработчик.
+
+        results - ранжированный список (process_id, релевантность), в журнал
+        попадают первые 5 и общее количество.
+        """
+        record = {
+            'ts': round(time.time(), 3),
+            'user': hash_user_id(user_id, self.salt) if self.salt else None,
+            'kind': kind,
+            'catalog': catalog,
+            'query': query,
+            'stems': stems,
+            'top': [[process_id, relevance] for process_id, relevance in results[:5]],
+            'total': len(results),
+            'latency_ms': round(latency * 1000, 2),
+            'cache_hit': cache_hit,
+        }
+        try:
+            self._queue.put_nowait(record)
+            self.stats['queued'] += 1
+        except queue.Full:
+            self.stats['dropped'] += 1
+
+    def metrics(self) -> dict:
+        return dict(self.stats, pending=self._queue.qsize())
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            # Забираем все, что уже накопилось, чтобы писать пачкой
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                stopping = True
+                batch = [record for record in batch if record is not None]
+            try:
+                self._write(batch)
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"Ошибка записи журнала запросов: {e}")
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _write(self, batch: List[dict]):
+        if not batch:
+            return
+        data = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in batch).encode('utf-8')
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._file = open(self.path, 'ab')
+        if self._file.tell() and self._file.tell() + len(data) > self.max_bytes:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+        self.stats['written'] += len(batch)
+
+    def _rotate(self):
+        """Сжимает текущий файл в path.1.gz и сдвигает старые архивы"""
+        self._file.close()
+        self._file = None
+        for i in range(self.backup_count, 0, -1):
+            source = f"{self.path}.{i}.gz"
+            if not os.path.exists(source):
+                continue
+            if i == self.backup_count:
+                os.remove(source)
+            else:
+                os.replace(source, f"{self.path}.{i + 1}.gz")
+        if self.backup_count > 0:
+            tmp_path = f"{self.path}.1.gz.tmp"
+            with open(self.path, 'rb') as src, gzip.open(tmp_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp_path, f"{self.path}.1.gz")
+        os.remove(self.path)
+        self._file = open(self.path, 'ab')
+        self.stats['rotations'] += 1
+
+
+def read_query_log(path: str, include_rotated: bool = True):
+    """Читает записи журнала (сначала архивы от старых к новым, затем текущий файл)"""
+    paths = []
+    if include_rotated:
+        directory = os.path.dirname(path) or '.'
+        prefix = os.path.basename(path) + '.'
+        rotated = [
+            name for name in os.listdir(directory)
+            if name.startswith(prefix) and name.endswith('.gz') and name[len(prefix):-3].isdigit()
+        ] if os.path.isdir(directory) else []
+        rotated.sort(key=lambda name: int(name[len(prefix):-3]), reverse=True)
+        paths.extend(os.path.join(directory, name) for name in rotated)
+    paths.append(path)
+
+    for file_path in paths:
+        if not os.path.exists(file_path):
+            continue
+        opener = gzip.open if file_path.endswith('.gz') else open
+        try:
+            with opener(file_path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        # Недописанная строка при аварийной остановке
+                        continue
+        except OSError as e:
+            logger.error(f"Не удалось прочитать журнал {file_path}: {e}")
+
+
+def top_queries(path: str, n: int, normalize=None, deadline: Optional[float] = None,
+                catalog: Optional[str] = None) -> List[Tuple[str, int]]:
+    """Самые частые поисковые запросы журнала: [(нормализованный запрос, количество)].
+
+    deadline - момент time.monotonic(), после которого чтение прекращается
+    (используются уже подсчитанные записи); catalog - учитывать только запросы
+    к этому каталогу.
+    """
+    counts = {}
+    for i, record in enumerate(read_query_log(path)):
+        if deadline is not None and i % 1000 == 0 and time.monotonic() > deadline:
+            break
+        if record.get('kind') != 'search' or not record.get('query'):
+            continue
+        if catalog is not None and record.get('catalog', 'default') != catalog:
+            continue
+        key = normalize(record['query']) if normalize else record['query']
+        counts[key] = counts.get(key, 0) + 1
+    return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:n]
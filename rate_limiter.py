@@ -0,0 +1,95 @@
+import time
+from collections import OrderedDict
+from typing import Optional, Set
+
+# Причины отказа
+USER = 'user'
+GLOBAL = 'global'
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше burst про запас"""
+
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, burst: float, now: float):
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, rate: float, burst: float, now: float) -> bool:
+        self.tokens = min(burst, self.tokens + max(0.0, now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class RateLimiter:
+    """Ограничение частоты обновлений: корзина на пользователя и общая на весь бот.
+
+    Корзины пользователей лежат в OrderedDict в порядке последнего обращения.
+    Корзина, простоявшая дольше burst / rate секунд, снова полна - она ничем
+    не отличается от отсутствующей и удаляется; кроме того, таблица не растет
+    больше max_users записей. Вызывается из цикла событий, блокировки не нужны.
+    """
+
+    def __init__(self, user_rate: float = 1.0, user_burst: float = 5, global_rate: float = 50.0,
+                 global_burst: float = 100, max_users: int = 10000):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.global_rate = global_rate
+        self.global_burst = global_burst
+        self.max_users = max_users
+        # 0 в частоте отключает соответствующее ограничение
+        self.enabled = user_rate > 0 or global_rate > 0
+        self._buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self._global = TokenBucket(global_burst, time.monotonic())
+        # Кому уже отправлено предупреждение в текущей серии отказов
+        self._warned: Set[int] = set()
+        self.stats = {'allowed': 0, 'throttled_user': 0, 'throttled_global': 0, 'evicted': 0}
+
+    def _evict(self, now: float):
+        idle = self.user_burst / self.user_rate
+        while self._buckets:
+            user_id, bucket = next(iter(self._buckets.items()))
+            if now - bucket.updated < idle and len(self._buckets) <= self.max_users:
+                break
+            del self._buckets[user_id]
+            self._warned.discard(user_id)
+            self.stats['evicted'] += 1
+
+    def allow(self, user_id: Optional[int], now: Optional[float] = None) -> Optional[str]:
+        """Списывает токен; None - обновление пропускается, иначе причина отказа (USER или GLOBAL)"""
+        if not self.enabled:
+            return None
+        now = time.monotonic() if now is None else now
+        if self.user_rate > 0 and user_id is not None:
+            bucket = self._buckets.get(user_id)
+            if bucket is None:
+                bucket = self._buckets[user_id] = TokenBucket(self.user_burst, now)
+            else:
+                self._buckets.move_to_end(user_id)
+            allowed = bucket.take(self.user_rate, self.user_burst, now)
+            self._evict(now)
+            if not allowed:
+                self.stats['throttled_user'] += 1
+                return USER
+        if self.global_rate > 0 and not self._global.take(self.global_rate, self.global_burst, now):
+            self.stats['throttled_global'] += 1
+            return GLOBAL
+        self.stats['allowed'] += 1
+        if user_id is not None:
+            self._warned.discard(user_id)
+        return None
+
+    def warn_once(self, user_id: Optional[int]) -> bool:
+        """True при первом отказе пользователю в серии - только тогда отвечаем текстом"""
+        if user_id is None or user_id in self._warned:
+            return False
+        if len(self._warned) < self.max_users:
+            self._warned.add(user_id)
+        return True
+
+    def metrics(self) -> dict:
+        return dict(self.stats, users=len(self._buckets))
@@ -1,21 +1,10 @@
 # render_bot.py - специальная версия для Render
-import os
-import time
-import threading
-from bot import main, start_health_server
+from bot import main
 
 def run_bot_with_health_check():
     """Запускает бота и health server вместе"""
-    
-    # Запускаем health server в отдельном потоке
-    health_thread = threading.Thread(target=start_health_server, daemon=True)
-    health_thread.start()
-    print("✅ Health server запущен")
-    
-    # Даем время health server запуститься
-    time.sleep(5)
-    
-    # Запускаем бота
+    # main() сам поднимает health server параллельно с загрузкой каталога,
+    # готовность отдается через /health без фиксированных пауз
     print("🤖 Запуск бота...")
     main()
 
@@ -0,0 +1,144 @@
+import time
+import secrets
+import threading
+from collections import OrderedDict
+from typing import List, Tuple, Optional, Dict
+
+
+class SearchResultCache:
+    """Серверный кэш ранжированных результатов поиска для постраничного вывода.
+
+    Каждый набор результатов хранится под коротким токеном, который передается
+    в callback_data кнопок "вперед/назад". Записи живут ttl секунд, на одного
+    пользователя хранится не больше max_per_user наборов, а общий объем
+    ограничен max_items строками результатов (вытесняются самые старые).
+
+    Отдельно хранится общий кэш ранжирования по нормализованному запросу
+    (не больше max_queries запросов) - его же заполняет прогрев при старте.
+    """
+
+    def __init__(self, ttl: int = 1800, max_items: int = 50000, max_per_user: int = 5, max_queries: int = 1000):
+        self.ttl = ttl
+        self.max_items = max_items
+        self.max_per_user = max_per_user
+        self.max_queries = max_queries
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        # Общий для всех пользователей кэш ранжирования: нормализованный запрос -> (время, результаты)
+        self._queries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._user_tokens: Dict[int, List[str]] = {}
+        self._items = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            'stored': 0,
+            'hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evicted_memory': 0,
+            'evicted_user_limit': 0,
+            'query_hits': 0,
+            'query_misses': 0,
+            'query_warmed': 0,
+        }
+
+    def put(self, user_id: int, query: str, results: List[Tuple[str, str]]) -> str:
+        """Сохраняет результаты (process_id, process_name) и возвращает токен"""
+        token = secrets.token_urlsafe(6)
+        with self._lock:
+            while token in self._entries:
+                token = secrets.token_urlsafe(6)
+            self._purge_expired()
+
+            # Сначала освобождаем место: _remove удаляет опустевший список пользователя,
+            # поэтому список для нового токена берется только после вытеснения
+            tokens = self._user_tokens.get(user_id, [])
+            while tokens and len(tokens) >= self.max_per_user:
+                self._remove(tokens[0])
+                self.stats['evicted_user_limit'] += 1
+            tokens = self._user_tokens.setdefault(user_id, [])
+
+            self._entries[token] = {
+                'user_id': user_id,
+                'query': query,
+                'results': list(results),
+                'created': time.monotonic(),
+            }
+            tokens.append(token)
+            self._items += len(results)
+            self.stats['stored'] += 1
+
+            while self._items > self.max_items and len(self._entries) > 1:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.stats['evicted_memory'] += 1
+        return token
+
+    def get(self, token: str, user_id: int) -> Optional[Tuple[str, List[Tuple[str, str]]]]:
+        """Возвращает (запрос, результаты) по токену или None, если запись устарела"""
+        with self._lock:
+            entry = self._entries.get(token)
+            if not entry or entry['user_id'] != user_id:
+                self.stats['misses'] += 1
+                return None
+            if time.monotonic() - entry['created'] > self.ttl:
+                self._remove(token)
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return None
+            self.stats['hits'] += 1
+            return entry['query'], entry['results']
+
+    def get_ranked(self, key: str) -> Optional[list]:
+        """Ранжированные результаты по нормализованному запросу или None"""
+        with self._lock:
+            entry = self._queries.get(key)
+            if entry and time.monotonic() - entry[0] <= self.ttl:
+                self._queries.move_to_end(key)
+                self.stats['query_hits'] += 1
+                return entry[1]
+            if entry:
+                del self._queries[key]
+            self.stats['query_misses'] += 1
+            return None
+
+    def put_ranked(self, key: str, ranked: list, warmed: bool = False):
+        """Запоминает ранжированные результаты запроса (вытесняются давно не запрошенные)"""
+        with self._lock:
+            self._queries[key] = (time.monotonic(), list(ranked))
+            self._queries.move_to_end(key)
+            if warmed:
+                self.stats['query_warmed'] += 1
+            while len(self._queries) > self.max_queries:
+                self._queries.popitem(last=False)
+
+    def clear_ranked(self):
+        """Сбрасывает кэш ранжирования (например, после обновления каталога)"""
+        with self._lock:
+            self._queries.clear()
+
+    def metrics(self) -> dict:
+        """Текущее состояние кэша для диагностики"""
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), items=self._items, users=len(self._user_tokens),
+                        queries=len(self._queries))
+
+    def _purge_expired(self):
+        now = time.monotonic()
+        # Записи упорядочены по времени создания - проверяем только начало
+        while self._entries:
+            token, entry = next(iter(self._entries.items()))
+            if now - entry['created'] <= self.ttl:
+                break
+            self._remove(token)
+            self.stats['expired'] += 1
+
+    def _remove(self, token: str):
+        entry = self._entries.pop(token, None)
+        if not entry:
+            return
+        self._items -= len(entry['results'])
+        tokens = self._user_tokens.get(entry['user_id'])
+        if tokens:
+            if token in tokens:
+                tokens.remove(token)
+            if not tokens:
+                del self._user_tokens[entry['user_id']]
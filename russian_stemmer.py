@@ -0,0 +1,105 @@
+"""Стеммер русского языка по алгоритму Snowball (snowballstem.org/algorithms/russian).
+
+Чистый Python без зависимостей. Слово должно быть в нижнем регистре, ё заменена на е.
+"""
+from typing import Optional, Tuple
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (('в', 'вши', 'вшись'), ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'))
+ADJECTIVE = ((), (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом',
+    'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею',
+))
+PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+REFLEXIVE = ((), ('ся', 'сь'))
+VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй', 'ил', 'ыл', 'им', 'ым', 'ен',
+     'ило', 'ыло', 'ено', 'ят', 'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+)
+NOUN = ((), (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и', 'ией', 'ей', 'ой', 'ий', 'й',
+    'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я',
+))
+SUPERLATIVE = ((), ('ейше', 'ейш'))
+DERIVATIONAL = ((), ('ост', 'ость'))
+
+
+def _regions(word: str) -> Tuple[int, int]:
+    """Начала областей RV и R2"""
+    rv = len(word)
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv = i + 1
+            break
+
+    def next_region(start: int) -> int:
+        for i in range(start + 1, len(word)):
+            if word[i] not in VOWELS and word[i - 1] in VOWELS:
+                return i + 1
+        return len(word)
+
+    r1 = next_region(0)
+    return rv, next_region(r1)
+
+
+def _remove_ending(word: str, start: int, endings: Tuple[tuple, tuple]) -> Optional[str]:
+    """Удаляет самое длинное окончание из группы, лежащее целиком в области start.
+
+    Окончания первой группы удаляются, только если перед ними (в той же
+    области) стоит а или я. Возвращает None, если подходящего окончания нет.
+    """
+    group1, group2 = endings
+    best = ''
+    for ending in group1 + group2:
+        if len(ending) > len(best) and word.endswith(ending) and len(word) - len(ending) >= start:
+            best = ending
+    if not best:
+        return None
+    cut = len(word) - len(best)
+    if best in group1 and best not in group2:
+        if cut - 1 < start or word[cut - 1] not in 'ая':
+            return None
+    return word[:cut]
+
+
+def stem(word: str) -> str:
+    """Основа слова по алгоритму Snowball"""
+    rv, r2 = _regions(word)
+    if rv >= len(word):
+        return word
+
+    # Шаг 1: деепричастие, иначе возвратная частица + прилагательное/причастие, глагол или существительное
+    result = _remove_ending(word, rv, PERFECTIVE_GERUND)
+    if result is None:
+        word = _remove_ending(word, rv, REFLEXIVE) or word
+        result = _remove_ending(word, rv, ADJECTIVE)
+        if result is not None:
+            result = _remove_ending(result, rv, PARTICIPLE) or result
+        else:
+            result = _remove_ending(word, rv, VERB)
+            if result is None:
+                result = _remove_ending(word, rv, NOUN)
+    if result is not None:
+        word = result
+
+    # Шаг 2: конечная и
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+
+    # Шаг 3: словообразовательные окончания в R2
+    word = _remove_ending(word, r2, DERIVATIONAL) or word
+
+    # Шаг 4: нн -> н, превосходная степень, мягкий знак
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        word = word[:-1]
+    else:
+        result = _remove_ending(word, rv, SUPERLATIVE)
+        if result is not None:
+            word = result
+            if word.endswith('нн') and len(word) - 2 >= rv:
+                word = word[:-1]
+        elif word.endswith('ь') and len(word) - 1 >= rv:
+            word = word[:-1]
+    return word
@@ -0,0 +1,243 @@
+import os
+import html
+import json
+import heapq
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Длинные запросы в отчете обрезаются, чтобы он поместился в одно сообщение
+MAX_QUERY_LENGTH = 60
+
+
+class SpaceSaving:
+    """Приближенный топ-K частых элементов потока (алгоритм Space-Saving).
+
+    Хранит не больше capacity счетчиков. Новый элемент при заполнении
+    вытесняет элемент с наименьшим счетчиком и наследует его значение
+    (оно же запоминается как погрешность). Элементы, встречающиеся чаще
+    N / capacity раз, гарантированно остаются в таблице.
+
+    Наименьший счетчик ищется по min-куче (счетчик, элемент) за O(log K):
+    при каждом изменении счетчика в кучу добавляется новая запись, а
+    устаревшие пропускаются при извлечении. Когда устаревших записей
+    становится слишком много, куча перестраивается из счетчиков.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self.counters: Dict[str, List[int]] = {}  # элемент -> [счетчик, погрешность]
+        self._heap: List[Tuple[int, str]] = []
+
+    def add(self, item: str, count: int = 1):
+        counter = self.counters.get(item)
+        if counter:
+            counter[0] += count
+            self._push(counter[0], item)
+            return
+        if len(self.counters) < self.capacity:
+            self.counters[item] = [count, 0]
+            self._push(count, item)
+            return
+        minimum = self.counters.pop(self._pop_min())[0]
+        self.counters[item] = [minimum + count, minimum]
+        self._push(minimum + count, item)
+
+    def _push(self, count: int, item: str):
+        heapq.heappush(self._heap, (count, item))
+        if len(self._heap) > 2 * self.capacity + 16:
+            self._rebuild_heap()
+
+    def _rebuild_heap(self):
+        self._heap = [(counter[0], item) for item, counter in self.counters.items()]
+        heapq.heapify(self._heap)
+
+    def _pop_min(self) -> str:
+        """Извлекает элемент с наименьшим счетчиком (без удаления из counters)"""
+        while True:
+            count, item = heapq.heappop(self._heap)
+            counter = self.counters.get(item)
+            if counter and counter[0] == count:
+                return item
+
+    def top(self, n: int) -> List[Tuple[str, int, int]]:
+        """Первые n элементов: (элемент, счетчик, погрешность)"""
+        items = sorted(self.counters.items(), key=lambda item: (-item[1][0], item[0]))[:n]
+        return [(item, count, error) for item, (count, error) in items]
+
+    def to_dict(self) -> dict:
+        return {'capacity': self.capacity, 'counters': self.counters}
+
+    def load(self, data: dict):
+        self.counters = {item: list(counter) for item, counter in data.get('counters', {}).items()}
+        self._rebuild_heap()
+        while len(self.counters) > self.capacity:
+            del self.counters[self._pop_min()]
+
+
+class SearchAnalytics:
+    """Потоковая аналитика поиска: популярные запросы, запросы без результатов,
+    выбранные процессы по запросам.
+
+    Все агрегаты в памяти ограничены top_k счетчиками, отчет строится сразу
+    без перечитывания журналов. Раз в checkpoint_interval секунд состояние
+    сохраняется в SQLite и восстанавливается при следующем запуске.
+    """
+
+    def __init__(self, db_file: str = 'data/analytics.db', top_k: int = 1000, checkpoint_interval: float = 60,
+                 name: str = 'search'):
+        self.db_file = db_file
+        # Имя контрольной точки (у каждого воркера своя)
+        self.name = name
+        self.checkpoint_interval = checkpoint_interval
+        self.queries = SpaceSaving(top_k)
+        self.zero_results = SpaceSaving(top_k)
+        self.clicks = SpaceSaving(top_k)
+        self.totals = {'searches': 0, 'zero_results': 0, 'clicks': 0}
+        self.since = time.strftime('%Y-%m-%d %H:%M:%S')
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._restored = False
+        self._task: Optional[asyncio.Task] = None
+        # База открывается при запуске (start), а не при импорте бота
+        self.conn = None
+
+    def _connect(self):
+        if self.conn is not None:
+            return
+        os.makedirs(os.path.dirname(self.db_file) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS analytics_checkpoint (
+                name TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        self.conn.commit()
+
+    def record_search(self, query: str, results_count: int):
+        """Учитывает поисковый запрос (query - нормализованный текст)"""
+        with self._lock:
+            self.totals['searches'] += 1
+            self.queries.add(query)
+            if results_count == 0:
+                self.totals['zero_results'] += 1
+                self.zero_results.add(query)
+            self._dirty = True
+
+    def record_click(self, query: Optional[str], process_id: str):
+        """Учитывает открытие процесса из результатов поиска по запросу query"""
+        with self._lock:
+            self.totals['clicks'] += 1
+            self.clicks.add(f"{query or '—'}\t{process_id}")
+            self._dirty = True
+
+    def report(self, n: int = 10) -> dict:
+        with self._lock:
+            return {
+                'since': self.since,
+                'totals': dict(self.totals),
+                'top_queries': self.queries.top(n),
+                'zero_results': self.zero_results.top(n),
+                'clicks': [tuple(item.split('\t', 1)) + (count,) for item, count, _ in self.clicks.top(n)],
+            }
+
+    def checkpoint(self):
+        """Сохраняет агрегаты в SQLite (только если что-то изменилось)"""
+        with self._lock:
+            if not self._dirty:
+                return
+            state = {
+                'since': self.since,
+                'totals': dict(self.totals),
+                'queries': self.queries.to_dict(),
+                'zero_results': self.zero_results.to_dict(),
+                'clicks': self.clicks.to_dict(),
+            }
+            self._dirty = False
+        try:
+            self._connect()
+            with self.conn:
+                self.conn.execute('''
+                    INSERT INTO analytics_checkpoint (name, data, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT(name) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at
+                ''', (self.name, json.dumps(state, ensure_ascii=False)))
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка сохранения аналитики: {e}")
+            self._dirty = True
+
+    def restore(self):
+        """Восстанавливает агрегаты из последней контрольной точки (один раз за процесс)"""
+        if self._restored:
+            return
+        try:
+            self._connect()
+            row = self.conn.execute("SELECT data FROM analytics_checkpoint WHERE name = ?", (self.name,)).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка чтения аналитики: {e}")
+            return
+        self._restored = True
+        if not row:
+            return
+        state = json.loads(row[0])
+        with self._lock:
+            self.since = state.get('since', self.since)
+            # События, пришедшие до восстановления, добавляются к сохраненным
+            for name, value in state.get('totals', {}).items():
+                self.totals[name] = self.totals.get(name, 0) + value
+            for name in ('queries', 'zero_results', 'clicks'):
+                sketch = getattr(self, name)
+                current = sketch.counters
+                sketch.load(state.get(name, {}))
+                for item, (count, error) in current.items():
+                    sketch.add(item, count)
+
+    def start(self):
+        """Восстанавливает состояние и запускает периодическое сохранение контрольных точек"""
+        self.restore()
+        self._task = asyncio.create_task(self._run())
+        print(f"✅ Аналитика поиска: контрольная точка раз в {self.checkpoint_interval} с")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.checkpoint)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            await asyncio.to_thread(self.checkpoint)
+
+
+def format_report(report: dict) -> str:
+    """Текст отчета для команды /stats (HTML)"""
+    totals = report['totals']
+    share = totals['zero_results'] / totals['searches'] * 100 if totals['searches'] else 0.0
+    text = "📊 <b>СТАТИСТИКА ПОИСКА</b>\n"
+    text += f"<i>с {report['since']}</i>\n\n"
+    text += f"Запросов: <b>{totals['searches']}</b>, без результатов: <b>{totals['zero_results']}</b> ({share:.1f}%)\n"
+    text += f"Открыто процессов из поиска: <b>{totals['clicks']}</b>\n"
+
+    text += "\n🔥 <b>Популярные запросы:</b>\n"
+    for i, (query, count, error) in enumerate(report['top_queries'], 1):
+        text += f"{i}. <code>{html.escape(query[:MAX_QUERY_LENGTH])}</code> — {count}\n"
+
+    text += "\n❌ <b>Запросы без результатов:</b>\n"
+    for i, (query, count, error) in enumerate(report['zero_results'], 1):
+        text += f"{i}. <code>{html.escape(query[:MAX_QUERY_LENGTH])}</code> — {count}\n"
+
+    text += "\n👆 <b>Выбор процессов по запросам:</b>\n"
+    for i, (query, process_id, count) in enumerate(report['clicks'], 1):
+        text += f"{i}. <code>{html.escape(query[:MAX_QUERY_LENGTH])}</code> → {html.escape(process_id)} — {count}\n"
+    return text
@@ -0,0 +1,194 @@
+import os
+import mmap
+import struct
+from typing import Dict, FrozenSet, List, Tuple, Optional
+
+# Формат файла индекса:
+#   MAGIC | заголовок (<IIII: число процессов, длина блока данных, длины блоков словоформ и основ)
+#   | таблица записей (по RECORD_FIELDS чисел uint32 на процесс, в порядке каталога)
+#   | перестановка uint32 по возрастанию process_id | блок данных UTF-8
+#   | словоформы каталога (строки "слово\tоснова основа") | основы каталога (по одной в строке)
+# Поля записи: id строки, смещение исходных полей, длины process_id/названия/описания/
+# ключевых слов, смещение нормализованного текста, длины нормализованных названия/описания/
+# ключевых слов. Нормализованный текст хранится одной строкой "название описание ключевые_слова".
+# Словоформы и основы - те же, что в CatalogIndex, чтобы воркеры ранжировали как один процесс.
+MAGIC = b'OZIDX002'
+HEADER = struct.Struct('<IIII')
+RECORD_FIELDS = 10
+RECORD = struct.Struct('<' + 'I' * RECORD_FIELDS)
+
+
+def build_index_file(path: str, db) -> int:
+    """Строит неизменяемый файл индекса из каталога в базе данных (атомарная замена файла)"""
+    cursor = db.conn.cursor()
+    cursor.execute('SELECT id, process_id, process_name, description, keywords FROM processes ORDER BY id')
+    rows = cursor.fetchall()
+    cursor.close()
+
+    data = bytearray()
+    records = []
+    for row_id, process_id, process_name, description, keywords in rows:
+        raw = [(value or '').encode('utf-8') for value in (process_id, process_name, description, keywords)]
+        raw_offset = len(data)
+        for value in raw:
+            data += value
+
+        norm = [
+            db._normalize_text(process_name).encode('utf-8'),
+            db._normalize_text(description or '').encode('utf-8'),
+            db._normalize_text(keywords or '').encode('utf-8'),
+        ]
+        norm_offset = len(data)
+        data += b' '.join(norm)
+
+        records.append((row_id, raw_offset, *[len(value) for value in raw], norm_offset, *[len(value) for value in norm]))
+
+    order = sorted(range(len(rows)), key=lambda i: rows[i][1])
+
+    index = db._get_index()
+    forms = '\n'.join(f"{word}\t{' '.join(stems)}" for word, stems in sorted(index.word_forms.items())).encode('utf-8')
+    corpus = '\n'.join(sorted(index.corpus_stems)).encode('utf-8')
+
+    tmp_path = f"{path}.tmp"
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(HEADER.pack(len(records), len(data), len(forms), len(corpus)))
+        for record in records:
+            f.write(RECORD.pack(*record))
+        f.write(struct.pack(f'<{len(order)}I', *order))
+        f.write(data)
+        f.write(forms)
+        f.write(corpus)
+    os.replace(tmp_path, path)
+    print(f"✅ Индекс поиска записан в {path}: {len(records)} процессов, {os.path.getsize(path)} байт")
+    return len(records)
+
+
+class MmapSearchIndex:
+    """Индекс каталога, открытый только для чтения через mmap.
+
+    Страницы файла разделяются ОС между всеми процессами-воркерами, поэтому
+    каталог не копируется в память каждого процесса: поиск идет по байтам
+    файла через mmap.find, в Python-объекты превращаются только найденные записи.
+    Словарь словоформ и основы каталога (небольшие) читаются при открытии.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"❌ {path} не является файлом индекса поиска")
+        self.count, data_len, forms_len, corpus_len = HEADER.unpack_from(self._mm, len(MAGIC))
+        table_start = len(MAGIC) + HEADER.size
+        order_start = table_start + self.count * RECORD.size
+        self._data_start = order_start + self.count * 4
+        view = memoryview(self._mm)
+        self._table = view[table_start:order_start].cast('I')
+        self._order = view[order_start:self._data_start].cast('I')
+
+        forms_start = self._data_start + data_len
+        corpus_start = forms_start + forms_len
+        forms = self._mm[forms_start:corpus_start].decode('utf-8')
+        corpus = self._mm[corpus_start:corpus_start + corpus_len].decode('utf-8')
+        self.word_forms: Dict[str, Tuple[str, ...]] = {}
+        for line in filter(None, forms.split('\n')):
+            word, _, stems = line.partition('\t')
+            self.word_forms[word] = tuple(stems.split())
+        self.corpus_stems: FrozenSet[str] = frozenset(filter(None, corpus.split('\n')))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _record(self, i: int) -> Tuple[int, ...]:
+        base = i * RECORD_FIELDS
+        return tuple(self._table[base:base + RECORD_FIELDS])
+
+    def _raw_fields(self, record: Tuple[int, ...]) -> List[str]:
+        offset = self._data_start + record[1]
+        fields = []
+        for length in record[2:6]:
+            fields.append(self._mm[offset:offset + length].decode('utf-8'))
+            offset += length
+        return fields
+
+    def process(self, i: int) -> Tuple[str, str, str, str]:
+        """(process_id, process_name, description, keywords) записи номер i"""
+        return tuple(self._raw_fields(self._record(i)))
+
+    def row(self, i: int) -> Tuple:
+        """Запись в формате строки таблицы processes (id, process_id, ...)"""
+        record = self._record(i)
+        return (record[0], *self._raw_fields(record))
+
+    def find_by_id(self, process_id: str) -> Optional[int]:
+        """Бинарный поиск записи по process_id"""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            i = self._order[mid]
+            current = self.process_id(i)
+            if current < process_id:
+                lo = mid + 1
+            elif current > process_id:
+                hi = mid
+            else:
+                return i
+        return None
+
+    def process_id(self, i: int) -> str:
+        base = i * RECORD_FIELDS
+        offset = self._data_start + self._table[base + 1]
+        return self._mm[offset:offset + self._table[base + 2]].decode('utf-8')
+
+    def sorted_ids(self) -> List[Tuple[str, str]]:
+        """(process_id, process_name) всех процессов по возрастанию process_id"""
+        result = []
+        for i in self._order:
+            process_id, process_name = self._raw_fields(self._record(i))[:2]
+            result.append((process_id, process_name))
+        return result
+
+    def rank(self, query_stems: List[str], norm_query: str) -> List[Tuple[int, int]]:
+        """Считает релевантность по тем же правилам, что Database._calculate_relevance.
+
+        Возвращает (номер записи, релевантность) для записей с релевантностью > 10.
+        """
+        mm = self._mm
+        stems = [stem.encode('utf-8') for stem in query_stems]
+        phrase = norm_query.encode('utf-8')
+        results = []
+        for i in range(self.count):
+            base = i * RECORD_FIELDS
+            start = self._data_start + self._table[base + 6]
+            name_end = start + self._table[base + 7]
+            desc_start = name_end + 1
+            desc_end = desc_start + self._table[base + 8]
+            keywords_start = desc_end + 1
+            end = keywords_start + self._table[base + 9]
+
+            relevance = 0
+            found_stems = 0
+            for stem in stems:
+                if mm.find(stem, start, end) != -1:
+                    found_stems += 1
+                    if mm.find(stem, start, name_end) != -1:
+                        relevance += 10
+                    if mm.find(stem, keywords_start, end) != -1:
+                        relevance += 8
+                    if mm.find(stem, desc_start, desc_end) != -1:
+                        relevance += 5
+
+            if found_stems < len(stems):
+                relevance -= 20
+            if mm.find(phrase, start, end) != -1:
+                relevance += 50
+            if found_stems == len(stems):
+                relevance += 15
+
+            if relevance > 10:
+                results.append((i, relevance))
+
+        results.sort(key=lambda x: x[1], reverse=True)
+        return results
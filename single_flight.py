@@ -0,0 +1,40 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """Объединение одинаковых одновременных вычислений (single-flight).
+
+    Первый вызов с ключом запускает вычисление отдельной задачей, остальные
+    вызовы с тем же ключом, пришедшие до ее завершения, ждут ту же задачу.
+    Ожидание идет через asyncio.shield: отмена одного обработчика не отменяет
+    вычисление для остальных. Исключение получают все ожидающие, а ключ
+    освобождается - следующий вызов посчитает заново.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.stats = {'computed': 0, 'shared': 0, 'errors': 0}
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done, key=key: self._finish(key, done))
+            self.stats['computed'] += 1
+        else:
+            self.stats['shared'] += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Забираем исключение, даже если результат никто не ждет
+        if not task.cancelled() and task.exception() is not None:
+            self.stats['errors'] += 1
+
+    def metrics(self) -> dict:
+        return dict(self.stats, inflight=len(self._inflight))
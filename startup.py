@@ -0,0 +1,111 @@
+import time
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StartupState:
+    """Отслеживает этапы запуска бота и их длительность.
+
+    Этапы выполняются параллельно, каждый по завершении выставляет свое событие.
+    Бот считается готовым, когда успешно завершены все обязательные этапы.
+    """
+
+    def __init__(self, required: List[str]):
+        self.required = list(required)
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._phases: Dict[str, dict] = {}
+        self._events: Dict[str, threading.Event] = {}
+
+    def _event(self, name: str) -> threading.Event:
+        with self._lock:
+            if name not in self._events:
+                self._events[name] = threading.Event()
+            return self._events[name]
+
+    def begin(self, name: str):
+        with self._lock:
+            self._phases[name] = {
+                'started_ms': round((time.monotonic() - self.started_at) * 1000, 1),
+                'started': time.monotonic(),
+                'duration_ms': None,
+                'ready': False,
+                'error': None,
+            }
+
+    def done(self, name: str, error: Optional[str] = None):
+        with self._lock:
+            phase = self._phases.setdefault(name, {
+                'started_ms': None, 'started': time.monotonic(), 'duration_ms': None, 'ready': False, 'error': None
+            })
+            phase['duration_ms'] = round((time.monotonic() - phase['started']) * 1000, 1)
+            phase['ready'] = error is None
+            phase['error'] = error
+        self._event(name).set()
+        if error:
+            print(f"❌ Этап запуска '{name}' завершился ошибкой: {error}")
+        else:
+            print(f"✅ Этап запуска '{name}' готов за {phase['duration_ms']} мс")
+
+    @contextmanager
+    def phase(self, name: str):
+        """Контекстный менеджер для замера этапа"""
+        self.begin(name)
+        try:
+            yield
+        except Exception as e:
+            self.done(name, error=str(e))
+            raise
+        else:
+            self.done(name)
+
+    def run_in_background(self, *steps: Tuple[str, Callable]) -> threading.Thread:
+        """Выполняет этапы (имя, функция) по очереди в отдельном потоке"""
+        def runner():
+            for name, func in steps:
+                try:
+                    with self.phase(name):
+                        func()
+                except Exception as e:
+                    logger.error(f"Ошибка этапа запуска {name}: {e}")
+                    return
+
+        thread = threading.Thread(target=runner, name=f"startup-{steps[0][0]}", daemon=True)
+        thread.start()
+        return thread
+
+    def wait(self, name: str, timeout: Optional[float] = None) -> bool:
+        """Ждет завершения этапа; True - этап завершился успешно"""
+        self._event(name).wait(timeout)
+        return self.is_phase_ready(name)
+
+    def is_phase_ready(self, name: str) -> bool:
+        with self._lock:
+            phase = self._phases.get(name)
+            return bool(phase and phase['ready'])
+
+    def is_ready(self) -> bool:
+        return all(self.is_phase_ready(name) for name in self.required)
+
+    def report(self) -> dict:
+        """Состояние запуска для /health"""
+        with self._lock:
+            phases = {
+                name: {key: value for key, value in phase.items() if key != 'started'}
+                for name, phase in self._phases.items()
+            }
+        for name in self.required:
+            phases.setdefault(name, {'started_ms': None, 'duration_ms': None, 'ready': False, 'error': None})
+        return {
+            'status': 'ready' if self.is_ready() else 'starting',
+            'uptime_s': round(time.monotonic() - self.started_at, 1),
+            'phases': phases,
+        }
+
+
+# Состояние запуска процесса бота
+startup = StartupState(required=['catalog', 'index', 'telegram'])
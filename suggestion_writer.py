@@ -0,0 +1,79 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def spool_suggestion(spool_dir: str, user_id: int, user_name: str, username: str, suggestion_text: str):
+    """Кладет пожелание в очередь-каталог для единственного процесса-писателя.
+
+    Файл сначала пишется во временный, затем переименовывается - писатель
+    никогда не увидит недописанную запись.
+    """
+    os.makedirs(spool_dir, exist_ok=True)
+    name = f"{time.time():.6f}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    tmp_path = os.path.join(spool_dir, f".{name}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'user_id': user_id,
+            'user_name': user_name,
+            'username': username,
+            'suggestion_text': suggestion_text,
+        }, f, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(spool_dir, f"{name}.json"))
+
+
+def drain_spool(spool_dir: str, db) -> int:
+    """Переносит все накопленные пожелания в базу данных; возвращает их количество"""
+    if not os.path.isdir(spool_dir):
+        return 0
+    saved = 0
+    for filename in sorted(os.listdir(spool_dir)):
+        if not filename.endswith('.json'):
+            continue
+        path = os.path.join(spool_dir, filename)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Не удалось прочитать пожелание {filename}: {e}")
+            continue
+        if db.save_suggestion(record['user_id'], record['user_name'], record['username'], record['suggestion_text']):
+            os.remove(path)
+            saved += 1
+    return saved
+
+
+class SuggestionWriter:
+    """Единственный писатель пожеланий: периодически переносит очередь в SQLite"""
+
+    def __init__(self, spool_dir: str, db, interval: float = 1.0):
+        self.spool_dir = spool_dir
+        self.db = db
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="suggestion-writer", daemon=True)
+        self._thread.start()
+        print(f"✅ Писатель пожеланий запущен (очередь {self.spool_dir})")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        drain_spool(self.spool_dir, self.db)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                saved = drain_spool(self.spool_dir, self.db)
+                if saved:
+                    logger.info(f"Сохранено пожеланий из очереди: {saved}")
+            except Exception as e:
+                logger.error(f"Ошибка писателя пожеланий: {e}")
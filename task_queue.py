@@ -0,0 +1,286 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+import contextlib
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Обработчик задачи: handler(bot, payload); исключение - повторить позже
+Handler = Callable[[Any, dict], Awaitable[None]]
+# Вызывается один раз, когда попытки закончились: on_failure(bot, payload, error)
+FailureHandler = Callable[[Any, dict, Exception], Awaitable[None]]
+# Задача в очереди: (id, вид, данные, число неудачных попыток)
+Job = Tuple[int, str, dict, int]
+
+
+class PermanentTaskError(Exception):
+    """Повтор не нужен или опасен (например, файл мог уже дойти) - задача сразу считается невыполненной"""
+
+
+def retry_delay(error: Exception) -> Optional[float]:
+    """Пауза, которую просит сам сервер (RetryAfter от Telegram), с"""
+    retry_after = getattr(error, 'retry_after', None)
+    if retry_after is None:
+        return None
+    if hasattr(retry_after, 'total_seconds'):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class TaskQueue:
+    """Очередь фоновых задач: побочные действия выполняются вне обработчика.
+
+    Обработчик ставит задачу в очередь в памяти и сразу отвечает
+    пользователю; запись задачи в SQLite идет в фоне, по порядку, одним
+    потоком за раз (вставки, повторы и удаления не обгоняют друг друга).
+    Задачи выполняют workers исполнителей в цикле событий - не больше workers
+    одновременно. Неудачная попытка повторяется с экспоненциальной паузой
+    (backoff, 2 * backoff, ... до max_backoff); после max_attempts попыток
+    или PermanentTaskError задача помечается failed и остается в базе для
+    разбора. Выполненная задача удаляется. Незавершенные задачи
+    восстанавливаются при следующем запуске (выполнение - хотя бы один раз).
+    """
+
+    def __init__(self, db_file: str = 'data/tasks.db', workers: int = 4, max_attempts: int = 5,
+                 backoff: float = 2.0, max_backoff: float = 300.0, write_retry: float = 1.0):
+        self.db_file = db_file
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.bot = None
+        self._handlers: Dict[str, Tuple[Handler, Optional[FailureHandler]]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        # Задачи, поставленные до запуска исполнителей
+        self._early: List[Job] = []
+        # Отложенные повторы: id задачи -> таймер
+        self._retries: Dict[int, asyncio.TimerHandle] = {}
+        # Незаписанные изменения базы (SQL, параметры) по порядку и задача их записи
+        self._writes: List[Tuple[str, tuple]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        # Пауза перед повтором записи, если база временно недоступна (занята, ошибка ввода-вывода)
+        self.write_retry = write_retry
+        self._stopping = False
+        self._last_id = 0
+        self.stats = {'enqueued': 0, 'done': 0, 'retried': 0, 'failed': 0}
+        # База открывается при запуске (или первой записи), а не при импорте бота
+        self.conn = None
+        self._connect_lock = threading.Lock()
+
+    def _connect(self):
+        with self._connect_lock:
+            if self.conn is None:
+                self._open()
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.db_file) or '.', exist_ok=True)
+        # Запись идет из потоков to_thread, но всегда одним потоком за раз (_flush)
+        self.conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                run_at REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        self.conn.commit()
+
+    def register(self, kind: str, handler: Handler, on_failure: Optional[FailureHandler] = None):
+        """Регистрирует обработчик задач вида kind"""
+        self._handlers[kind] = (handler, on_failure)
+
+    def _new_id(self) -> int:
+        # Возрастающие id без обращения к базе: время в наносекундах, не меньше предыдущего + 1
+        self._last_id = max(self._last_id + 1, time.time_ns())
+        return self._last_id
+
+    def enqueue(self, kind: str, payload: dict) -> int:
+        """Ставит задачу в очередь (запись в базу - в фоне); возвращает id задачи"""
+        if kind not in self._handlers:
+            raise ValueError(f"Неизвестный вид задачи: {kind}")
+        task_id = self._new_id()
+        self._persist(
+            'INSERT INTO tasks (id, kind, payload) VALUES (?, ?, ?)',
+            (task_id, kind, json.dumps(payload, ensure_ascii=False))
+        )
+        self.stats['enqueued'] += 1
+        job = (task_id, kind, payload, 0)
+        if self._queue is not None:
+            self._queue.put_nowait(job)
+        else:
+            self._early.append(job)
+        return task_id
+
+    def _persist(self, sql: str, params: tuple):
+        """Добавляет изменение в очередь записи; одна фоновая запись за раз сохраняет порядок"""
+        self._writes.append((sql, params))
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        try:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush())
+        except RuntimeError:
+            # Нет запущенного цикла событий - пишем сразу (при ошибке запись повторит следующий _persist)
+            writes, self._writes = self._writes, []
+            if not self._write(writes):
+                self._writes = writes + self._writes
+
+    async def _flush(self):
+        while self._writes:
+            writes, self._writes = self._writes, []
+            if await asyncio.to_thread(self._write, writes):
+                continue
+            # Транзакция откатилась целиком - возвращаем изменения в начало очереди, порядок сохраняется
+            self._writes = writes + self._writes
+            if self._stopping:
+                logger.error(f"Очередь фоновых задач остановлена, не записано изменений: {len(self._writes)}")
+                return
+            await asyncio.sleep(self.write_retry)
+
+    def _write(self, writes: List[Tuple[str, tuple]]) -> bool:
+        """Записывает изменения одной транзакцией; False - временная ошибка, нужно повторить"""
+        try:
+            self._connect()
+            with self.conn:
+                for sql, params in writes:
+                    self.conn.execute(sql, params)
+            return True
+        except sqlite3.OperationalError as e:
+            # База занята или недоступна - задачи не теряем
+            logger.warning(f"Запись очереди фоновых задач не удалась, повтор: {e}")
+            return False
+        except sqlite3.Error as e:
+            # Ошибка в самих изменениях - повтор не поможет
+            logger.error(f"Ошибка записи очереди фоновых задач: {e}")
+            return True
+
+    def start(self, bot):
+        """Запускает исполнителей и восстанавливает незавершенные задачи"""
+        self.bot = bot
+        self._stopping = False
+        self._connect()
+        self._queue = asyncio.Queue()
+        # Отдельное соединение для чтения: основное может быть занято фоновой записью
+        with contextlib.closing(sqlite3.connect(self.db_file)) as conn:
+            rows = conn.execute(
+                "SELECT id, kind, payload, attempts, run_at FROM tasks WHERE status = 'pending' ORDER BY id"
+            ).fetchall()
+        now = time.time()
+        restored = set()
+        for task_id, kind, payload, attempts, run_at in rows:
+            restored.add(task_id)
+            self._last_id = max(self._last_id, task_id)
+            self._schedule((task_id, kind, json.loads(payload), attempts), run_at - now)
+        # Поставленные до запуска задачи могли уже попасть в базу - не выполняем их дважды
+        for job in self._early:
+            if job[0] not in restored:
+                self._queue.put_nowait(job)
+        self._early = []
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        print(f"✅ Очередь фоновых задач: исполнителей {self.workers}, восстановлено задач {len(rows)}")
+
+    async def stop(self, timeout: float = 10):
+        """Дожидается задач из очереди (не дольше timeout) и останавливает исполнителей.
+
+        Отложенные повторы и невыполненные задачи остаются в базе до следующего запуска.
+        """
+        if self._queue is None:
+            return
+        for timer in self._retries.values():
+            timer.cancel()
+        self._retries.clear()
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Очередь фоновых задач остановлена, не выполнено: {self._queue.qsize()}")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        self._stopping = True
+        if self._flush_task is not None:
+            await self._flush_task
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def _schedule(self, job: Job, delay: float):
+        if delay <= 0:
+            self._queue.put_nowait(job)
+            return
+        self._retries[job[0]] = asyncio.get_running_loop().call_later(delay, self._release, job)
+
+    def _release(self, job: Job):
+        self._retries.pop(job[0], None)
+        if self._queue is not None:
+            self._queue.put_nowait(job)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            except Exception as e:
+                # Ошибка самой очереди не должна останавливать исполнителя
+                logger.error(f"Ошибка очереди фоновых задач: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job):
+        task_id, kind, payload, attempts = job
+        handler, on_failure = self._handlers.get(kind, (None, None))
+        if handler is None:
+            self._fail(task_id, attempts, f"неизвестный вид задачи {kind}")
+            return
+        try:
+            await handler(self.bot, payload)
+        except Exception as e:
+            attempts += 1
+            if attempts >= self.max_attempts or isinstance(e, PermanentTaskError):
+                self._fail(task_id, attempts, str(e))
+                logger.error(f"Задача {kind} #{task_id} не выполнена (попыток: {attempts}): {e}")
+                if on_failure:
+                    try:
+                        await on_failure(self.bot, payload, e)
+                    except Exception as failure_error:
+                        logger.error(f"Ошибка обработки отказа задачи {kind} #{task_id}: {failure_error}")
+                return
+            delay = retry_delay(e) or min(self.max_backoff, self.backoff * 2 ** (attempts - 1))
+            self._persist(
+                'UPDATE tasks SET attempts = ?, run_at = ?, last_error = ? WHERE id = ?',
+                (attempts, time.time() + delay, str(e), task_id)
+            )
+            self.stats['retried'] += 1
+            logger.warning(f"Задача {kind} #{task_id}: попытка {attempts} не удалась ({e}), повтор через {delay:.1f} с")
+            self._schedule((task_id, kind, payload, attempts), delay)
+            return
+        self._persist('DELETE FROM tasks WHERE id = ?', (task_id,))
+        self.stats['done'] += 1
+
+    def _fail(self, task_id: int, attempts: int, error: str):
+        self._persist(
+            "UPDATE tasks SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+            (attempts, error, task_id)
+        )
+        self.stats['failed'] += 1
+
+    def metrics(self) -> dict:
+        return dict(
+            self.stats,
+            queued=self._queue.qsize() if self._queue is not None else 0,
+            delayed=len(self._retries),
+            unsaved=len(self._writes),
+        )
@@ -0,0 +1,194 @@
+# workers.py - запуск нескольких процессов-воркеров бота на вебхуках за одним портом
+import os
+import json
+import signal
+import asyncio
+import logging
+import multiprocessing
+
+from config import (
+    get_bot_token, WORKERS, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET,
+    SEARCH_INDEX_PATH, SUGGESTION_SPOOL_PATH, INSTANCE_LEASE_TTL
+)
+
+logger = logging.getLogger(__name__)
+
+# Максимальный размер тела запроса вебхука
+MAX_BODY_SIZE = 1024 * 1024
+
+
+async def _read_request(reader):
+    """Читает HTTP-запрос: (метод, путь, заголовки, тело)"""
+    request_line = await reader.readline()
+    method, target, _ = request_line.decode('latin-1').split(' ', 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    if length > MAX_BODY_SIZE:
+        raise ValueError("слишком большое тело запроса")
+    body = await reader.readexactly(length) if length else b''
+    return method, target, headers, body
+
+
+async def _write_response(writer, status: int, body: bytes = b'', content_type: str = 'text/plain'):
+    reasons = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found', 503: 'Service Unavailable'}
+    writer.write(
+        f"HTTP/1.1 {status} {reasons.get(status, '')}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n".encode('latin-1') + body
+    )
+    await writer.drain()
+    writer.close()
+
+
+async def serve_worker(worker_no: int, port: int):
+    """Воркер: принимает вебхуки на общем порту (SO_REUSEPORT) и обрабатывает их"""
+    from telegram import Update
+    import bot
+    from persistence import SQLitePersistence
+    from database import configure_db
+
+    # Воркер открывает готовый индекс только для чтения и не пишет пожелания в SQLite сам
+    configure_db(index_file=SEARCH_INDEX_PATH, suggestion_spool=SUGGESTION_SPOOL_PATH)
+    # Состояние пользователей общее для всех воркеров - перечитываем его на каждое обновление
+    application = bot.build_application(SQLitePersistence(update_interval=1, shared=True))
+    # У каждого воркера свой журнал запросов (ротация не мешает соседям) и своя очередь фоновых задач
+    root, ext = os.path.splitext(bot.query_log.path)
+    bot.query_log.path = f"{root}.worker{worker_no}{ext}"
+    bot.search_analytics.name = f"search.worker{worker_no}"
+    root, ext = os.path.splitext(bot.task_queue.db_file)
+    bot.task_queue.db_file = f"{root}.worker{worker_no}{ext}"
+    await application.initialize()
+    await bot.post_init(application)
+    await application.start()
+    bot.startup.run_in_background(
+        ('catalog', bot.get_db),
+        ('index', lambda: bot.get_db().build_index())
+    )
+
+    async def handle(reader, writer):
+        try:
+            method, target, headers, body = await _read_request(reader)
+        except (ValueError, asyncio.IncompleteReadError) as e:
+            logger.warning(f"Некорректный запрос к воркеру {worker_no}: {e}")
+            await _write_response(writer, 400)
+            return
+
+        if method == 'GET' and target.startswith('/health'):
+            report = bot.startup.report()
+            report['worker'] = worker_no
+            await _write_response(
+                writer, 200 if report['status'] == 'ready' else 503,
+                json.dumps(report, ensure_ascii=False).encode('utf-8'), 'application/json'
+            )
+        elif method == 'POST' and target == WEBHOOK_PATH:
+            if WEBHOOK_SECRET and headers.get('x-telegram-bot-api-secret-token') != WEBHOOK_SECRET:
+                await _write_response(writer, 403)
+                return
+            try:
+                update = Update.de_json(json.loads(body), application.bot)
+            except ValueError:
+                await _write_response(writer, 400)
+                return
+            # Отвечаем Telegram сразу, обработка идет в очереди Application
+            await _write_response(writer, 200)
+            await application.update_queue.put(update)
+        else:
+            await _write_response(writer, 404)
+
+    server = await asyncio.start_server(handle, '0.0.0.0', port, reuse_port=True)
+    print(f"✅ Воркер {worker_no} (pid {os.getpid()}) принимает вебхуки на порту {port}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await stop.wait()
+    finally:
+        server.close()
+        await server.wait_closed()
+        await application.stop()
+        await bot.post_stop(application)
+        await application.shutdown()
+        print(f"👋 Воркер {worker_no} остановлен")
+
+
+def run_worker(worker_no: int, port: int):
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    asyncio.run(serve_worker(worker_no, port))
+
+
+async def set_webhook():
+    """Регистрирует вебхук один раз (в главном процессе, а не в каждом воркере)"""
+    from telegram import Bot
+    async with Bot(get_bot_token()) as telegram_bot:
+        await telegram_bot.set_webhook(
+            url=WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET or None,
+            drop_pending_updates=True
+        )
+    print(f"✅ Вебхук установлен: {WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH}")
+
+
+def main():
+    """Главный процесс: строит индекс, запускает воркеров и единственного писателя пожеланий"""
+    from database import Database
+    from search_index import build_index_file
+    from suggestion_writer import SuggestionWriter
+    from instance_lock import InstanceLease
+
+    get_bot_token()
+    if not WEBHOOK_URL:
+        raise ValueError("❌ WEBHOOK_URL не задан - режим воркеров работает только на вебхуках")
+
+    lease = InstanceLease(ttl=INSTANCE_LEASE_TTL)
+    lease.acquire()
+
+    # Полная база (каталог + пожелания) есть только у главного процесса
+    master_db = Database()
+    build_index_file(SEARCH_INDEX_PATH, master_db)
+    writer = SuggestionWriter(SUGGESTION_SPOOL_PATH, master_db)
+    writer.start()
+
+    asyncio.run(set_webhook())
+
+    port = int(os.environ.get('PORT', 8080))
+    context = multiprocessing.get_context('spawn')
+    processes = [
+        context.Process(target=run_worker, args=(worker_no, port), name=f"bot-worker-{worker_no}")
+        for worker_no in range(WORKERS)
+    ]
+    for process in processes:
+        process.start()
+    print(f"🤖 Запущено воркеров: {WORKERS}")
+
+    def shutdown(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    try:
+        for process in processes:
+            process.join()
+    finally:
+        writer.stop()
+        lease.release()
+        print("👋 Все воркеры остановлены")
+
+
+if __name__ == "__main__":
+    main()